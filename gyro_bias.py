@@ -0,0 +1,135 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+
+class GyroBiasModel:
+    """角速度のバイアスを温度の多項式 (既定は1次: b0 + b1·(T-基準温度)) として逐次最小二乗法 (RLS) で推定する.
+
+    静止中の角速度をupdateに渡すと、1サンプルあたり次数だけで決まる一定の手間で係数を更新する.
+    忘却係数で古いサンプルの重みを下げるが、同じ温度が続いて共分散が初期値を超えそうなときは忘却しない
+    (温度の傾きを推定できない間に共分散が発散するのを防ぐ).
+    """
+
+    # これだけ学習するまでは推定バイアスを静止判定の基準に使わない
+    WARMUP_SAMPLES = 1000
+
+    def __init__(self, degree=1, reference_temp=25.0, forgetting=0.99999, initial_covariance=100.0):
+        self.degree = degree
+        self.reference_temp = reference_temp
+        self.forgetting = forgetting
+        self.initial_covariance = initial_covariance
+        self.theta = np.zeros(degree + 1)
+        self.covariance = np.eye(degree + 1) * initial_covariance
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def _features(self, temp):
+        return (temp - self.reference_temp) ** np.arange(self.degree + 1)
+
+    def bias(self, temp):
+        """温度tempでの推定バイアス (度/秒)."""
+        return float(self.theta @ self._features(temp))
+
+    def expected_bias(self, temp):
+        """学習が済んでいれば温度tempでの推定バイアス、まだならNone (StationaryDetector.updateに渡す)."""
+        return self.bias(temp) if self.samples >= self.WARMUP_SAMPLES else None
+
+    def correct(self, rate, temp):
+        """角速度rateから温度tempでの推定バイアスを引く."""
+        return rate - self.bias(temp)
+
+    def update(self, temp, rate):
+        """静止中の角速度rate (= バイアス) を温度tempでのサンプルとして係数を更新する."""
+        x = self._features(temp)
+        with self.lock:
+            px = self.covariance @ x
+            gain = px / (self.forgetting + x @ px)
+            self.theta = self.theta + gain * (rate - self.theta @ x)
+            covariance = self.covariance - np.outer(gain, px)
+            if np.trace(covariance) / self.forgetting <= self.initial_covariance * (self.degree + 1):
+                covariance /= self.forgetting
+            self.covariance = covariance
+            self.samples += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "degree": self.degree,
+                "reference_temp": self.reference_temp,
+                "forgetting": self.forgetting,
+                "initial_covariance": self.initial_covariance,
+                "theta": self.theta.tolist(),
+                "covariance": self.covariance.tolist(),
+                "samples": self.samples,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["degree"], data["reference_temp"], data["forgetting"], data["initial_covariance"])
+        model.theta = np.array(data["theta"], dtype=float)
+        model.covariance = np.array(data["covariance"], dtype=float)
+        model.samples = int(data["samples"])
+        if model.theta.shape != (model.degree + 1,) or model.covariance.shape != (model.degree + 1,) * 2:
+            raise ValueError("係数の数が次数と合いません。")
+        return model
+
+    def save(self, file_path):
+        """モデルをJSONで保存する (別名に書いてから置き換える)."""
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+class StationaryDetector:
+    """角速度と加速度から静止しているかを判定する.
+
+    角速度の指数移動分散が小さく、加速度の大きさが1gに近い状態がholdサンプル続いたら静止とみなす.
+    ゆっくり一定の角速度で回る旋回は分散も加速度も静止と変わらないため、推定済みのバイアスが渡されたときは
+    角速度の移動平均がそこからmax_bias_error以内のときだけ静止とみなす (旋回をバイアスとして学習しない).
+    推定バイアスがまだない間はmax_rateだけで判定するので、学習が済むまでは静止させておく必要がある.
+    1サンプルあたりの手間は一定.
+    """
+
+    def __init__(self, window=100, max_rate_std=0.2, max_rate=3.0, max_bias_error=0.3, accel_tolerance=0.05,
+                 hold=None):
+        self.alpha = 1.0 / window
+        self.max_rate_var = max_rate_std ** 2
+        self.max_rate = max_rate
+        self.max_bias_error = max_bias_error
+        self.accel_tolerance = accel_tolerance
+        self.hold = hold if hold is not None else window
+        self.mean = None
+        self.var = 0.0
+        self.still = 0  # 条件を満たして続いたサンプル数
+
+    @property
+    def stationary(self):
+        return self.still >= self.hold
+
+    def update(self, rate, accel, expected_bias=None):
+        """角速度rate (度/秒) と加速度accel ({'x', 'y', 'z'}, g) を加え、静止中ならTrueを返す.
+
+        expected_biasにはGyroBiasModel.expected_biasの値 (推定バイアス. まだないならNone) を渡す.
+        """
+        if self.mean is None:
+            self.mean = rate
+        delta = rate - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+        accel_norm = math.sqrt(accel['x'] ** 2 + accel['y'] ** 2 + accel['z'] ** 2)
+        still = (self.var < self.max_rate_var and abs(rate) < self.max_rate
+                 and abs(accel_norm - 1.0) < self.accel_tolerance)
+        if expected_bias is not None and abs(self.mean - expected_bias) >= self.max_bias_error:
+            still = False
+        self.still = self.still + 1 if still else 0
+        return self.stationary
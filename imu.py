@@ -1,92 +1,66 @@
-import serial
 import time
-import threading
-import collections
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-
-# データ共有のためのスレッドセーフなキュー (最大表示点数を100に設定)
-data_queue_yaw_angle = collections.deque(maxlen=100)
-
-# シリアルポート読み込み関数
-def read_from_serial(ser_port, baud_rate):
-    try:
-        ser = serial.Serial(ser_port, baud_rate, timeout=0.1)
-        print(f"シリアルポート {ser_port} を開きました。")
-    except serial.SerialException as e:
-        print(f"シリアルポートを開けませんでした: {e}")
-        return
-
-    try:
-        while True:
-            if ser.in_waiting > 0:
-                # 改行コード '\n' まで読み込むことを想定
-                # マイクロコントローラーから送られるデータが必ず '\n' で終わるようにしてください
-                line = ser.readline().decode('ascii').strip() # 例: "123.7\n" を "123.7" に変換
-
-                if line: # 空行でなければ処理
-                    try:
-                        # 1. 受信した文字列を浮動小数点数に変換
-                        raw_yaw_float = float(line)
-
-                        # 2. 小数点以下を四捨五入して1度単位の整数にする
-                        # Pythonのround()関数は、小数点以下が0.5の場合、最も近い偶数に丸める「偶数丸め」がデフォルトです。
-                        # 一般的な四捨五入（0.5以上で切り上げ）が必要な場合は、`int(raw_yaw_float + 0.5)` のような工夫が必要です。
-                        # ただし、負の数の場合は `int(raw_yaw_float - 0.5)` のような処理が必要になり複雑になります。
-                        # ここでは、簡潔かつ一般的な数値処理として `round()` を使用します。
-                        # もし厳密な「0.5で切り上げ」が必要なら、別途ロジックを検討しましょう。
-                        rounded_yaw_angle = round(raw_yaw_float)
-
-                        # # 厳密な四捨五入（0.5以上は常に切り上げ）が必要な場合の例
-                        # if raw_yaw_float >= 0:
-                        #     rounded_yaw_angle = int(raw_yaw_float + 0.5)
-                        # else: # 負の数の場合
-                        #     rounded_yaw_angle = int(raw_yaw_float - 0.5)
-
-
-                    except ValueError:
-                        print(f"データパースエラー: 数値に変換できません。受信データ: '{line}'")
-                        continue # 不完全なデータはスキップ
-
-                    data_queue_yaw_angle.append(rounded_yaw_angle)
-                    # print(f"受信: 生データ={raw_yaw_float}, 丸め後={rounded_yaw_angle}") # デバッグ用
-
-            else:
-                time.sleep(0.01)
-
-    except KeyboardInterrupt:
-        print("シリアル読み込みスレッドを停止します。")
-    finally:
-        ser.close()
-        print("シリアルポートを閉じました。")
-
-# グラフ更新関数
-def animate_with_queue(i):
-    current_time_display = time.time()
-    # キューに入っているデータの時間点を生成（表示用）
-    # 200ms間隔でデータが来ると仮定し、最新のデータを基準に時間を逆算
-    time_points = [current_time_display - (len(data_queue_yaw_angle) - j -1) * 0.2 for j in range(len(data_queue_yaw_angle))]
-
-    line_yaw_angle.set_data(time_points, list(data_queue_yaw_angle))
-
-    # Y軸の自動調整
-    ax.relim()
-    ax.autoscale_view(True,True,True)
-
-    # X軸の範囲を調整（最新のデータが右端に来るように）
-    if time_points:
-        end_time = time_points[-1]
-        start_time = end_time - (data_queue_yaw_angle.maxlen * 0.2)
-        ax.set_xlim(start_time, end_time + 0.2)
-
-    return line_yaw_angle,
+started_at = time.perf_counter() # 起動時間の測定用 (他のモジュールを読み込む前に取る)
+
+import argparse
+
+from sensor_buffer import SampleRing
+from sensor_headless import StartupTimer, add_headless_arguments, check_headless_arguments, run_headless
+from sensor_hub import SensorHub, YawLineSource
+from sensor_plot import AxisLimits, BlitPlotter, TimeWindow, connect_zoom_keys, minmax_decimate
+
+# 表示する時間の幅の初期値 (秒). 「-」「+」キーで変え、「0」キーで記録全体を表示する
+WINDOW_SECONDS = 60
+
+# 保持するサンプル数 (10 Hzでおよそ8時間分)
+HISTORY_SAMPLES = 10 * 60 * 60 * 8
+
+# 受信時刻 (time.monotonic) 付きのヨー軸角度 (1度単位)
+samples = SampleRing(capacity=HISTORY_SAMPLES)
+
+# ヨー軸角度のサンプルを受け取る (取得元のスレッドから呼ばれる). 受信・解析はsensor_hubのYawLineSourceが行う
+def on_sample(stream, t, values):
+    # 小数点以下を四捨五入して1度単位の整数にする (round()は0.5のとき偶数に丸める)
+    samples.append(t, round(values['yaw']))
+
+# グラフ更新関数. 軸の範囲を変えたときにTrueを返す
+def update_plot():
+    times, values = samples.window(time_window.span_seconds)
+    if not len(times):
+        return False
+    elapsed = times - start_time
+    values = values[:, 0]
+    # 描く点はグラフの幅 (画素) の2倍までに間引く. 長時間を表示しても1フレームの描画は重くならない
+    line_yaw_angle.set_data(*minmax_decimate(elapsed, values, 2 * int(ax.bbox.width)))
+
+    # 軸の範囲は、データが範囲を出たときだけ変える (毎フレーム変えると全体の描き直しになる)
+    changed = time_window.update(elapsed[-1], elapsed[0])
+    changed |= yaw_limits.update(values.min(), values.max())
+    if changed:
+        ax.set_xlim(*time_window.limits)
+        ax.set_ylim(*yaw_limits.limits)
+    return changed
 
 if __name__ == "__main__":
-    # シリアル通信スレッドを開始
-    serial_port = 'COM3' # <-- ご自身の環境に合わせて変更してください (例: '/dev/ttyUSB0')
-    baud_rate = 9600     # <-- ご自身のデバイスのボーレートに合わせて変更してください
-    serial_thread = threading.Thread(target=read_from_serial, args=(serial_port, baud_rate), daemon=True)
-    serial_thread.start()
+    parser = argparse.ArgumentParser(description="MPU6050 のヨー軸角度をグラフに表示する.")
+    parser.add_argument("--port", default='COM3', help="シリアルポート (例: COM3, /dev/ttyUSB0)") # <-- ご自身の環境に合わせて変更してください
+    parser.add_argument("--baud", type=int, default=9600, help="ボーレート") # <-- ご自身のデバイスのボーレートに合わせて変更してください
+    add_headless_arguments(parser)
+    args = parser.parse_args()
+    check_headless_arguments(parser, args)
+    timer = StartupTimer(started_at)
+
+    if args.headless:
+        # グラフを表示せず、取得と記録だけを行う (matplotlibは読み込まない)
+        raise SystemExit(run_headless([YawLineSource(args.port, args.baud)], args, timer, 'ヨー軸角度'))
+
+    import matplotlib.pyplot as plt
+
+    start_time = time.monotonic()
+
+    # ヨー軸角度の取得を開始 (ヘッドレスモードと同じ取得元. ポートが開けなければ再接続を試し続ける)
+    hub = SensorHub([YawLineSource(args.port, args.baud)], log=print)
+    hub.subscribe(on_sample)
+    hub.start()
 
     # グラフの初期設定
     fig, ax = plt.subplots(1, 1, figsize=(10, 6))
@@ -94,13 +68,21 @@ if __name__ == "__main__":
 
     ax.set_title('MPU6050 ヨー軸角度 (1度単位)')
     ax.set_ylabel('角度 (度)')
-    ax.set_xlabel('時間')
+    ax.set_xlabel('時間 (秒)')
     ax.grid(True)
-    # ヨー軸角度の一般的な範囲（例: -180度から180度、または0度から360度）に合わせてY軸範囲を固定することも検討
-    # ax.set_ylim(-180, 180) # または ax.set_ylim(0, 360)
 
-    # アニメーションの開始: 200msごとに更新
-    ani = animation.FuncAnimation(fig, animate_with_queue, interval=200, blit=True)
+    # ヨー軸角度の一般的な範囲 (-180度から180度). 0度から360度で届く場合も、はみ出たときだけ広げる
+    time_window = TimeWindow(WINDOW_SECONDS)
+    yaw_limits = AxisLimits(-180, 180)
+    ax.set_xlim(*time_window.limits)
+    ax.set_ylim(*yaw_limits.limits)
+    connect_zoom_keys(fig, time_window)
+
+    # アニメーションの開始: 200msごとに線だけを描き直す
+    plotter = BlitPlotter(fig, [line_yaw_angle], update_plot, interval_ms=200)
+    plotter.start()
 
     plt.tight_layout()
+    timer.report("グラフの準備完了")
     plt.show()
+    hub.stop()
@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+from micro_bench import FIXTURE_DIR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EMIT_RATE_HZ = 5  # server.py の emit_gnss の送信頻度
+HISTORY_SIZE = 50  # server.py の MAX_HISTORY_SIZE
+TIME_FIELD_SENTENCES = ("GGA", "RMC", "GST", "ZDA")  # 2番目のフィールドが時刻の文
+
+
+def nmea_checksum(body):
+    checksum = 0
+    for c in body.encode("ascii"):
+        checksum ^= c
+    return f"{checksum:02X}"
+
+
+def load_epochs(file_path):
+    """記録したNMEAを、GGAから次のGGAの前までを1エポックとして分ける."""
+    epochs = []
+    with open(file_path, encoding="ascii", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("$"):
+                continue
+            if line[3:6] == "GGA" or not epochs:
+                epochs.append([])
+            epochs[-1].append(line)
+    return epochs
+
+
+class NmeaReplay:
+    """記録したNMEAを擬似端末へエポックごとに一定周期で書き込む (GNSS受信機の代わり).
+
+    エポックの時刻フィールドは通し番号から作った時刻に書き換え、時刻ごとに書き込んだUNIX時刻を記録する.
+    クライアントが 'gnss' でその時刻を初めて受け取るまでの時間が受信遅延になる.
+    """
+
+    def __init__(self, file_path, rate_hz):
+        self.epochs = load_epochs(file_path)
+        if not self.epochs:
+            raise ValueError(f"NMEAの記録がありません: {file_path}")
+        self.rate_hz = rate_hz
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # 受信側が開くまでのエコーで書き込みが詰まらないように
+        self.port = os.ttyname(self.slave)
+        self.sent = {}  # 時刻フィールド -> 書き込んだUNIX時刻
+        self.count = 0
+        self.running = False
+        self.thread = None
+
+    def _epoch_text(self, index):
+        seconds = index / self.rate_hz
+        hours, rest = divmod(seconds, 3600)
+        minutes, rest = divmod(rest, 60)
+        time_field = f"{int(hours) % 24:02d}{int(minutes):02d}{rest:05.2f}"
+        lines = []
+        for line in self.epochs[index % len(self.epochs)]:
+            body = line[1:].split("*", 1)[0]
+            parts = body.split(",")
+            if parts[0][2:] in TIME_FIELD_SENTENCES and len(parts) > 1:
+                parts[1] = time_field
+                body = ",".join(parts)
+            lines.append(f"${body}*{nmea_checksum(body)}\r\n")
+        return time_field, "".join(lines).encode("ascii")
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.rate_hz
+        next_write = time.monotonic()
+        while self.running:
+            time_field, data = self._epoch_text(self.count)
+            self.sent[time_field] = time.time()
+            os.write(self.master, data)
+            self.count += 1
+            next_write += interval
+            time.sleep(max(0.0, next_write - time.monotonic()))
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class ProcessSampler:
+    """プロセスのCPU時間と常駐メモリ (RSS) を一定間隔で記録する. psutilが無ければ /proc を読む (Linux)."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (UNIX時刻, CPU秒, RSSバイト)
+        self.running = False
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+
+    def read(self):
+        if self._process is not None:
+            cpu = self._process.cpu_times()
+            return cpu.user + cpu.system, self._process.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+    def sample(self):
+        try:
+            cpu, rss = self.read()
+        except (OSError, ValueError):
+            return None
+        entry = (time.time(), cpu, rss)
+        self.samples.append(entry)
+        return entry
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while self.running:
+            self.sample()
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+    def window(self, t0, t1):
+        """t0～t1のCPU使用率 (%) とRSSの最大 (バイト)."""
+        inside = [s for s in self.samples if t0 <= s[0] <= t1]
+        if len(inside) < 2:
+            return None, max((s[2] for s in inside), default=None)
+        (ta, ca, _), (tb, cb, _) = inside[0], inside[-1]
+        return (cb - ca) / (tb - ta) * 100, max(s[2] for s in inside)
+
+
+# --- クライアント (ワーカープロセス) ---
+
+async def _run_client(url, record, connect_limit, stop_event):
+    import socketio
+
+    sio = socketio.AsyncClient(reconnection=False)
+    started = None  # 接続を始めた時刻 (接続時の履歴が届くまでの時間もここから測る)
+
+    @sio.on('gnss_history')
+    def on_history(data):
+        record["history_ms"] = (time.perf_counter() - started) * 1000
+        record["history_items"] = len(data)
+        record["history_bytes"] = len(json.dumps(data))
+
+    @sio.on('gnss')
+    def on_gnss(data):
+        now = time.time()
+        record["emits"].append(now)
+        record["first_seen"].setdefault(data.get('timestamp_utc'), now)
+
+    try:
+        async with connect_limit:
+            started = time.perf_counter()
+            await sio.connect(url, transports=['websocket'], wait_timeout=30)
+            record["connect_ms"] = (time.perf_counter() - started) * 1000
+        while not stop_event.is_set():
+            await asyncio.sleep(0.1)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if sio.connected:
+            await sio.disconnect()
+
+
+async def _run_clients(url, count, connect_concurrency, connected, stop_event):
+    limit = asyncio.Semaphore(connect_concurrency)
+    records = [{"connect_ms": None, "history_ms": None, "history_items": None, "history_bytes": None,
+                "emits": [], "first_seen": {}, "error": None} for _ in range(count)]
+    tasks = [asyncio.ensure_future(_run_client(url, record, limit, stop_event)) for record in records]
+
+    async def report_connected():
+        while not all(r["connect_ms"] is not None or r["error"] for r in records):
+            await asyncio.sleep(0.05)
+        connected.put(time.process_time())
+
+    await asyncio.gather(report_connected(), *tasks)
+    return records
+
+
+def client_worker(url, count, connect_concurrency, connected, stop_event, results):
+    """count台のクライアントを1つのイベントループで動かし、stop_eventで切断して記録をresultsへ送る."""
+    records = asyncio.run(_run_clients(url, count, connect_concurrency, connected, stop_event))
+    results.put((time.process_time(), records))
+
+
+# --- 測定 ---
+
+def wait_for_server(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server.py が終了しました (終了コード {process.returncode})。")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server.py が {timeout} 秒以内にポート {port} で待ち受けを始めませんでした。")
+
+
+def start_server(script, port, gnss_port, log_file):
+    # GNSSだけを擬似端末から読み、サーボとセンサーは使わない
+    env = dict(os.environ, GNSS_PORT=gnss_port, SERVO_PORT="", SENSOR_SOURCES="", SERVER_PORT=str(port))
+    return subprocess.Popen([sys.executable, script], cwd=HERE, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def _percentiles(values, qs=(50, 95, 99)):
+    if not values:
+        return {f"p{q}": None for q in qs}
+    return {f"p{q}": float(np.percentile(values, q)) for q in qs}
+
+
+def run_level(args, clients, log=print):
+    """clients台で1回測定し、結果の辞書を返す."""
+    replay = NmeaReplay(args.nmea, args.epoch_rate)
+    log_file = open(args.server_log, "ab") if args.server_log else subprocess.DEVNULL
+    server = start_server(args.server_script, args.port, replay.port, log_file)
+    sampler = ProcessSampler(server.pid)
+    workers = []
+    try:
+        wait_for_server(args.port, server)
+        sampler.start()
+        replay.start()
+        # 接続時に送られる履歴 (最大HISTORY_SIZE件) が溜まるまで待つ
+        time.sleep(args.warmup)
+        idle_started = time.time()
+        time.sleep(min(2.0, args.warmup))
+        idle_cpu, idle_rss = sampler.window(idle_started, time.time())
+
+        url = f"http://127.0.0.1:{args.port}"
+        worker_count = max(1, min(args.workers, clients))
+        context = multiprocessing.get_context("spawn")
+        connected = context.Queue()
+        results = context.Queue()
+        stop_event = context.Event()
+        ramp_started = time.time()
+        ramp_cpu_started = sampler.sample()
+        for i in range(worker_count):
+            count = clients // worker_count + (1 if i < clients % worker_count else 0)
+            worker = context.Process(target=client_worker, daemon=True,
+                                     args=(url, count, max(1, args.connect_concurrency // worker_count),
+                                           connected, stop_event, results))
+            worker.start()
+            workers.append(worker)
+        worker_cpu_at_ramp_end = [connected.get(timeout=args.connect_timeout) for _ in workers]
+        ramp_cpu_finished = sampler.sample()
+        ramp_seconds = time.time() - ramp_started
+
+        steady_started = time.time()
+        time.sleep(args.duration)
+        steady_finished = time.time()
+        stop_event.set()
+        collected = [results.get(timeout=60) for _ in workers]
+    finally:
+        sampler.stop()
+        replay.stop()
+        for worker in workers:
+            worker.join(timeout=5)
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        if log_file is not subprocess.DEVNULL:
+            log_file.close()
+
+    records = [record for _, worker_records in collected for record in worker_records]
+    ok = [r for r in records if r["connect_ms"] is not None and not r["error"]]
+    steady_cpu, steady_rss = sampler.window(steady_started, steady_finished)
+    ramp_cpu_seconds = None
+    if ramp_cpu_started and ramp_cpu_finished:
+        ramp_cpu_seconds = ramp_cpu_finished[1] - ramp_cpu_started[1]
+    worker_cpu_seconds = sum(end for end, _ in collected) - sum(worker_cpu_at_ramp_end)
+
+    latencies = []
+    emit_rates = []
+    for record in ok:
+        emits = [t for t in record["emits"] if steady_started <= t <= steady_finished]
+        emit_rates.append(len(emits) / (steady_finished - steady_started))
+        for time_field, seen in record["first_seen"].items():
+            sent = replay.sent.get(time_field)
+            if sent is not None and steady_started <= seen <= steady_finished:
+                latencies.append((seen - sent) * 1000)
+
+    history_ms = [r["history_ms"] for r in ok if r["history_ms"] is not None]
+    return {
+        "clients": clients,
+        "connected": len(ok),
+        "failed": len(records) - len(ok),
+        "errors": sorted({r["error"] for r in records if r["error"]})[:5],
+        "workers": worker_count,
+        "connect_ms": _percentiles([r["connect_ms"] for r in ok]),
+        "history_ms": _percentiles(history_ms),
+        "history_received": len(history_ms),
+        "history_items": max((r["history_items"] or 0 for r in ok), default=0),
+        "history_bytes": max((r["history_bytes"] or 0 for r in ok), default=0),
+        "ramp_seconds": ramp_seconds,
+        "ramp_cpu_ms_per_client": ramp_cpu_seconds / clients * 1000 if ramp_cpu_seconds is not None else None,
+        "server_idle_cpu_percent": idle_cpu,
+        "server_cpu_percent": steady_cpu,
+        "server_idle_rss_mb": idle_rss / 2 ** 20 if idle_rss else None,
+        "server_rss_mb": steady_rss / 2 ** 20 if steady_rss else None,
+        "client_cpu_percent": worker_cpu_seconds / (steady_finished - steady_started) * 100,
+        "emit_rate_hz": {"p5": float(np.percentile(emit_rates, 5)) if emit_rates else None,
+                         "p50": float(np.median(emit_rates)) if emit_rates else None},
+        "latency_ms": dict(_percentiles(latencies), max=max(latencies, default=None)),
+        "latency_samples": len(latencies),
+        "epochs_sent": replay.count,
+    }
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def format_level(result):
+    emit = result["emit_rate_hz"]
+    latency = result["latency_ms"]
+    lines = [
+        f"--- {result['clients']} クライアント (接続 {result['connected']}, 失敗 {result['failed']}, "
+        f"ワーカー {result['workers']}) ---",
+        f"接続: p50 {_ms(result['connect_ms']['p50'])} ms, p95 {_ms(result['connect_ms']['p95'])} ms "
+        f"(全員の接続まで {result['ramp_seconds']:.1f} 秒)",
+        f"接続時の履歴: p50 {_ms(result['history_ms']['p50'])} ms, p95 {_ms(result['history_ms']['p95'])} ms, "
+        f"{result['history_items']} 件 {result['history_bytes'] / 1024:.1f} KB, "
+        f"サーバーのCPU 1接続あたり {_ms(result['ramp_cpu_ms_per_client'])} ms",
+        f"'gnss' の受信頻度: p5 {emit['p5'] or 0:.2f} Hz, p50 {emit['p50'] or 0:.2f} Hz (送信は {EMIT_RATE_HZ} Hz)",
+        f"受信遅延: p50 {_ms(latency['p50'])} ms, p95 {_ms(latency['p95'])} ms, p99 {_ms(latency['p99'])} ms, "
+        f"最大 {_ms(latency['max'])} ms ({result['latency_samples']} 件)",
+        f"サーバー: CPU {_ms(result['server_cpu_percent'])}% (クライアントなし {_ms(result['server_idle_cpu_percent'])}%), "
+        f"RSS {result['server_rss_mb'] or 0:.1f} MB (クライアントなし {result['server_idle_rss_mb'] or 0:.1f} MB), "
+        f"クライアント側のCPU {result['client_cpu_percent']:.0f}%",
+    ]
+    if result["errors"]:
+        lines.append(f"エラー: {'; '.join(result['errors'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="server.py に多数のSocket.IOクライアントをつなぎ、'gnss' の配信が追いつく台数を測る (GNSSは記録の再生).")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000], help="測定するクライアント数")
+    parser.add_argument("--duration", type=float, default=20, help="全員の接続後に測る秒数")
+    parser.add_argument("--epoch-rate", type=float, default=5, help="再生するGNSSのエポックの頻度 (Hz)")
+    parser.add_argument("--warmup", type=float, default=None,
+                        help="接続前に再生する秒数 (既定は履歴が一杯になるまで)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="クライアントを動かすプロセス数")
+    parser.add_argument("--connect-concurrency", type=int, default=50, help="同時に接続を始めるクライアント数")
+    parser.add_argument("--connect-timeout", type=float, default=120, help="全員の接続を待つ秒数")
+    parser.add_argument("--port", type=int, default=5055, help="server.py に待ち受けさせるポート")
+    parser.add_argument("--server-script", default="server.py", help="起動するサーバー")
+    parser.add_argument("--server-log", help="server.py の出力を追記するファイル (既定は捨てる)")
+    parser.add_argument("--nmea", default=os.path.join(FIXTURE_DIR, "nmea.txt"), help="再生するNMEAの記録")
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    args = parser.parse_args(argv)
+    if args.warmup is None:
+        args.warmup = math.ceil(HISTORY_SIZE / args.epoch_rate) + 1
+
+    missing = [name for name in ("socketio", "aiohttp") if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"クライアントには python-socketio と aiohttp が必要です (見つからないモジュール: {', '.join(missing)})。")
+        return 2
+
+    results = []
+    for clients in args.clients:
+        print(f"{clients} クライアントで測定しています...", flush=True)
+        try:
+            result = run_level(args, clients)
+        except Exception as e:
+            print(f"[ERROR] {clients} クライアントの測定に失敗しました: {e}")
+            results.append({"clients": clients, "error": str(e)})
+            continue
+        results.append(result)
+        print(format_level(result), flush=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "levels": results}, f,
+                      indent=2)
+    return 0 if all("error" not in r and r["failed"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+import collections
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+
+class LogBuffer:
+    """GUIログのリングバッファ. どのスレッドからでも追加でき、画面やファイルへの反映はまとめて行う.
+
+    on_pendingは未反映のメッセージが無い状態で最初の1件が追加されたときだけ呼ばれる.
+    """
+
+    def __init__(self, max_lines, on_pending=None):
+        self.max_lines = max_lines
+        self.on_pending = on_pending
+        self.lines = collections.deque(maxlen=max_lines)
+        self.pending = collections.deque(maxlen=max_lines)
+        self.dropped = 0  # 画面に反映される前にリングから溢れた件数
+        self.lock = threading.Lock()
+        self.file_handler = None
+
+    def append(self, message):
+        with self.lock:
+            was_idle = not self.pending
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.lines.append(message)
+            self.pending.append(message)
+        if was_idle and self.on_pending:
+            self.on_pending()
+
+    def drain(self):
+        """未反映のメッセージを1つの文字列にまとめて取り出し、ファイル出力中なら書き込む."""
+        with self.lock:
+            text = ''.join(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            text = f"... ({dropped} 件のログを省略しました)\n" + text
+        if text and self.file_handler:
+            self._write_file(text)
+        return text
+
+    def snapshot(self):
+        with self.lock:
+            return ''.join(self.lines)
+
+    def start_file_stream(self, file_path, max_bytes=1_000_000, backup_count=5):
+        """現在のリングの内容を書き出し、以降のログをローテーションしながらファイルへ流す."""
+        self.stop_file_stream()
+        handler = RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.terminator = ''
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        with self.lock:
+            # 未反映の分は次のdrainで書き込まれるため、ここでは反映済みの分だけ書く
+            written = list(self.lines)[:len(self.lines) - len(self.pending)]
+        self.file_handler = handler
+        self._write_file(''.join(written))
+
+    def stop_file_stream(self):
+        if self.file_handler:
+            self.file_handler.close()
+            self.file_handler = None
+
+    def _write_file(self, text):
+        record = logging.LogRecord("servo_log", logging.INFO, "", 0, text, None, None)
+        self.file_handler.emit(record)
@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+DEFAULT_BASELINE = "bench_baseline.json"
+
+# --capture で機器から記録し直せる入力 (種類: (ファイル名, 既定のボーレート))
+CAPTURE_KINDS = {
+    "nmea": ("nmea.txt", 115200),
+    "temperature": ("temperature.bin", 9600),
+}
+
+BENCHMARKS = []  # (名前, 準備する関数)
+
+
+class BenchmarkSkipped(Exception):
+    """この環境では測れない (依存するモジュールを読み込めないなど)."""
+
+
+def benchmark(group, name=None):
+    """測定の登録. 準備する関数はfixturesを受け取り、(測る関数, 1回の呼び出しで処理する件数) を返す."""
+    def register(setup):
+        BENCHMARKS.append((f"{group}.{name or setup.__name__}", setup))
+        return setup
+    return register
+
+
+class Fixtures:
+    """bench_fixtures の記録を読む (同じファイルは1度だけ読む)."""
+
+    def __init__(self, directory=FIXTURE_DIR):
+        self.directory = directory
+        self._cache = {}
+
+    def path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def _load(self, file_name, loader):
+        if file_name not in self._cache:
+            self._cache[file_name] = loader(self.path(file_name))
+        return self._cache[file_name]
+
+    def text_lines(self, file_name):
+        def load(path):
+            with open(path, encoding="ascii", errors="replace") as f:
+                return [line.strip() for line in f if line.strip()]
+        return self._load(file_name, load)
+
+    def binary(self, file_name):
+        def load(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return self._load(file_name, load)
+
+    def json(self, file_name):
+        def load(path):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        return self._load(file_name, load)
+
+    def nmea_sentences(self):
+        """記録したNMEAのうち、server.py の形式の確認を通る行."""
+        from nmea import NMEA_SENTENCE_PATTERN
+        return [line for line in self.text_lines("nmea.txt") if NMEA_SENTENCE_PATTERN.match(line)]
+
+
+# --- GNSS (nmea.py, server.py の受信スレッドが使う) ---
+
+@benchmark("gnss")
+def convert_to_decimal(fixtures):
+    from nmea import convert_to_decimal as convert
+    fields = []
+    for line in fixtures.nmea_sentences():
+        parts = line.split(',')
+        if parts[0][3:] == 'GGA' and len(parts) > 5:
+            fields += [(parts[2], parts[3]), (parts[4], parts[5])]
+
+    def run():
+        for value, direction in fields:
+            convert(value, direction)
+    return run, len(fields)
+
+
+@benchmark("gnss")
+def nmea_time_to_iso(fixtures):
+    from nmea import nmea_time_to_iso as to_iso
+    times = []
+    for line in fixtures.nmea_sentences():
+        parts = line.split(',')
+        if parts[0][3:] == 'RMC' and len(parts) > 9:
+            times.append((parts[1], parts[9]))
+
+    def run():
+        for time_str, date_str in times:
+            to_iso(time_str, date_str)
+    return run, len(times)
+
+
+@benchmark("gnss")
+def update_gnss_data(fixtures):
+    from nmea import update_gnss_data as update
+    sentences = fixtures.nmea_sentences()
+    gnss_data = {}
+
+    def run():
+        for line in sentences:
+            update(gnss_data, line)
+    return run, len(sentences)
+
+
+# --- サーボ (servocont.py / servo_protocol.py) ---
+
+def _profile_commands(fixtures):
+    from servo_profile import load_profile_csv
+    from servo_protocol import angle_to_sign_mode
+    return [angle_to_sign_mode(angle) for _, angle in load_profile_csv(fixtures.path("tilt_profile.csv"))]
+
+
+@benchmark("servo")
+def convert_angle_to_bytes(fixtures):
+    from servo_protocol import convert_angle_to_bytes as convert
+    commands = _profile_commands(fixtures)
+
+    def run():
+        for sign_mode, magnitude in commands:
+            convert(magnitude, sign_mode)
+    return run, len(commands)
+
+
+@benchmark("servo")
+def build_frame(fixtures):
+    from servo_protocol import TILT_ANGLE_CMND, build_frame as build, convert_angle_to_bytes
+    data = [convert_angle_to_bytes(magnitude, sign_mode) for sign_mode, magnitude in _profile_commands(fixtures)]
+
+    def run():
+        for data_bytes in data:
+            build(TILT_ANGLE_CMND, data_bytes)
+    return run, len(data)
+
+
+@benchmark("servo")
+def calculate_bcc(fixtures):
+    from servo_protocol import TILT_ANGLE_CMND, build_frame, calculate_bcc as bcc, convert_angle_to_bytes
+    bodies = [build_frame(TILT_ANGLE_CMND, convert_angle_to_bytes(magnitude, sign_mode))[:-1]
+              for sign_mode, magnitude in _profile_commands(fixtures)]
+
+    def run():
+        for body in bodies:
+            bcc(body)
+    return run, len(bodies)
+
+
+# --- 温度センサーの6バイトのフレーム (main.py / tp.py) ---
+
+@benchmark("frames")
+def fixed_frame_decode(fixtures):
+    from sensor_frames import FixedFrameDecoder
+    data = fixtures.binary("temperature.bin")
+    # main.py は届いた分をまとめて読むので、記録を64バイトずつ渡す
+    chunks = [data[i:i + 64] for i in range(0, len(data), 64)]
+
+    def run():
+        decoder = FixedFrameDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+    return run, len(data) // 6
+
+
+# --- Socket.IO で送る内容の直列化 (server.py) ---
+
+@benchmark("socketio")
+def gnss_payload(fixtures):
+    payload = fixtures.json("gnss_payload.json")
+    return lambda: json.dumps(payload), 1
+
+
+@benchmark("socketio")
+def sensor_batch(fixtures):
+    batch = fixtures.json("sensor_batch.json")
+    return lambda: json.dumps(batch), sum(len(columns["t"]) for columns in batch.values())
+
+
+@benchmark("socketio")
+def sensor_history_1m(fixtures):
+    # 'sensor_history' の1分の集約を1日分 (1440行) 返すときの変換と直列化
+    import numpy as np
+    batch = fixtures.json("sensor_batch.json")["mpu6050"]
+    columns = {"t": np.arange(1440) * 60.0 + batch["t"][0], "count": np.full(1440, 12000.0)}
+    for field in ("rate", "temp", "yaw"):
+        for stat in ("min", "max", "mean"):
+            columns[f"{field}_{stat}"] = np.resize(np.array(batch[field], dtype=float), 1440)
+
+    def run():
+        json.dumps({name: values.tolist() for name, values in columns.items()})
+    return run, 1440
+
+
+def measure(func, round_time=0.02, rounds=7):
+    """funcの1回あたりの時間 (秒) を測る. 1ラウンドがround_time秒以上になる回数をまとめて呼ぶ (GCは止める)."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= round_time:
+            break
+        number = max(number * 2, int(number * round_time / max(elapsed, 1e-9)))
+    times = [t / number for t in timer.repeat(rounds, number)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": rounds,
+        "iterations": number,
+    }
+
+
+def run_benchmarks(fixtures, keyword=None, round_time=0.02, rounds=7, log=print):
+    results = {}
+    skipped = {}
+    for name, setup in BENCHMARKS:
+        if keyword and keyword not in name:
+            continue
+        try:
+            func, items = setup(fixtures)
+        except BenchmarkSkipped as e:
+            skipped[name] = str(e)
+            log(f"{name:36s} スキップ: {e}")
+            continue
+        stats = measure(func, round_time, rounds)
+        stats["items"] = items
+        stats["per_item"] = stats["median"] / items if items else None
+        results[name] = stats
+        log(format_result(name, stats))
+    return results, skipped
+
+
+def format_result(name, stats):
+    per_item = f", 1件 {stats['per_item'] * 1e9:8.0f} ns ({stats['items']} 件)" if stats.get("per_item") else ""
+    return (f"{name:36s} 中央値 {stats['median'] * 1e6:10.1f} µs, 最小 {stats['min'] * 1e6:10.1f} µs, "
+            f"±{stats['stddev'] / stats['median'] * 100:4.1f}%{per_item}")
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold, stat="min"):
+    """基準とstat (既定は揺らぎの少ない最小値) を比べ、(表示行, 遅くなった測定の名前) を返す."""
+    lines = []
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            lines.append(f"{name:36s} 基準なし")
+            continue
+        ratio = stats[stat] / base[stat]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  <-- 遅くなった"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            mark = "  (速くなった)"
+        lines.append(f"{name:36s} {base[stat] * 1e6:10.1f} µs -> {stats[stat] * 1e6:10.1f} µs "
+                     f"({ratio:5.2f}倍){mark}")
+    return lines, regressions
+
+
+def capture(kind, port, baudrate, seconds, directory=FIXTURE_DIR):
+    """機器からseconds秒分の受信データをそのまま記録し、測定の入力にする."""
+    import serial
+    file_name, default_baudrate = CAPTURE_KINDS[kind]
+    path = os.path.join(directory, file_name)
+    received = 0
+    with serial.Serial(port, baudrate or default_baudrate, timeout=0.1) as ser, open(path, "wb") as f:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            data = ser.read(max(1, ser.in_waiting))
+            f.write(data)
+            received += len(data)
+    print(f"{port} から {received} バイトを '{path}' に記録しました。")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="よく呼ばれる関数のマイクロベンチマーク (記録した入力を使う).")
+    parser.add_argument("-k", dest="keyword", help="名前にこの文字列を含む測定だけを行う (例: gnss, servo.build_frame)")
+    parser.add_argument("--round-time", type=float, default=0.02, help="1ラウンドの最低時間 (秒)")
+    parser.add_argument("--rounds", type=int, default=7, help="ラウンド数")
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで保存する")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="比較の基準にする結果のJSON")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を --baseline に保存する")
+    parser.add_argument("--compare", action="store_true",
+                        help="--baseline と比べ、しきい値を超えて遅くなった測定があれば終了コード1にする")
+    parser.add_argument("--threshold", type=float, default=0.25, help="遅くなったとみなす割合 (0.25 = 25%%)")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="記録した入力のディレクトリ")
+    parser.add_argument("--capture", choices=sorted(CAPTURE_KINDS), help="測定せずに、機器から入力を記録し直す")
+    parser.add_argument("--port", help="--capture で読むシリアルポート")
+    parser.add_argument("--baud", type=int, help="--capture のボーレート (既定はNMEA 115200, 温度センサー 9600)")
+    parser.add_argument("--seconds", type=float, default=60, help="--capture で記録する秒数")
+    args = parser.parse_args(argv)
+
+    if args.capture:
+        if not args.port:
+            parser.error("--capture には --port を指定してください。")
+        capture(args.capture, args.port, args.baud, args.seconds, args.fixtures)
+        return 0
+
+    results, skipped = run_benchmarks(Fixtures(args.fixtures), args.keyword, args.round_time, args.rounds)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "benchmarks": results,
+        "skipped": skipped,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"基準を '{args.baseline}' に保存しました。")
+
+    if args.compare:
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"基準 '{args.baseline}' がありません。--save-baseline で作成してください。")
+            return 2
+        if baseline.get("machine") != report["machine"]:
+            print("注意: 基準は別の環境で測定されています。", file=sys.stderr)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print(f"\n基準 ({baseline.get('created')}) との比較 (最小値, しきい値 {args.threshold:.0%}):")
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} 件の測定が遅くなりました: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
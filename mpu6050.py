@@ -0,0 +1,185 @@
+import numpy as np
+from smbus2 import SMBus, i2c_msg  # For MPU6050 communication
+
+# レジスタ
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+FIFO_EN = 0x23
+INT_STATUS = 0x3A
+ACCEL_XOUT_H = 0x3B
+TEMP_OUT_H = 0x41
+GYRO_XOUT_H = 0x43
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNTH = 0x72
+FIFO_R_W = 0x74
+
+# FIFO_ENのビット
+FIFO_EN_TEMP = 0x80
+FIFO_EN_GYRO = 0x70  # XG, YG, ZG
+FIFO_EN_ACCEL = 0x08
+
+# USER_CTRLのビット
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+
+FIFO_SIZE = 1024
+
+# 換算係数 (既定のレンジ: 加速度 ±2g, 角速度 ±250度/秒)
+ACCEL_SCALE = 16384.0
+GYRO_SCALE = 131.0
+TEMP_SCALE = 340.0
+TEMP_OFFSET = 36.53
+
+# ACCEL_XOUT_H から GYRO_ZOUT_L までの14バイトに並ぶ値. FIFOにも同じ順 (レジスタ番号の順) に書き込まれる
+SAMPLE_FIELDS = ("accel_x", "accel_y", "accel_z", "temp", "gyro_x", "gyro_y", "gyro_z")
+
+
+def _field_scale(field):
+    """生の値を物理量にする (係数, オフセット)."""
+    if field.startswith("accel"):
+        return 1 / ACCEL_SCALE, 0.0
+    if field.startswith("gyro"):
+        return 1 / GYRO_SCALE, 0.0
+    return 1 / TEMP_SCALE, TEMP_OFFSET
+
+
+def decode_samples(data, fields=SAMPLE_FIELDS):
+    """ビッグエンディアンの符号付き16ビット値の並びを、(サンプル数, len(fields)) の物理量の配列にする."""
+    raw = np.frombuffer(bytes(data), dtype=">i2").reshape(-1, len(fields))
+    scale, offset = np.array([_field_scale(f) for f in fields]).T
+    return raw * scale + offset
+
+
+class MPU6050:
+    """MPU6050のI2Cドライバ.
+
+    センサーの値はレジスタを連続で読む (1回の転送で同じサンプルの上位・下位バイトを得る).
+    enable_fifoの後はread_fifoで、FIFOに溜まった複数のサンプルを1回の転送でまとめて読める.
+    """
+
+    def __init__(self, bus_id=1, address=0x68, sample_rate_div=None, dlpf=None, bus=None):
+        self.bus_id = bus_id
+        self.address = address
+        self.bus = bus if bus is not None else SMBus(self.bus_id)
+        self.PWR_MGMT_1 = PWR_MGMT_1
+        self.ACCEL_XOUT_H = ACCEL_XOUT_H
+        self.GYRO_XOUT_H = GYRO_XOUT_H
+        self.TEMP_OUT_H = TEMP_OUT_H
+        self.fifo_fields = None
+        self.fifo_overflows = 0
+        self.bus.write_byte_data(self.address, self.PWR_MGMT_1, 0)
+        if sample_rate_div is not None or dlpf is not None:
+            self.configure(sample_rate_div, dlpf)
+
+    def configure(self, sample_rate_div=None, dlpf=None):
+        """サンプリングレート分周 (SMPLRT_DIV, 0～255) とデジタルローパスフィルタ (DLPF_CFG, 0～6) を設定する.
+
+        サンプリングレートは、DLPFが0なら 8kHz/(1+分周)、それ以外は 1kHz/(1+分周).
+        """
+        if sample_rate_div is not None:
+            if not 0 <= sample_rate_div <= 255:
+                raise ValueError(f"SMPLRT_DIV は 0～255 で指定してください: {sample_rate_div}")
+            self.bus.write_byte_data(self.address, SMPLRT_DIV, sample_rate_div)
+        if dlpf is not None:
+            if not 0 <= dlpf <= 6:
+                raise ValueError(f"DLPF_CFG は 0～6 で指定してください: {dlpf}")
+            config = self.bus.read_byte_data(self.address, CONFIG)
+            self.bus.write_byte_data(self.address, CONFIG, (config & ~0x07) | dlpf)
+
+    @property
+    def sample_rate(self):
+        """現在の設定でのサンプリングレート (Hz)."""
+        div = self.bus.read_byte_data(self.address, SMPLRT_DIV)
+        dlpf = self.bus.read_byte_data(self.address, CONFIG) & 0x07
+        gyro_rate = 8000.0 if dlpf in (0, 7) else 1000.0
+        return gyro_rate / (1 + div)
+
+    def read_words(self, reg, count):
+        """regから連続するcount個の符号付き16ビット値を1回の転送で読む."""
+        data = self.bus.read_i2c_block_data(self.address, reg, 2 * count)
+        return np.frombuffer(bytes(data), dtype=">i2").astype(int).tolist()
+
+    def read_i2c_word(self, reg):
+        return self.read_words(reg, 1)[0]
+
+    def read_all(self):
+        """加速度・温度・角速度を1回の転送 (14バイト) で読み、同じサンプルの値として返す."""
+        values = decode_samples(self.bus.read_i2c_block_data(self.address, self.ACCEL_XOUT_H, 14))[0]
+        sample = dict(zip(SAMPLE_FIELDS, values.tolist()))
+        return {
+            'accel': {'x': sample['accel_x'], 'y': sample['accel_y'], 'z': sample['accel_z']},
+            'gyro': {'x': sample['gyro_x'], 'y': sample['gyro_y'], 'z': sample['gyro_z']},
+            'temp': sample['temp'],
+        }
+
+    def get_accel(self):
+        x, y, z = self.read_words(self.ACCEL_XOUT_H, 3)
+        return {
+            'x': x / ACCEL_SCALE,
+            'y': y / ACCEL_SCALE,
+            'z': z / ACCEL_SCALE
+        }
+
+    def get_gyro(self):
+        x, y, z = self.read_words(self.GYRO_XOUT_H, 3)
+        return {
+            'x': x / GYRO_SCALE,
+            'y': y / GYRO_SCALE,
+            'z': z / GYRO_SCALE
+        }
+
+    def get_temp(self):
+        raw_temp = self.read_i2c_word(self.TEMP_OUT_H)
+        return raw_temp / TEMP_SCALE + TEMP_OFFSET
+
+    def enable_fifo(self, accel=True, temp=True, gyro=True):
+        """FIFOを空にして、指定した値のサンプルを溜め始める."""
+        flags = (FIFO_EN_ACCEL if accel else 0) | (FIFO_EN_TEMP if temp else 0) | (FIFO_EN_GYRO if gyro else 0)
+        if not flags:
+            raise ValueError("FIFOに溜める値を1つ以上指定してください。")
+        self.fifo_fields = tuple(f for f in SAMPLE_FIELDS
+                                 if (accel and f.startswith("accel")) or (temp and f == "temp")
+                                 or (gyro and f.startswith("gyro")))
+        self.bus.write_byte_data(self.address, USER_CTRL, 0)
+        self.bus.write_byte_data(self.address, FIFO_EN, flags)
+        self.reset_fifo()
+
+    def disable_fifo(self):
+        self.bus.write_byte_data(self.address, USER_CTRL, 0)
+        self.bus.write_byte_data(self.address, FIFO_EN, 0)
+        self.fifo_fields = None
+
+    def reset_fifo(self):
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_RESET)
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_EN)
+
+    def fifo_count(self):
+        high, low = self.bus.read_i2c_block_data(self.address, FIFO_COUNTH, 2)
+        return (high << 8) | low
+
+    def read_fifo(self, max_samples=None):
+        """FIFOに溜まったサンプルを1回の転送でまとめて読み、(サンプル数, len(fifo_fields)) の配列で返す.
+
+        FIFOが一杯 (あふれた可能性がある) ときは、サンプルの区切りがずれるためFIFOを空にして空の配列を返す.
+        """
+        if self.fifo_fields is None:
+            raise RuntimeError("enable_fifo を先に呼んでください。")
+        frame_size = 2 * len(self.fifo_fields)
+        count = self.fifo_count()
+        if count >= FIFO_SIZE:
+            self.fifo_overflows += 1
+            self.reset_fifo()
+            return np.empty((0, len(self.fifo_fields)))
+        samples = count // frame_size
+        if max_samples is not None:
+            samples = min(samples, max_samples)
+        if not samples:
+            return np.empty((0, len(self.fifo_fields)))
+        write = i2c_msg.write(self.address, [FIFO_R_W])
+        read = i2c_msg.read(self.address, samples * frame_size)
+        self.bus.i2c_rdwr(write, read)
+        return decode_samples(bytes(read), self.fifo_fields)
+
+    def close(self):
+        self.bus.close()
@@ -0,0 +1,186 @@
+import re
+from datetime import datetime, timedelta
+
+# NMEAメッセージの厳格な正規表現パターン（行全体が開始から終了まで一致）
+# ser.read(in_waiting)と組み合わせるため、\r?\n?$は含めない
+NMEA_SENTENCE_PATTERN = re.compile(r'^\$[A-Z]{2}[A-Z]{3},.*?\*[0-9A-F]{2}$')
+
+# 緯度経度を更新するメッセージ (これを解析したときに履歴へ追加する)
+POSITION_SENTENCES = ('GGA', 'RMC')
+
+
+# NMEA → Decimal 度変換 (より堅牢に数値部分を抽出)
+def convert_to_decimal(value, direction):
+    if not value:
+        return 0.0
+
+    try:
+        # 数値部分のみを正規表現で抽出
+        match = re.match(r'^\d+(\.\d+)?', value)
+        if not match:
+            return 0.0
+
+        float_value_str = match.group(0) # 抽出された数値文字列
+
+        if '.' not in float_value_str:
+            return 0.0 # 小数点がない場合も不正とみなす (NMEAの緯度経度では必須)
+
+        parts = float_value_str.split('.')
+        degrees_str = parts[0]
+        minutes_str = parts[1]
+
+        degrees = 0.0
+        minutes = 0.0
+
+        if len(degrees_str) >= 4: # 緯度または経度 (DDMM.MMMM or DDDMM.MMMM)
+            # 緯度/経度に応じた度の部分を抽出
+            if len(degrees_str) == 4: # 緯度 DDMM
+                degrees = float(degrees_str[0:2])
+                minutes = float(degrees_str[2:] + '.' + minutes_str)
+            elif len(degrees_str) >= 5: # 経度 DDDMM (少なくとも5桁あれば経度とみなす)
+                degrees = float(degrees_str[0:3])
+                minutes = float(degrees_str[3:] + '.' + minutes_str)
+            else:
+                return 0.0 # 不明なフォーマット
+
+            decimal_degrees = degrees + (minutes / 60.0)
+
+            if direction in ['S', 'W']:
+                decimal_degrees *= -1
+
+            return decimal_degrees
+    except (ValueError, IndexError):
+        return 0.0
+    return 0.0
+
+
+def nmea_time_to_iso(time_str, date_str=''):
+    try:
+        if '.' in time_str:
+            # 小数点以下の秒数を取得し、時刻文字列から削除
+            seconds_parts = time_str.split('.')
+            time_only_str = seconds_parts[0]
+            milliseconds = int(float('0.' + seconds_parts[1]) * 1000)
+        else:
+            time_only_str = time_str
+            milliseconds = 0
+
+        if date_str:
+            dt_obj = datetime.strptime(f"{date_str}{time_only_str}", "%d%m%y%H%M%S")
+        else:
+            # 日付がない場合、システムの日付を使用 (タイムゾーン情報なし)
+            today = datetime.utcnow().strftime("%d%m%y")
+            dt_obj = datetime.strptime(f"{today}{time_only_str}", "%d%m%y%H%M%S")
+
+        dt_obj = dt_obj + timedelta(milliseconds=milliseconds)
+
+        return dt_obj.isoformat(timespec='milliseconds') + 'Z' # UTCであることを示す
+    except (ValueError, IndexError):
+        return ''
+
+
+# ヘルパー関数: 安全なfloat変換
+def safe_float_convert(value, default=0.0):
+    try:
+        return float(value)
+    except (ValueError, IndexError):
+        return default
+
+
+# ヘルパー関数: 安全なint変換
+def safe_int_convert(value, default=0):
+    try:
+        return int(float(value)) # intに変換する前にfloatを経由して小数も扱える
+    except (ValueError, IndexError):
+        return default
+
+
+def update_gnss_data(gnss_data, potential_line):
+    """NMEAメッセージ1行 (形式は確認済み) を種類ごとに解析してgnss_dataを更新し、メッセージタイプ (GGAなど) を返す."""
+    # チェックサム (*hh) を除いてから区切る (最後の項目に付いたままだと数値に変換できない)
+    parts = potential_line.split('*', 1)[0].split(',')
+    if len(parts) < 2:
+        return None
+
+    # トークIDとメッセージタイプを抽出
+    sentence_type_raw = parts[0][1:]
+    sentence_type = sentence_type_raw[2:]
+
+    # HDTの処理 (startswithチェックは維持)
+    if potential_line.startswith(('$GNHDT', '$GPHDT')):
+        gnss_data['heading'] = safe_float_convert(parts[1])
+
+    elif sentence_type == 'GGA':
+        if len(parts) >= 10:
+            gnss_data['timestamp_utc'] = parts[1]
+            gnss_data['lat'] = convert_to_decimal(parts[2], parts[3])
+            gnss_data['lng'] = convert_to_decimal(parts[4], parts[5])
+            gnss_data['fix'] = parts[6] if len(parts[6]) == 1 and parts[6].isdigit() else '0'
+            gnss_data['num_satellites'] = safe_int_convert(parts[7])
+            gnss_data['hdop'] = safe_float_convert(parts[8])
+            gnss_data['alt'] = safe_float_convert(parts[9])
+
+            if gnss_data.get('date_utc'):
+                gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_data['timestamp_utc'], gnss_data['date_utc'])
+            else:
+                gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_data['timestamp_utc'])
+
+    elif sentence_type == 'RMC':
+        if len(parts) >= 10:
+            gnss_data['timestamp_utc'] = parts[1]
+            gnss_data['lat'] = convert_to_decimal(parts[3], parts[4])
+            gnss_data['lng'] = convert_to_decimal(parts[5], parts[6])
+            gnss_data['speed'] = safe_float_convert(parts[7])
+            gnss_data['date_utc'] = parts[9]
+            gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_data['timestamp_utc'], gnss_data['date_utc'])
+
+    elif sentence_type == 'ZDA':
+        # $--ZDA,hhmmss.ss,dd,mm,yyyy,... → date_utc は RMC と同じ ddmmyy
+        if len(parts) > 4:
+            gnss_data['timestamp_utc'] = parts[1]
+            gnss_data['date_utc'] = f"{parts[2].zfill(2)}{parts[3].zfill(2)}{parts[4][-2:]}"
+            gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_data['timestamp_utc'], gnss_data['date_utc'])
+
+    # GSAメッセージの解析
+    elif sentence_type == 'GSA':
+        if len(parts) >= 18:
+            gnss_data['mode_ma'] = parts[1]
+            gnss_data['mode_fix_type'] = parts[2]
+
+            # GGAの測位品質 (4=RTK Fixなど) は残し、GSAでFixなし/ありだけを反映する
+            if gnss_data['mode_fix_type'] == '1': gnss_data['fix'] = '0'
+            elif gnss_data['mode_fix_type'] in ('2', '3') and gnss_data.get('fix', '0') == '0': gnss_data['fix'] = '1'
+
+            sat_ids_in_solution = []
+            for i in range(3, 15):
+                if parts[i]:
+                    sat_ids_in_solution.append(safe_int_convert(parts[i]))
+            gnss_data['satellites_in_use'] = sat_ids_in_solution
+
+            gnss_data['pdop'] = safe_float_convert(parts[15])
+            gnss_data['hdop'] = safe_float_convert(parts[16])
+            gnss_data['vdop'] = safe_float_convert(parts[17])
+
+    # GPGSTメッセージの解析
+    elif sentence_type == 'GST':
+        if len(parts) >= 9:
+            gnss_data['rms'] = safe_float_convert(parts[2])
+            gnss_data['smjr_std'] = safe_float_convert(parts[3])
+            gnss_data['smnr_std'] = safe_float_convert(parts[4])
+            gnss_data['orient'] = safe_float_convert(parts[5])
+            gnss_data['lat_std'] = safe_float_convert(parts[6])
+            gnss_data['lon_std'] = safe_float_convert(parts[7])
+            gnss_data['alt_std'] = safe_float_convert(parts[8])
+
+    # GPVTGメッセージの解析
+    elif sentence_type == 'VTG':
+        # $--VTG,course_true,T,course_mag,M,speed_knots,N,speed_kmh,K,mode
+        # parts:    0       1          2 3         4 5         6 7       8 9
+        if len(parts) >= 10: # Mode indicator (Field 10) まで存在する場合
+            gnss_data['vtg_course_true'] = safe_float_convert(parts[1])
+            gnss_data['vtg_course_mag'] = safe_float_convert(parts[3])
+            gnss_data['vtg_speed_knots'] = safe_float_convert(parts[5])
+            gnss_data['vtg_speed_kmh'] = safe_float_convert(parts[7])
+            gnss_data['vtg_mode_ind'] = parts[9]
+
+    return sentence_type
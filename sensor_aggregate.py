@@ -0,0 +1,110 @@
+import os
+import threading
+
+import numpy as np
+
+STATS = ("count", "mean", "std", "min", "max")
+
+
+class BinnedStats2D:
+    """2次元の区間 (例: ヨー角1度 × 温度1度) ごとに、値の個数・平均・分散・最小・最大を逐次集計する.
+
+    1サンプルの追加は区間の数によらず一定の手間で、メモリも区間の数だけで決まるため、長時間の記録に使える.
+    平均と分散はWelfordの方法で更新する. wrap_xならxは周期的 (角度など) とみなし、範囲外のxを折り返す.
+    """
+
+    def __init__(self, x_lo, x_bins, y_lo, y_bins, bin_width=1.0, wrap_x=False):
+        self.x_lo = x_lo
+        self.y_lo = y_lo
+        self.bin_width = bin_width
+        self.wrap_x = wrap_x
+        shape = (x_bins, y_bins)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)  # 平均からの偏差の2乗の和
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.total = 0
+        self.outside = 0  # 範囲外で集計しなかったサンプル数
+        self.lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    @property
+    def extent(self):
+        """(x左端, x右端, y下端, y上端). imshowのextentに渡せる."""
+        x_bins, y_bins = self.shape
+        return (self.x_lo, self.x_lo + x_bins * self.bin_width, self.y_lo, self.y_lo + y_bins * self.bin_width)
+
+    def _index(self, x, y):
+        x_bins, y_bins = self.shape
+        ix = int((x - self.x_lo) // self.bin_width)
+        iy = int((y - self.y_lo) // self.bin_width)
+        if self.wrap_x:
+            ix %= x_bins
+        if not (0 <= ix < x_bins and 0 <= iy < y_bins):
+            return None
+        return ix, iy
+
+    def add(self, x, y, value):
+        """(x, y) の区間にvalueを加える. 範囲外ならFalseを返す."""
+        index = self._index(x, y)
+        with self.lock:
+            if index is None:
+                self.outside += 1
+                return False
+            n = self.count[index] + 1
+            delta = value - self.mean[index]
+            mean = self.mean[index] + delta / n
+            self.count[index] = n
+            self.mean[index] = mean
+            self.m2[index] += delta * (value - mean)
+            if value < self.min[index]:
+                self.min[index] = value
+            if value > self.max[index]:
+                self.max[index] = value
+            self.total += 1
+        return True
+
+    def grid(self, stat="mean"):
+        """統計値 (STATSのいずれか) の2次元配列の複製. サンプルの無い区間はNaN (countは0)."""
+        with self.lock:
+            count = self.count.copy()
+            if stat == "count":
+                return count
+            if stat == "std":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    values = np.sqrt(self.m2 / (count - 1))
+                return np.where(count > 1, values, np.nan)
+            if stat not in ("mean", "min", "max"):
+                raise ValueError(f"不明な統計値です: {stat}")
+            return np.where(count > 0, getattr(self, stat), np.nan)
+
+    def save(self, file_path):
+        """集計をnpz形式で保存する. 書き込み途中で止まっても前回の保存が残るよう、別名に書いてから置き換える."""
+        with self.lock:
+            arrays = {name: getattr(self, name).copy() for name in ("count", "mean", "m2", "min", "max")}
+            meta = np.array([self.x_lo, self.y_lo, self.bin_width, self.wrap_x, self.total, self.outside], dtype=float)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, meta=meta, **arrays)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            x_lo, y_lo, bin_width, wrap_x, total, outside = data["meta"].tolist()
+            x_bins, y_bins = data["count"].shape
+            aggregate = cls(x_lo, x_bins, y_lo, y_bins, bin_width, bool(wrap_x))
+            for name in ("count", "mean", "m2", "min", "max"):
+                getattr(aggregate, name)[...] = data[name]
+        aggregate.total = int(total)
+        aggregate.outside = int(outside)
+        return aggregate
+
+    def compatible(self, other):
+        """区間の並びが同じか (保存した集計を続きに使えるか)."""
+        return (self.shape == other.shape and self.x_lo == other.x_lo and self.y_lo == other.y_lo
+                and self.bin_width == other.bin_width)
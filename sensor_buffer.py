@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+
+class SampleRing:
+    """時刻付きのサンプルを固定長で保持するリングバッファ. 書き込みと読み出しは別のスレッドからでよい.
+
+    配列を2周分確保して同じ値を2か所に書くため、古い順に並んだ最新のサンプルがいつも連続した範囲として取り出せる.
+    """
+
+    def __init__(self, capacity, columns=1, dtype=np.float64):
+        self.capacity = capacity
+        self.columns = columns
+        self._times = np.empty(2 * capacity, dtype=np.float64)
+        self._values = np.empty((2 * capacity, columns), dtype=dtype)
+        self._next = 0  # 次に書き込む位置 (0～capacity-1)
+        self.count = 0  # 保持しているサンプル数
+        self.total = 0  # これまでに追加したサンプル数
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, value):
+        self.extend(t, [value])
+
+    def extend(self, t, values):
+        """サンプルをまとめて追加する. tは時刻の配列か、全サンプル共通の時刻 (受信時刻など)."""
+        values = np.asarray(values, dtype=self._values.dtype).reshape(-1, self.columns)
+        n = len(values)
+        if not n:
+            return
+        times = np.broadcast_to(np.asarray(t, dtype=np.float64), (n,))
+        if n > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+        with self.lock:
+            index = (self._next + np.arange(len(values))) % self.capacity
+            self._times[index] = times
+            self._times[index + self.capacity] = times
+            self._values[index] = values
+            self._values[index + self.capacity] = values
+            self._next = int(index[-1] + 1) % self.capacity
+            self.count = min(self.capacity, self.count + n)
+            self.total += n
+
+    def _range(self):
+        end = self._next + self.capacity
+        return end - self.count, end
+
+    def latest(self):
+        """最新の (時刻, 値の配列). 空ならNone."""
+        with self.lock:
+            if not self.count:
+                return None
+            i = self._next + self.capacity - 1
+            return self._times[i], self._values[i].copy()
+
+    def window(self, seconds=None):
+        """最新のサンプルからseconds秒以内 (Noneなら全部) の (時刻, 値) を古い順に複製して返す."""
+        with self.lock:
+            start, end = self._range()
+            if seconds is not None and self.count:
+                since = self._times[end - 1] - seconds
+                start += int(np.searchsorted(self._times[start:end], since, side="left"))
+            return self._times[start:end].copy(), self._values[start:end].copy()
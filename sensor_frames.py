@@ -0,0 +1,159 @@
+import numpy as np
+
+ASCII_ZERO = 0x30
+ASCII_NINE = 0x39
+
+
+class FixedFrameDecoder:
+    """固定長のASCIIフレームを区切り直しながら、受信済みの全フレームをまとめて復号する.
+
+    既定は温度センサーの6バイトのフレームで、4バイト目と5バイト目が値の十の位と一の位.
+    フレームの区切りは、数字の位置に数字が並び、それ以外の位置のバイトが一定になる位置として見つける.
+    同期後に崩れたフレームが来たら、有効なフレームが2つ続く位置まで読み飛ばして同期を取り直す.
+    """
+
+    def __init__(self, frame_length=6, digit_positions=(3, 4), lock_frames=3):
+        self.frame_length = frame_length
+        self.digit_positions = list(digit_positions)
+        self.other_positions = [i for i in range(frame_length) if i not in digit_positions]
+        self.lock_frames = lock_frames
+        self.buffer = bytearray()
+        self.fixed_positions = None  # 同期中に一定だった位置 (Noneなら未同期)
+        self.signature = None  # fixed_positionsのバイト値
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.resyncs = 0
+        self._lost_bytes = 0  # 同期を失ってから読み飛ばしたバイト数
+        self._resyncing = False
+
+    @property
+    def synced(self):
+        return self.fixed_positions is not None
+
+    def feed(self, data):
+        """受信データを追加し、復号できた全フレームの値 (十の位*10+一の位) をnumpy配列で返す."""
+        self.buffer.extend(data)
+        values = []
+        while True:
+            if not self.synced and not self._acquire():
+                break
+            decoded, complete = self._decode_aligned()
+            if len(decoded):
+                values.append(decoded)
+            if complete or not self._resync():
+                break
+        if not values:
+            return np.empty(0, dtype=np.int16)
+        return np.concatenate(values) if len(values) > 1 else values[0]
+
+    def stats(self):
+        return {"frames": self.frames, "dropped_bytes": self.dropped_bytes, "resyncs": self.resyncs,
+                "synced": self.synced}
+
+    def _rows(self, start=0):
+        n = (len(self.buffer) - start) // self.frame_length
+        if n <= 0:
+            return np.empty((0, self.frame_length), dtype=np.uint8)
+        return self._view()[start:start + n * self.frame_length].reshape(n, self.frame_length)
+
+    def _view(self):
+        # bytearrayを直接frombufferすると、配列が残っている間バッファを縮められないため複製する
+        return np.frombuffer(bytes(self.buffer), dtype=np.uint8)
+
+    def _digits_ok(self, rows):
+        digits = rows[:, self.digit_positions]
+        return ((digits >= ASCII_ZERO) & (digits <= ASCII_NINE)).all(axis=1)
+
+    def _valid(self, rows):
+        ok = self._digits_ok(rows)
+        if self.fixed_positions:
+            ok &= (rows[:, self.fixed_positions] == self.signature).all(axis=1)
+        return ok
+
+    def _acquire(self):
+        """区切り位置と一定のバイト位置を探す. 数字の位置に数字が並ぶフレームがlock_frames個続く最初の位置で同期する.
+
+        その手前の崩れたフレームやごみだけを捨て、同期した位置から先はfeedがそのまま復号する.
+        """
+        length = self.frame_length
+        span = length * self.lock_frames
+        buf = self._view()
+        if len(buf) < span:
+            return False
+        ok = self._digits_ok(np.lib.stride_tricks.sliding_window_view(buf, length))
+        runs = ok[:len(ok) - span + length].copy()
+        for i in range(1, self.lock_frames):
+            runs &= ok[i * length:len(ok) - span + length + i * length]
+        starts = np.flatnonzero(runs)
+        if not len(starts):
+            # 同期できる見込みの無い先頭部分を捨てる (連続の始まりになり得る末尾は残す)
+            keep = span - 1
+            if len(buf) > keep:
+                self._drop(len(buf) - keep)
+            return False
+        # 最初の候補から1フレーム以内の区切りのうち、一定の位置が最も多いものを選ぶ
+        best = None
+        for start in starts[starts < starts[0] + length]:
+            start = int(start)
+            row_ok = ok[start::length]
+            n = int(np.argmin(row_ok)) if not row_ok.all() else len(row_ok)
+            rows = buf[start:start + n * length].reshape(n, length)
+            others = rows[:, self.other_positions]
+            fixed = [p for p, column in zip(self.other_positions, others.T) if (column == column[0]).all()]
+            if best is None or len(fixed) > len(best[1]):
+                best = (start, fixed, rows[0])
+        start, fixed, first = best
+        self._drop(start)
+        self.fixed_positions = fixed
+        self.signature = first[fixed].copy() if fixed else None
+        self._lost_bytes = 0
+        return True
+
+    def _decode_aligned(self):
+        """先頭から区切りの合ったフレームを復号する. 崩れたフレームがあればその手前で止め、completeをFalseで返す."""
+        rows = self._rows()
+        if not len(rows):
+            return np.empty(0, dtype=np.int16), True
+        ok = self._valid(rows)
+        bad = np.flatnonzero(~ok)
+        n = int(bad[0]) if len(bad) else len(rows)
+        good = rows[:n]
+        values = ((good[:, self.digit_positions[0]].astype(np.int16) - ASCII_ZERO) * 10
+                  + (good[:, self.digit_positions[1]].astype(np.int16) - ASCII_ZERO))
+        del self.buffer[:n * self.frame_length]
+        self.frames += n
+        if n:
+            self._lost_bytes = 0
+            self._resyncing = False
+        return values, not len(bad)
+
+    def _resync(self):
+        """崩れたフレームの先から、有効なフレームが2つ続く位置を探す. 見つかればTrue."""
+        if not self._resyncing:
+            self._resyncing = True
+            self.resyncs += 1
+        length = self.frame_length
+        buf = self._view()
+        if len(buf) >= 2 * length + 1:
+            windows = np.lib.stride_tricks.sliding_window_view(buf[1:], length)
+            ok = self._valid(windows)
+            pairs = ok[:-length] & ok[length:]
+            found = np.flatnonzero(pairs)
+            if len(found):
+                self._drop(1 + int(found[0]))
+                return True
+        # 見つからなければ、次のフレームの候補になり得る末尾だけ残して待つ
+        keep = 2 * length - 1
+        if len(self.buffer) > keep:
+            self._drop(len(self.buffer) - keep)
+        if self._lost_bytes > length * (self.lock_frames + 1) * 4:
+            # 長く同期できない場合はフレームの形式が変わったとみなして学習し直す
+            self.fixed_positions = None
+            self.signature = None
+            self._resyncing = False
+        return False
+
+    def _drop(self, n):
+        del self.buffer[:n]
+        self.dropped_bytes += n
+        self._lost_bytes += n
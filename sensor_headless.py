@@ -0,0 +1,118 @@
+import json
+import signal
+import threading
+import time
+
+from sensor_buffer import SampleRing
+from sensor_hub import SensorHub
+from sensor_recorder import SensorRecorder
+
+
+def add_headless_arguments(parser):
+    """main.py / tp.py / imu.py に共通の、画面なしで記録するためのオプションを追加する."""
+    parser.add_argument("--headless", action="store_true",
+                        help="グラフを表示せず (matplotlibを読み込まず) に取得と記録だけを行う")
+    parser.add_argument("--record", metavar="DIR", help="全サンプルと1秒・1分の集約をDIRに記録する")
+    parser.add_argument("--stdout", action="store_true", help="サンプルを1行1つのJSONで標準出力へ書く")
+    parser.add_argument("--png", metavar="PATH",
+                        help="終了時 (とSIGUSR1を受けたとき) にグラフをPNGで保存する (--headless のとき)")
+    parser.add_argument("--png-seconds", type=float, default=600, help="PNGに描く直近の秒数")
+
+
+def check_headless_arguments(parser, args):
+    if (args.record or args.stdout or args.png) and not args.headless:
+        parser.error("--record / --stdout / --png は --headless と一緒に指定してください。")
+
+
+class StartupTimer:
+    """起動からの経過時間を測る. startedはスクリプトの先頭で取ったtime.perf_counterの値."""
+
+    def __init__(self, started):
+        self.started = started
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self, label):
+        print(f"起動から{label}まで {self.elapsed_ms():.1f} ms")
+
+
+def render_png(file_path, rings, title=None):
+    """取得元ごとの直近のサンプル (rings: {取得元: (値の名前, SampleRing)}) を、1つの取得元につき1つのグラフにしてPNGで保存する.
+
+    matplotlibはこのときに初めて (画面の要らないAggバックエンドで) 読み込む.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    streams = [(name, entry) for name, entry in rings.items() if len(entry[1])]
+    if not streams:
+        print("PNGに描くサンプルがありません。")
+        return False
+    fig, axes = plt.subplots(len(streams), 1, figsize=(10, 3 * len(streams)), squeeze=False)
+    for ax, (name, (fields, ring)) in zip(axes[:, 0], streams):
+        times, values = ring.window()
+        elapsed = times - times[-1]
+        for i, field in enumerate(fields):
+            ax.plot(elapsed, values[:, i], label=field)
+        ax.set_title(name)
+        ax.set_xlabel('時間 (秒, 最新が0)')
+        ax.grid(True)
+        ax.legend(loc='upper left')
+    if title:
+        fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(file_path)
+    plt.close(fig)
+    print(f"グラフを '{file_path}' に保存しました。")
+    return True
+
+
+def run_headless(sources, args, timer, png_title=None):
+    """GUIなしで取得元を動かし、記録・標準出力・PNGへ書き出す. Ctrl+Cで終わる."""
+    hub = SensorHub(sources, log=print)
+    recorder = SensorRecorder(args.record) if args.record else None
+    if recorder:
+        recorder.attach(hub)
+
+    first_sample = set()
+    rings = {}
+    png_requested = threading.Event()
+    capacity = 200 * max(1, int(args.png_seconds))  # 200 Hzでpng_seconds秒分
+
+    def on_sample(stream, t, values):
+        if stream not in first_sample:
+            first_sample.add(stream)
+            timer.report(f"{stream} の最初のサンプル")
+        if args.stdout:
+            print(json.dumps(dict(values, stream=stream, t=hub.wall_time(t))), flush=True)
+        if args.png:
+            entry = rings.get(stream)
+            if entry is None:
+                fields = sorted(values)
+                entry = rings[stream] = (fields, SampleRing(capacity, columns=len(fields)))
+            fields, ring = entry
+            ring.append(t, [values.get(field, float("nan")) for field in fields])
+
+    hub.subscribe(on_sample)
+    if args.png and hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: png_requested.set())
+    hub.start()
+    timer.report("取得開始")
+    try:
+        while True:
+            if png_requested.wait(1.0):
+                png_requested.clear()
+                render_png(args.png, rings, png_title)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+        if recorder:
+            recorder.close()
+        if args.png:
+            render_png(args.png, rings, png_title)
+        for stream, stats in hub.stats().items():
+            print(f"{stream}: {stats['count']} サンプル" + (f" (エラー: {stats['error']})" if stats.get("error") else ""))
+    return 0
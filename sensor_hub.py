@@ -0,0 +1,336 @@
+import argparse
+import collections
+import threading
+import time
+
+import serial
+
+from sensor_frames import FixedFrameDecoder
+from sensor_recorder import SensorRecorder
+from sensor_schedule import FixedRateScheduler
+
+
+class SensorSource:
+    """ハブに載せる取得元 (プラグイン) の基底クラス.
+
+    runは取得元ごとの専用スレッドで呼ばれ、stopされるまでサンプルをhub.publishで渡し続ける.
+    例外で抜けた場合、ハブはretry_interval秒後にrunを呼び直す.
+    """
+
+    kind = None
+    retry_interval = 5.0
+
+    def __init__(self, name=None):
+        self.name = name or self.kind
+        self.running = False
+
+    def run(self, hub):
+        raise NotImplementedError
+
+    def stop(self):
+        self.running = False
+
+    def describe(self):
+        return self.name
+
+
+class TemperatureFrameSource(SensorSource):
+    """6バイトのフレームで値を送る温度センサー (main.py / tp.py が使う). 値は負の温度 (度).
+
+    フレームが崩れて同期を取り直したときと、valid_rangeを外れた値を受け取ったときはhub.logで知らせる.
+    """
+
+    kind = "temperature"
+
+    def __init__(self, port, baudrate=9600, name=None, valid_range=(-90, -20)):
+        super().__init__(name)
+        self.port = port
+        self.baudrate = baudrate
+        self.valid_range = valid_range
+        self.decoder = FixedFrameDecoder()  # 4バイト目が十の位、5バイト目が一の位 (ASCII)
+
+    def describe(self):
+        return f"{self.name} ({self.port})"
+
+    def run(self, hub):
+        self.running = True
+        with serial.Serial(self.port, self.baudrate, timeout=0.1) as ser:
+            hub.log(f"{self.describe()}: シリアルポートを開きました。")
+            while self.running:
+                raw_data = ser.read(max(1, ser.in_waiting))
+                if not raw_data:
+                    continue
+                received_at = time.monotonic()
+                resyncs = self.decoder.resyncs
+                # 値の範囲が -20から-90なので、受け取った正の値を負の値に変換
+                temperatures = [-value for value in self.decoder.feed(raw_data).tolist()]
+                if self.decoder.resyncs != resyncs:
+                    hub.log(f"警告: {self.describe()}: フレームが崩れたため同期を取り直します "
+                            f"(読み捨て累計 {self.decoder.dropped_bytes} バイト)")
+                lo, hi = self.valid_range
+                out_of_range = [t for t in temperatures if not lo <= t <= hi]
+                if out_of_range:
+                    hub.log(f"警告: {self.describe()}: 範囲外の値を受信しました: {out_of_range}")
+                for temperature in temperatures:
+                    hub.publish(self.name, {"temperature": temperature}, received_at)
+
+
+class YawLineSource(SensorSource):
+    """ヨー角 (度) を1行に1つの文字列で送る機器 (imu.py が使う). 例: "123.7\n"."""
+
+    kind = "yaw_line"
+
+    def __init__(self, port, baudrate=9600, name=None):
+        super().__init__(name)
+        self.port = port
+        self.baudrate = baudrate
+        self.parse_errors = 0
+
+    def describe(self):
+        return f"{self.name} ({self.port})"
+
+    def run(self, hub):
+        self.running = True
+        with serial.Serial(self.port, self.baudrate, timeout=0.1) as ser:
+            hub.log(f"{self.describe()}: シリアルポートを開きました。")
+            while self.running:
+                line = ser.readline().decode("ascii", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    yaw = float(line)
+                except ValueError:
+                    self.parse_errors += 1
+                    hub.log(f"データパースエラー: 数値に変換できません。受信データ: '{line}'")
+                    continue
+                hub.publish(self.name, {"yaw": yaw})
+
+
+class MPU6050Source(SensorSource):
+    """MPU6050の角速度 z を一定周期で読み、バイアスを補正してヨー角に積分する (tp.py と同じ処理).
+
+    サンプルは {"yaw", "rate" (補正後の角速度), "temp" (内部温度)}. bias_fileがあればバイアスのモデルを読み込む.
+    """
+
+    kind = "mpu6050"
+
+    def __init__(self, bus_id=1, address=0x68, rate_hz=200, bias_file=None, name=None):
+        super().__init__(name)
+        self.bus_id = bus_id
+        self.address = address
+        self.rate_hz = rate_hz
+        self.bias_file = bias_file
+        self.scheduler = None
+
+    def describe(self):
+        return f"{self.name} (I2C {self.bus_id}, 0x{self.address:02X})"
+
+    def run(self, hub):
+        # smbus2はI2Cのある機器でだけ必要なので、使うときに読み込む
+        from gyro_bias import GyroBiasModel, StationaryDetector
+        from mpu6050 import MPU6050
+
+        self.running = True
+        bias_model = GyroBiasModel.load(self.bias_file) if self.bias_file else GyroBiasModel()
+        detector = StationaryDetector(window=max(1, int(self.rate_hz) // 2))
+        mpu = MPU6050(self.bus_id, self.address)
+        self.scheduler = FixedRateScheduler(self.rate_hz)
+        yaw = 0.0
+        try:
+            hub.log(f"{self.describe()}: 初期化しました。")
+            for tick in self.scheduler.ticks():
+                if not self.running:
+                    break
+                sample = mpu.read_all()
+                raw_rate = sample['gyro']['z']
+                if detector.update(raw_rate, sample['accel'], bias_model.expected_bias(sample['temp'])):
+                    bias_model.update(sample['temp'], raw_rate)
+                rate = bias_model.correct(raw_rate, sample['temp'])
+                yaw = (yaw + rate * tick.dt) % 360
+                hub.publish(self.name, {"yaw": yaw, "rate": rate, "temp": sample['temp']}, tick.time)
+        finally:
+            mpu.close()
+
+    def stop(self):
+        super().stop()
+        if self.scheduler:
+            self.scheduler.stop()
+
+
+# 取得元の種類. create_sourceとserver.pyの設定はこの名前で取得元を選ぶ
+SOURCE_TYPES = {cls.kind: cls for cls in (TemperatureFrameSource, YawLineSource, MPU6050Source)}
+
+
+def register_source(cls):
+    """取得元の種類を追加する (クラスデコレーターとしても使える)."""
+    SOURCE_TYPES[cls.kind] = cls
+    return cls
+
+
+def create_source(kind, **options):
+    try:
+        cls = SOURCE_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"不明な取得元の種類です: {kind}") from None
+    return cls(**options)
+
+
+class _Stream:
+    """1つの取得元のサンプル. 送信待ちのサンプルと最新値を持つ."""
+
+    def __init__(self, max_pending):
+        self.pending = collections.deque(maxlen=max_pending)  # (時刻, 値の辞書)
+        self.latest = None
+        self.count = 0
+        self.dropped = 0  # 送信待ちがあふれて捨てたサンプル数
+
+
+class SensorHub:
+    """複数の取得元を1つのプロセスで動かし、全サンプルに時刻を付けて集める. GUIには依存しない.
+
+    取得元は1台につき1つのスレッドで動く. サンプルの時刻は単調時計で付け、送り出すときにUNIX時刻へ換算する.
+    drainで前回からのサンプルを取得元ごとにまとめて取り出し、subscribeした関数には1サンプルずつ渡す.
+    """
+
+    def __init__(self, sources=(), max_pending=2000, log=None):
+        self.sources = list(sources)
+        self.max_pending = max_pending
+        self.log = log or (lambda message: None)
+        self.streams = {}
+        self.subscribers = []
+        self.errors = {}  # 取得元の名前 -> 最後のエラー
+        self.lock = threading.Lock()
+        self.threads = []
+        self.running = False
+        # time.monotonic からUNIX時刻への換算 (起動時に1度だけ求め、時計の調整の影響を受けない)
+        self.wall_offset = time.time() - time.monotonic()
+
+    def add_source(self, source):
+        self.sources.append(source)
+        if self.running:
+            self._start_source(source)
+
+    def start(self):
+        self.running = True
+        for source in self.sources:
+            self._start_source(source)
+
+    def stop(self):
+        self.running = False
+        for source in self.sources:
+            source.stop()
+
+    def _start_source(self, source):
+        thread = threading.Thread(target=self._supervise, args=(source,), name=f"sensor-{source.name}", daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def _supervise(self, source):
+        while self.running:
+            try:
+                source.run(self)
+            except Exception as e:
+                self.errors[source.name] = str(e)
+                self.log(f"[ERROR] {source.describe()}: {e} ({source.retry_interval} 秒後に再接続します)")
+            if not self.running:
+                break
+            time.sleep(source.retry_interval)
+
+    def subscribe(self, callback):
+        """サンプルごとにcallback(stream, t, values)を呼ぶ (取得元のスレッドから). 解除する関数を返す."""
+        self.subscribers.append(callback)
+        return lambda: self.subscribers.remove(callback)
+
+    def publish(self, stream, values, t=None):
+        """取得元からサンプルを受け取る. tはtime.monotonicの時刻 (省略時は今)."""
+        if t is None:
+            t = time.monotonic()
+        with self.lock:
+            state = self.streams.get(stream)
+            if state is None:
+                state = self.streams[stream] = _Stream(self.max_pending)
+            if len(state.pending) == state.pending.maxlen:
+                state.dropped += 1
+            state.pending.append((t, values))
+            state.latest = (t, values)
+            state.count += 1
+        self.errors.pop(stream, None)
+        for callback in list(self.subscribers):
+            callback(stream, t, values)
+
+    def wall_time(self, t):
+        return t + self.wall_offset
+
+    def drain(self):
+        """前回のdrainからのサンプルを {取得元: {"t": [UNIX時刻], 値の名前: [値]}} の列形式で取り出す."""
+        with self.lock:
+            batches = {}
+            for stream, state in self.streams.items():
+                if not state.pending:
+                    continue
+                samples = list(state.pending)
+                state.pending.clear()
+                columns = {"t": [self.wall_time(t) for t, _ in samples]}
+                for name in samples[-1][1]:
+                    columns[name] = [values.get(name) for _, values in samples]
+                batches[stream] = columns
+        return batches
+
+    def latest(self):
+        """取得元ごとの最新のサンプル {取得元: {"t": UNIX時刻, 値の名前: 値}}."""
+        with self.lock:
+            return {stream: dict(state.latest[1], t=self.wall_time(state.latest[0]))
+                    for stream, state in self.streams.items() if state.latest}
+
+    def stats(self):
+        with self.lock:
+            stats = {stream: {"count": state.count, "dropped": state.dropped} for stream, state in self.streams.items()}
+        for source in self.sources:
+            entry = stats.setdefault(source.name, {"count": 0, "dropped": 0})
+            entry["error"] = self.errors.get(source.name)
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="センサーの取得元をまとめて動かし、取得元ごとのサンプル数を表示する (GUIなし).")
+    parser.add_argument("--temperature", metavar="PORT", help="6バイトのフレームの温度センサーのポート")
+    parser.add_argument("--yaw-line", metavar="PORT", help="ヨー角を1行ずつ送る機器のポート")
+    parser.add_argument("--baudrate", type=int, default=9600, help="温度センサー・ヨー角の機器のボーレート")
+    parser.add_argument("--mpu6050", type=int, metavar="BUS", help="MPU6050を接続したI2Cバスの番号")
+    parser.add_argument("--mpu6050-rate", type=float, default=200, help="MPU6050の取得頻度 (Hz)")
+    parser.add_argument("--interval", type=float, default=1.0, help="表示の間隔 (秒)")
+    parser.add_argument("--record", metavar="DIR", help="全サンプルと1秒・1分の集約をDIRに記録する")
+    args = parser.parse_args(argv)
+
+    sources = []
+    if args.temperature:
+        sources.append(TemperatureFrameSource(args.temperature, args.baudrate))
+    if args.yaw_line:
+        sources.append(YawLineSource(args.yaw_line, args.baudrate))
+    if args.mpu6050 is not None:
+        sources.append(MPU6050Source(args.mpu6050, rate_hz=args.mpu6050_rate))
+    if not sources:
+        parser.error("取得元を1つ以上指定してください。")
+
+    hub = SensorHub(sources, log=print)
+    recorder = SensorRecorder(args.record) if args.record else None
+    if recorder:
+        recorder.attach(hub)
+    hub.start()
+    try:
+        while True:
+            time.sleep(args.interval)
+            for stream, columns in hub.drain().items():
+                latest = {name: values[-1] for name, values in columns.items() if name != "t"}
+                print(f"{stream}: {len(columns['t'])} サンプル, 最新 {latest}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+        if recorder:
+            recorder.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+import time
+
+import numpy as np
+
+
+class AxisLimits:
+    """ヒステリシス付きの軸の範囲. データが範囲を出たときと、範囲に比べて十分小さくなったときだけ変える.
+
+    範囲を変えると図全体の描き直しになるため、毎フレームの自動調整 (relim/autoscale_view) の代わりに使う.
+    """
+
+    def __init__(self, lo, hi, margin=0.1, shrink_below=0.25):
+        self.initial = (lo, hi)
+        self.limits = (lo, hi)
+        self.margin = margin
+        self.shrink_below = shrink_below
+
+    def update(self, data_lo, data_hi):
+        """データの範囲に合わせて必要なら範囲を変え、変えたらTrueを返す."""
+        lo, hi = self.limits
+        span = hi - lo
+        outside = data_lo < lo or data_hi > hi
+        too_small = (data_hi - data_lo) < span * self.shrink_below and self.limits != self.initial
+        if not outside and not too_small:
+            return False
+        # 初期範囲より狭くはしない. 余白を付けて、少しはみ出たくらいでは再び変わらないようにする
+        new_lo = min(self.initial[0], data_lo)
+        new_hi = max(self.initial[1], data_hi)
+        pad = (new_hi - new_lo) * self.margin
+        new_lo = new_lo - pad if new_lo < self.initial[0] else new_lo
+        new_hi = new_hi + pad if new_hi > self.initial[1] else new_hi
+        if (new_lo, new_hi) == self.limits:
+            return False
+        self.limits = (new_lo, new_hi)
+        return True
+
+
+def minmax_decimate(x, y, max_points):
+    """折れ線の点を、区間ごとの最小と最大の2点 (元の順序) に間引き、およそmax_points点以下にする.
+
+    区間はサンプル数で等分する. 1区間が1画素の幅より狭ければ、描いた線の形は間引く前と変わらない.
+    """
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+    per_bin = -(-n // (max_points // 2))
+    m = n // per_bin * per_bin
+    base = np.arange(0, n, per_bin)
+    bins = y[:m].reshape(-1, per_bin)
+    lo, hi = bins.argmin(axis=1), bins.argmax(axis=1)
+    if m < n:
+        # 端数のサンプルも1区間として扱う
+        rest = y[m:]
+        lo = np.append(lo, rest.argmin())
+        hi = np.append(hi, rest.argmax())
+    index = (base[:, None] + np.column_stack((np.minimum(lo, hi), np.maximum(lo, hi)))).ravel()
+    return x[index], y[index]
+
+
+class TimeWindow:
+    """時間軸の表示範囲 (幅width秒). 最新の時刻が右端に達したときだけ、幅のstep_ratioずつ進める.
+
+    zoomで幅を変え、show_allで記録の最初からの全体を表示する (全体表示の範囲は時刻が右端に達したときに広げる).
+    """
+
+    def __init__(self, width, step_ratio=0.25, min_width=5.0):
+        self.width = width
+        self.step_ratio = step_ratio
+        self.min_width = min_width
+        self.show_whole = False
+        self.limits = (0.0, width)
+        self._changed = False
+
+    @property
+    def step(self):
+        return self.width * self.step_ratio
+
+    @property
+    def span_seconds(self):
+        """表示に使うサンプルの時間の幅 (全体表示ならNone)."""
+        return None if self.show_whole else self.width
+
+    def zoom(self, factor):
+        self.width = max(self.min_width, self.width * factor)
+        self.show_whole = False
+        self._changed = True
+
+    def show_all(self):
+        self.show_whole = True
+        self._changed = True
+
+    def update(self, t_latest, t_first=0.0):
+        """範囲を変えたらTrueを返す. t_firstは全体表示のときの左端."""
+        lo, hi = self.limits
+        if self.show_whole:
+            if not self._changed and lo == t_first and t_latest <= hi:
+                return False
+            hi = t_first + max(self.min_width, (t_latest - t_first) * (1 + self.step_ratio))
+            self.limits = (t_first, hi)
+        elif self._changed or t_latest < lo:
+            self.limits = (t_latest + self.step - self.width, t_latest + self.step)
+        elif t_latest > hi:
+            steps = -(-(t_latest - hi) // self.step)
+            hi += steps * self.step
+            self.limits = (hi - self.width, hi)
+        else:
+            return False
+        self._changed = False
+        return True
+
+
+def connect_zoom_keys(fig, time_window):
+    """キー操作で表示する時間の幅を変える. 「-」で2倍、「+」で半分、「0」で記録全体."""
+    actions = {
+        "-": lambda: time_window.zoom(2.0),
+        "+": lambda: time_window.zoom(0.5),
+        "=": lambda: time_window.zoom(0.5),
+        "0": time_window.show_all,
+    }
+
+    def on_key(event):
+        action = actions.get(event.key)
+        if action:
+            action()
+
+    return fig.canvas.mpl_connect("key_press_event", on_key)
+
+
+class BlitPlotter:
+    """線のデータだけを描き直す (blit) 周期描画. 軸の範囲が変わったときだけ図全体を描き直す.
+
+    updateは線にデータを設定する関数で、軸の範囲を変えたときにTrueを返す.
+    図全体の描画の直後に、線を除いた背景を保存しておき、通常のフレームでは背景を戻して線だけを描く.
+    """
+
+    def __init__(self, fig, lines, update, interval_ms=200):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.lines = list(lines)
+        self.update = update
+        self.frames = 0
+        self.full_redraws = 0
+        self.last_frame_ms = None
+        self._background = None
+        for line in self.lines:
+            line.set_animated(True)  # 図全体の描画では描かない (背景に含めない)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+        self.timer = self.canvas.new_timer(interval=interval_ms)
+        self.timer.add_callback(self._frame)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in self.lines:
+            line.axes.draw_artist(line)
+
+    def _frame(self):
+        started = time.perf_counter()
+        changed = self.update()
+        if changed or self._background is None:
+            # 目盛りも描き直す. 描画後の_on_drawで背景を保存し直す
+            self.full_redraws += 1
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_lines()
+            self.canvas.blit(self.fig.bbox)
+            self.canvas.flush_events()
+        self.frames += 1
+        self.last_frame_ms = (time.perf_counter() - started) * 1000
@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# 集約の段階 (名前, 秒)
+ROLLUP_TIERS = (("1s", 1), ("1m", 60))
+ROLLUP_STATS = ("min", "max", "mean")
+
+
+class ChunkStore:
+    """1つの系列を、時刻と値の列からなる固定サイズの圧縮チャンクとしてファイルへ追記する.
+
+    チャンクはセグメントファイルに順に書き、位置と時刻の範囲を索引 (index.jsonl) に1行ずつ記録する.
+    問い合わせは索引で時刻の範囲が重なるチャンクだけを読む. セグメントは一定の大きさを超えたら新しいファイルにする.
+    """
+
+    def __init__(self, directory, columns, chunk_size=4096, segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.columns = list(columns)  # 先頭は時刻 ("t")
+        self.chunk_size = chunk_size
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.index = self._load_index()
+        self._buffer = np.empty((chunk_size, len(self.columns)))
+        self._rows = 0
+        self._segment = None  # 書き込み中のセグメントのファイル名 (開いたあと最初のチャンクで作る)
+        self._segment_size = 0
+
+    def _load_index(self):
+        index = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        index.append(json.loads(line))
+                    except ValueError:
+                        break  # 書き込み途中で止まった最後の行
+        return index
+
+    @property
+    def pending_rows(self):
+        return self._rows
+
+    def append(self, row):
+        """1行 (時刻, 値...) を追加する. チャンクが一杯になったら書き出す."""
+        self._buffer[self._rows] = row
+        self._rows += 1
+        if self._rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """書き出していない行を (一杯でなくても) 1つのチャンクとして書き出す."""
+        if not self._rows:
+            return
+        rows = self._buffer[:self._rows]
+        payload = zlib.compress(rows.tobytes(), 6)
+        if self._segment is None or self._segment_size + len(payload) > self.segment_bytes:
+            self._segment = f"{int(rows[0, 0])}-{len(self.index)}.chunks"
+            self._segment_size = 0
+        with open(os.path.join(self.directory, self._segment), "ab") as f:
+            f.write(payload)
+        entry = {
+            "file": self._segment,
+            "offset": self._segment_size,
+            "length": len(payload),
+            "rows": int(self._rows),
+            "t0": float(rows[0, 0]),
+            "t1": float(rows[-1, 0]),
+            "columns": self.columns,
+        }
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.index.append(entry)
+        self._segment_size += len(payload)
+        self._rows = 0
+
+    def _read_chunks(self, entries):
+        """チャンクを順に読む. 同じセグメントのチャンクが続く間はファイルを開き直さない."""
+        parts = []
+        f = None
+        try:
+            for entry in entries:
+                if f is None or f.name != os.path.join(self.directory, entry["file"]):
+                    if f is not None:
+                        f.close()
+                    f = open(os.path.join(self.directory, entry["file"]), "rb")
+                f.seek(entry["offset"])
+                payload = f.read(entry["length"])
+                parts.append(np.frombuffer(zlib.decompress(payload)).reshape(entry["rows"], len(entry["columns"])))
+        finally:
+            if f is not None:
+                f.close()
+        return parts
+
+    def snapshot(self, t0=None, t1=None):
+        """t0～t1に重なるチャンクの索引と、書き出していない行の複製を返す. 追記と同じロックの中で呼ぶ.
+
+        チャンクは追記だけで書き換えないので、返した索引のチャンクはロックの外で読める (queryに渡す).
+        """
+        t0 = -math.inf if t0 is None else t0
+        t1 = math.inf if t1 is None else t1
+        entries = [entry for entry in self.index
+                   if entry["t1"] >= t0 and entry["t0"] <= t1 and entry["columns"] == self.columns]
+        return entries, self._buffer[:self._rows].copy()
+
+    def query(self, t0=None, t1=None, snapshot=None):
+        """時刻がt0～t1 (Noneなら端まで) の行を {列名: 配列} で返す. 書き出していない行も含む.
+
+        snapshotを渡すと、その時点の内容を読む.
+        """
+        entries, pending = snapshot if snapshot is not None else self.snapshot(t0, t1)
+        t0 = -math.inf if t0 is None else t0
+        t1 = math.inf if t1 is None else t1
+        parts = self._read_chunks(entries)
+        if len(pending):
+            parts.append(pending)
+        rows = np.concatenate(parts) if parts else np.empty((0, len(self.columns)))
+        rows = rows[(rows[:, 0] >= t0) & (rows[:, 0] <= t1)]
+        return {name: rows[:, i] for i, name in enumerate(self.columns)}
+
+
+class RollupTier:
+    """period秒ごとの区間で、各値の個数・最小・最大・平均を逐次集計する."""
+
+    def __init__(self, period, fields):
+        self.period = period
+        self.fields = list(fields)
+        self.columns = ["t", "count"] + [f"{field}_{stat}" for field in self.fields for stat in ROLLUP_STATS]
+        self.bucket = None  # 集計中の区間の開始時刻
+        self._reset()
+
+    def _reset(self):
+        n = len(self.fields)
+        self.count = np.zeros(n)
+        self.sum = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+
+    def add(self, t, values):
+        """1サンプルを加える. 区間が変わったら、終わった区間の行を返す (それ以外はNone)."""
+        bucket = math.floor(t / self.period) * self.period
+        row = None
+        if self.bucket is not None and bucket != self.bucket:
+            row = self.close()
+        self.bucket = bucket
+        valid = ~np.isnan(values)
+        self.count += valid
+        self.sum += np.where(valid, values, 0.0)
+        self.min = np.where(valid, np.minimum(self.min, values), self.min)
+        self.max = np.where(valid, np.maximum(self.max, values), self.max)
+        return row
+
+    def close(self):
+        """集計中の区間の行 (t, 個数, 値ごとの最小・最大・平均) を返し、集計を空にする."""
+        if self.bucket is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.count
+        has = self.count > 0
+        stats = np.column_stack((np.where(has, self.min, np.nan), np.where(has, self.max, np.nan),
+                                 np.where(has, mean, np.nan))).ravel()
+        row = np.concatenate(([self.bucket, self.count.max()], stats))
+        self.bucket = None
+        self._reset()
+        return row
+
+
+class _StreamRecorder:
+    def __init__(self, directory, fields, chunk_size):
+        self.fields = list(fields)
+        self.raw = ChunkStore(os.path.join(directory, "raw"), ["t"] + self.fields, chunk_size)
+        self.tiers = []
+        for name, period in ROLLUP_TIERS:
+            tier = RollupTier(period, self.fields)
+            # 集約した行は生データより少ないので、小さめのチャンクにする
+            store = ChunkStore(os.path.join(directory, name), tier.columns, max(64, chunk_size // 16))
+            self.tiers.append((name, tier, store))
+
+
+class SensorRecorder:
+    """センサーの系列ごとに、生データと1秒・1分の集約 (最小・最大・平均) をChunkStoreへ記録する.
+
+    時刻はUNIX時刻 (秒). SensorHubに取り付ければ全サンプルを記録する.
+    長い期間の表示には集約の段階を問い合わせれば、生データを読まずに済む.
+    生データはflush_interval秒ごとに一杯でないチャンクも書き出す. 集約の行は少ないので、一杯になるまでためて
+    固定サイズのチャンクにし、一杯にならなくてもrollup_flush_interval秒ごとには書き出す
+    (止まったときに失う集約をその時間分までにする).
+    """
+
+    def __init__(self, directory, chunk_size=4096, flush_interval=60.0, rollup_flush_interval=3600.0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.rollup_flush_interval = rollup_flush_interval
+        self.streams = {}
+        self.lock = threading.Lock()
+        self._last_flush = self._last_rollup_flush = time.monotonic()
+
+    def _stream(self, stream, values):
+        recorder = self.streams.get(stream)
+        if recorder is None:
+            recorder = _StreamRecorder(os.path.join(self.directory, stream), sorted(values), self.chunk_size)
+            self.streams[stream] = recorder
+        return recorder
+
+    def record(self, stream, t, values):
+        """1サンプル (時刻t, {値の名前: 値}) を記録する. 最初のサンプルの値の名前がその系列の列になる."""
+        with self.lock:
+            recorder = self._stream(stream, values)
+            row = np.array([values.get(field, np.nan) for field in recorder.fields], dtype=float)
+            recorder.raw.append(np.concatenate(([t], row)))
+            for _, tier, store in recorder.tiers:
+                finished = tier.add(t, row)
+                if finished is not None:
+                    store.append(finished)
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._flush_locked(rollups=now - self._last_rollup_flush >= self.rollup_flush_interval)
+
+    def attach(self, hub):
+        """SensorHubの全サンプルを記録する. 解除する関数を返す."""
+        return hub.subscribe(lambda stream, t, values: self.record(stream, hub.wall_time(t), values))
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self, rollups=True):
+        # 一杯でないチャンクも書き出し、止まったときに失うデータをflush_interval秒分までにする
+        for recorder in self.streams.values():
+            recorder.raw.flush()
+            if rollups:
+                for _, _, store in recorder.tiers:
+                    store.flush()
+        self._last_flush = time.monotonic()
+        if rollups:
+            self._last_rollup_flush = self._last_flush
+
+    def close(self):
+        """集計中の区間も書き出す."""
+        with self.lock:
+            for recorder in self.streams.values():
+                for _, tier, store in recorder.tiers:
+                    row = tier.close()
+                    if row is not None:
+                        store.append(row)
+            self._flush_locked()
+
+    def query(self, stream, t0=None, t1=None, tier="raw"):
+        """系列streamのt0～t1の記録を {列名: 配列} で返す. tierは "raw" / "1s" / "1m".
+
+        記録したことはあるが今回の起動でまだサンプルの無い系列も、保存されている列の並びで読む.
+        ロックの中では読むチャンクを決めるだけで、ファイルはロックの外で読む (recordを待たせない).
+        """
+        with self.lock:
+            recorder = self.streams.get(stream)
+            if recorder is not None:
+                stores = {"raw": recorder.raw}
+                stores.update((name, store) for name, _, store in recorder.tiers)
+                if tier not in stores:
+                    raise ValueError(f"不明な集約の段階です: {tier}")
+                store = stores[tier]
+                snapshot = store.snapshot(t0, t1)
+        if recorder is not None:
+            return store.query(t0, t1, snapshot)
+        return open_store(os.path.join(self.directory, stream, tier)).query(t0, t1)
+
+
+def open_store(directory):
+    """保存済みのChunkStoreを、索引に記録された列の並びで開く (読み出し用)."""
+    index_path = os.path.join(directory, "index.jsonl")
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"記録がありません: {directory}")
+    with open(index_path, encoding="utf-8") as f:
+        first = json.loads(f.readline())
+    return ChunkStore(directory, first["columns"])
@@ -0,0 +1,75 @@
+import collections
+import time
+
+import numpy as np
+
+# 1周期ごとの情報.
+# index: 周期の番号, deadline: 予定時刻, time: 実際に起きた時刻 (いずれもtime.monotonic),
+# dt: 前の周期から実際に経過した秒数 (最初は0), late: 予定時刻からの遅れ, missed: この直前に飛ばした周期の数
+Tick = collections.namedtuple("Tick", "index deadline time dt late missed")
+
+
+class FixedRateScheduler:
+    """単調時計の期限で一定周期を刻む.
+
+    k番目の期限は 開始時刻 + k × 周期 なので、処理時間や寝過ごしがあっても周期はずれていかない.
+    処理が1周期以上遅れたときは、間に合わなかった期限を飛ばして (overrunsに数えて) 次の期限から続ける.
+    """
+
+    def __init__(self, rate_hz, jitter_window=10000, clock=time.monotonic, sleep=time.sleep):
+        if rate_hz <= 0:
+            raise ValueError(f"周期の頻度は正の値で指定してください: {rate_hz}")
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.clock = clock
+        self.sleep = sleep
+        self.ticks_count = 0
+        self.overruns = 0
+        self.lateness = collections.deque(maxlen=jitter_window)  # 最近の周期の遅れ (秒)
+        self._running = False
+
+    def stop(self):
+        """ticksのループを次の周期で終える (他のスレッドから呼んでよい)."""
+        self._running = False
+
+    def ticks(self):
+        """周期ごとにTickを返すジェネレーター. stopを呼ぶまで続く."""
+        self._running = True
+        start = self.clock()
+        index = 0
+        previous = None
+        while self._running:
+            deadline = start + index * self.period
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+                now = self.clock()
+            missed = int((now - deadline) // self.period)
+            if missed > 0:
+                # 間に合わなかった期限は飛ばし、直近の期限を遅れとして扱う
+                index += missed
+                deadline += missed * self.period
+                self.overruns += missed
+            late = now - deadline
+            self.lateness.append(late)
+            self.ticks_count += 1
+            yield Tick(index, deadline, now, now - previous if previous is not None else 0.0, late, missed)
+            previous = now
+            index += 1
+
+    def stats(self):
+        """周期の数、飛ばした周期の数と、最近の周期の遅れの統計 (ミリ秒)."""
+        stats = {"rate_hz": self.rate_hz, "ticks": self.ticks_count, "overruns": self.overruns}
+        if self.lateness:
+            late_ms = np.array(self.lateness) * 1000
+            p50, p99 = np.percentile(late_ms, (50, 99))
+            stats.update(mean_ms=float(late_ms.mean()), p50_ms=float(p50), p99_ms=float(p99),
+                         max_ms=float(late_ms.max()))
+        return stats
+
+
+def format_schedule_stats(stats):
+    line = f"{stats['rate_hz']:g} Hz: {stats['ticks']} 周期, 飛ばした周期 {stats['overruns']}"
+    if "mean_ms" in stats:
+        line += f", 遅れ 平均 {stats['mean_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, 最大 {stats['max_ms']:.3f} ms"
+    return line
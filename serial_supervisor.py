@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+
+import serial
+from serial.tools import list_ports
+
+
+class StalledPortError(serial.SerialException):
+    """ポートは開いているが、一定時間バイトが届かない."""
+
+
+def _identity(info):
+    """USB機器を見分けるための (VID, PID, シリアル番号). USB以外はNone."""
+    if info is None or info.vid is None:
+        return None
+    return (info.vid, info.pid, info.serial_number)
+
+
+class PortFinder:
+    """受信機のポートを探す. 抜き差しでポート名が変わっても、同じUSB機器 (VID/PID/シリアル番号) を見つける.
+
+    最初に開けた機器を覚え、以後はその機器だけを選ぶ (同じアダプタの別機器を開かないため).
+    覚える前は設定のポート名、無ければmatch (hwidや説明に含まれる文字列, 例: "VID:PID=1546:01A9") に合うポートを選ぶ.
+    """
+
+    def __init__(self, port, match=None):
+        self.port = port
+        self.match = match
+        self.identity = None
+        self.scans = 0
+
+    def find(self):
+        """開くべきポート名を返す. 見つからなければNone."""
+        self.scans += 1
+        ports = list_ports.comports()
+        if self.identity is not None:
+            for info in ports:
+                if _identity(info) == self.identity:
+                    return info.device
+            return None
+        for info in ports:
+            if info.device == self.port:
+                return info.device
+        # 一覧に出ない名前 (/dev/serial/by-id/... や擬似端末) はあればそのまま使う
+        if self.port and os.path.exists(self.port):
+            return self.port
+        if self.match:
+            for info in ports:
+                if self.match in info.hwid or self.match in (info.description or ""):
+                    return info.device
+        return None
+
+    def remember(self, device):
+        """開けたポートの機器を覚える."""
+        if self.identity is None:
+            device = os.path.realpath(device)
+            for info in list_ports.comports():
+                if info.device == device:
+                    self.identity = _identity(info)
+                    break
+
+
+class SerialSupervisor:
+    """シリアル機器の読み込み関数を監視し、抜けたら探し直して開き直す.
+
+    runに渡した関数handler(ser)が例外で抜けると (抜き差し・読み込みエラー・stall_timeout秒データが無い)、
+    ポートを閉じてPortFinderで探し直し、開けるまで間隔を倍々に延ばして (上限max_backoff秒) 試し続ける.
+    handlerは読むたびにheartbeat(受信バイト数)を、有効なメッセージを解析するたびにmessage()を呼ぶ.
+    statsの経過秒数 (last_loop_ageなど) が伸び続けていれば読み込みが止まっている.
+    """
+
+    def __init__(self, port, baudrate, match=None, name="serial", timeout=0.1, min_backoff=0.01,
+                 max_backoff=0.5, stall_timeout=3.0, stale_after=2.0, log=None, sleep=time.sleep):
+        self.baudrate = baudrate
+        self.name = name
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stall_timeout = stall_timeout
+        self.stale_after = stale_after
+        self.log = log or (lambda message: None)
+        self.sleep = sleep
+        self.finder = PortFinder(port, match)
+        self.running = False
+        self.lock = threading.Lock()
+        self.device = None  # 開いているポート名 (開いていなければNone)
+        self.backoff = min_backoff
+        # 監視用の計数と時刻 (time.monotonic)
+        self.connects = 0
+        self.disconnects = 0
+        self.stalls = 0
+        self.open_failures = 0
+        self.errors = 0
+        self.last_error = None
+        self.loops = 0
+        self.bytes = 0
+        self.messages = 0
+        self.last_loop_at = None
+        self.last_data_at = None
+        self.last_message_at = None
+        self.disconnected_at = None
+        self.last_reconnect_ms = None  # 直近の、切断から開き直すまでの時間
+
+    def run(self, handler):
+        """stopされるまでhandler(ser)を動かし続ける (呼んだスレッドで)."""
+        self.running = True
+        while self.running:
+            device = self.finder.find()
+            if device is None:
+                self._wait()
+                continue
+            try:
+                ser = serial.Serial(device, self.baudrate, timeout=self.timeout)
+            except (serial.SerialException, OSError) as e:
+                self.open_failures += 1
+                self.last_error = str(e)
+                self._wait()
+                continue
+            self._connected(device)
+            try:
+                with ser:
+                    handler(ser)
+            except StalledPortError as e:
+                self.stalls += 1
+                self.last_error = str(e)
+                self.log(f"[WARN] {self.name}: {e} (開き直します)")
+            except (serial.SerialException, OSError) as e:
+                self.last_error = str(e)
+                self.log(f"[ERROR] {self.name} ({device}): {e} (探し直します)")
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self.log(f"[ERROR] {self.name}: 読み込みに失敗しました: {e}")
+            self._disconnected()
+            if self.running:
+                self._wait()
+
+    def stop(self):
+        self.running = False
+
+    def _connected(self, device):
+        now = time.monotonic()
+        with self.lock:
+            self.device = device
+            self.connects += 1
+            self.last_data_at = now  # 開いた時点からstall_timeoutを数える
+            if self.disconnected_at is not None:
+                self.last_reconnect_ms = (now - self.disconnected_at) * 1000
+                self.disconnected_at = None
+        self.finder.remember(device)
+        message = f"{self.name}: {device} を開きました。"
+        if self.connects > 1:
+            message += f" (切断から {self.last_reconnect_ms:.0f} ms)"
+        self.log(message)
+
+    def _disconnected(self):
+        with self.lock:
+            self.device = None
+            self.disconnects += 1
+            self.disconnected_at = time.monotonic()
+
+    def _wait(self):
+        # 倍々に延ばし (上限max_backoff)、揺らぎを加えて待つ. データを受け取れたら最初の間隔に戻す
+        delay = self.backoff
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        self.sleep(random.uniform(delay / 2, delay))
+
+    def heartbeat(self, received=0):
+        """読み込みのたびに呼ぶ. stall_timeout秒バイトが届かなければStalledPortErrorを送出する."""
+        now = time.monotonic()
+        self.loops += 1
+        self.last_loop_at = now
+        if received:
+            self.bytes += received
+            self.last_data_at = now
+            self.backoff = self.min_backoff
+        elif self.stall_timeout and now - self.last_data_at > self.stall_timeout:
+            raise StalledPortError(f"{self.stall_timeout} 秒間データを受信していません。")
+
+    def message(self):
+        """有効なメッセージを1つ解析したときに呼ぶ."""
+        self.messages += 1
+        self.last_message_at = time.monotonic()
+
+    def _age(self, t, now):
+        return None if t is None else now - t
+
+    def freshness(self):
+        """送信するデータに付ける鮮度 {"connected", "stale", "age" (最後のメッセージからの秒数)}."""
+        age = self._age(self.last_message_at, time.monotonic())
+        return {
+            "connected": self.device is not None,
+            "stale": age is None or age > self.stale_after,
+            "age": age,
+        }
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                "device": self.device,
+                "connected": self.device is not None,
+                "connects": self.connects,
+                "disconnects": self.disconnects,
+                "stalls": self.stalls,
+                "open_failures": self.open_failures,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "scans": self.finder.scans,
+                "loops": self.loops,
+                "bytes": self.bytes,
+                "messages": self.messages,
+                "last_loop_age": self._age(self.last_loop_at, now),
+                "last_data_age": self._age(self.last_data_at, now),
+                "last_message_age": self._age(self.last_message_at, now),
+                "disconnected_for": self._age(self.disconnected_at, now),
+                "last_reconnect_ms": self.last_reconnect_ms,
+            }
@@ -3,19 +3,38 @@ eventlet.monkey_patch() # この行がファイルの先頭にあることを確
 
 from flask import Flask, send_from_directory, request
 from flask_socketio import SocketIO
+import os
 import serial
 import threading
-import time
-from datetime import datetime, timedelta
-import re
 import collections
+from nmea import NMEA_SENTENCE_PATTERN, POSITION_SENTENCES, update_gnss_data
+from servo_service import ServoService
+from sensor_hub import SensorHub, create_source
+from sensor_recorder import SensorRecorder
+from serial_supervisor import SerialSupervisor
 
 app = Flask(__name__, static_url_path='', static_folder='.')
 
 socketio = SocketIO(app, cors_allowed_origins='*', async_mode='eventlet')
 
-GNSS_PORT = '/dev/ttyUSB0' # 例: '/dev/ttyUSB0' (Linux) or 'COM3' (Windows)
+# ポートは環境変数で上書きできる (負荷試験の load_test.py は擬似端末のGNSSだけで起動する)
+GNSS_PORT = os.environ.get('GNSS_PORT', '/dev/ttyUSB0') # 例: '/dev/ttyUSB0' (Linux) or 'COM3' (Windows)
 BAUD_RATE = 115200
+GNSS_PORT_MATCH = None # 抜き差しでポート名が変わったときに探す文字列 (hwidや説明の一部, 例: 'VID:PID=1546:01A9')。Noneならポート名だけで探す
+GNSS_STALE_SECONDS = 2.0 # 最後のNMEAメッセージからこの秒数を過ぎたら 'gnss' の stale を True にする
+
+SERVO_PORT = os.environ.get('SERVO_PORT', '/dev/ttyUSB1') or None # サーボ機器のポート (例: 'COM4')。None (環境変数では空文字列) ならサーボ制御を無効にする
+SERVO_BAUD_RATE = 19200
+
+# センサーの取得元 (種類, 設定). 種類は sensor_hub.SOURCE_TYPES の名前。接続していない取得元は削除してください
+SENSOR_SOURCES = [
+    ('temperature', {'port': '/dev/ttyUSB2', 'baudrate': 9600}), # 6バイトのフレームの温度センサー
+    ('mpu6050', {'bus_id': 1, 'rate_hz': 200}),                 # I2CのMPU6050 (ヨー角・角速度・内部温度)
+]
+if os.environ.get('SENSOR_SOURCES') == '': # 環境変数 SENSOR_SOURCES を空にするとセンサーを読まない
+    SENSOR_SOURCES = []
+SENSOR_PUBLISH_RATE = 5 # 'sensor' チャンネルへの送信頻度 (Hz)
+SENSOR_RECORD_DIR = 'sensor_data' # 全サンプルと1秒・1分の集約を記録するディレクトリ。Noneなら記録しない
 
 gnss_data = {
     'lat': 35.681236,
@@ -32,8 +51,8 @@ gnss_data = {
     'mode_ma': '',   # GSAの測位モード (M=手動, A=自動)
     'mode_fix_type': '1', # GSAの測位タイプ (1=Fixなし, 2=2D, 3=3D)
     'rms': 0.0,      # GST: Standard deviation of pseudoranges
-    'smjr_std': 0.0, # GST: Standard deviation of semi-major axis of error elli>
-    'smnr_std': 0.0, # GST: Standard deviation of semi-minor axis of error elli>
+    'smjr_std': 0.0, # GST: Standard deviation of semi-major axis of error ellipse
+    'smnr_std': 0.0, # GST: Standard deviation of semi-minor axis of error ellipse
     'orient': 0.0,   # GST: Orientation of semi-major axis of error ellipse
     'lat_std': 0.0,  # GST: Standard deviation of latitude error
     'lon_std': 0.0,  # GST: Standard deviation of longitude error
@@ -51,242 +70,67 @@ gnss_data = {
 MAX_HISTORY_SIZE = 50 
 gnss_data_history = collections.deque(maxlen=MAX_HISTORY_SIZE)
 
-# NMEA → Decimal 度変換 (より堅牢に数値部分を抽出)
-def convert_to_decimal(value, direction):
-    if not value:
-        return 0.0
-    
-    try:
-        # 数値部分のみを正規表現で抽出
+# 受信機のポートを監視し、抜けたら探し直して (最大0.5秒間隔で) 開き直す。受信の計数は 'gnss_status' で問い合わせられる
+gnss_link = SerialSupervisor(GNSS_PORT, BAUD_RATE, match=GNSS_PORT_MATCH, name='GNSS',
+                             stale_after=GNSS_STALE_SECONDS, log=print)
 
-        match = re.match(r'^\d+(\.\d+)?', value)
-        if not match:
-            return 0.0
-        
-        float_value_str = match.group(0) # 抽出された数値文字列
-        
-        if '.' not in float_value_str:
-            return 0.0 # 小数点がない場合も不正とみなす (NMEAの緯度経度では必須)
-        
-        parts = float_value_str.split('.')
-        degrees_str = parts[0]
-        minutes_str = parts[1]
-        
-        degrees = 0.0
-        minutes = 0.0
-
-        if len(degrees_str) >= 4: # 緯度または経度 (DDMM.MMMM or DDDMM.MMMM)
-            # 緯度/経度に応じた度の部分を抽出
-            if len(degrees_str) == 4: # 緯度 DDMM
-                degrees = float(degrees_str[0:2])
-                minutes = float(degrees_str[2:] + '.' + minutes_str)
-            elif len(degrees_str) >= 5: # 経度 DDDMM (少なくとも5桁あれば経度と>
-                degrees = float(degrees_str[0:3])
-                minutes = float(degrees_str[3:] + '.' + minutes_str)
-            else:
-                return 0.0 # 不明なフォーマット
-
-            decimal_degrees = degrees + (minutes / 60.0)
-            
-            if direction in ['S', 'W']:
-                decimal_degrees *= -1
-                
-            return decimal_degrees
-    except (ValueError, IndexError):
-        return 0.0
-    return 0.0
-
-def nmea_time_to_iso(time_str, date_str=''):
-    try:
-        if '.' in time_str:
-            # 小数点以下の秒数を取得し、時刻文字列から削除
-            seconds_parts = time_str.split('.')
-            time_only_str = seconds_parts[0]
-            milliseconds = int(float('0.' + seconds_parts[1]) * 1000)
-        else:
-            time_only_str = time_str
-            milliseconds = 0
-
-        if date_str:
-            dt_obj = datetime.strptime(f"{date_str}{time_only_str}", "%d%m%y%H%>
-        else:
-            # 日付がない場合、システムの日付を使用 (タイムゾーン情報なし)
-            today = datetime.utcnow().strftime("%d%m%y")
-            dt_obj = datetime.strptime(f"{today}{time_only_str}", "%d%m%y%H%M%S>
-        
-        dt_obj = dt_obj + timedelta(milliseconds=milliseconds)
-            
-        return dt_obj.isoformat(timespec='milliseconds') + 'Z' # UTCであること[>
-    except (ValueError, IndexError):
-        return ''
-
-# ヘルパー関数: 安全なfloat変換
-def safe_float_convert(value, default=0.0):
-    try:
-        return float(value)
-    except (ValueError, IndexError):
-        return default
+# NMEAメッセージ1行 (形式は確認済み) を種類ごとに解析して gnss_data を更新する (解析は nmea.py)
+def handle_nmea_sentence(potential_line):
+    sentence_type = update_gnss_data(gnss_data, potential_line)
 
-# ヘルパー関数: 安全なint変換
-def safe_int_convert(value, default=0):
-    try:
-        return int(float(value)) # intに変換する前にfloatを経由して小数も扱える>
-    except (ValueError, IndexError):
-        return default
+    # NMEAパースが成功し、かつ緯度経度が更新されていれば履歴に追加
+    if (gnss_data['lat'] != 0.0 or gnss_data['lng'] != 0.0) and sentence_type in POSITION_SENTENCES:
+        gnss_data_history.append(gnss_data.copy())
 
 # GNSS受信スレッド
+# 受信機が抜けたり止まったりしても gnss_link が探し直して開き直し、read_gnss_port を呼び直す
 def read_gnss():
-    global gnss_data
-    # NMEAメッセージの厳格な正規表現パターン（行全体が開始から終了まで一致）
-    # ser.read(in_waiting)と組み合わせるため、\r?\n?$は含めない
-    nmea_sentence_pattern = re.compile(r'^\$[A-Z]{2}[A-Z]{3},.*?\*[0-9A-F]{2}$')
+    gnss_link.run(read_gnss_port)
+
+def read_gnss_port(ser):
+    buffer = "" # 受信バッファ
     
-    try:
-        # シリアルポートのタイムアウトは短めに設定
-        with serial.Serial(GNSS_PORT, BAUD_RATE, timeout=0.1) as ser: 
-            print(f"Serial port {GNSS_PORT} opened at {BAUD_RATE} baud.")
-            buffer = "" # 受信バッファ
+    while gnss_link.running:
+        # 利用可能な全てのバイトを読み込む
+        bytes_to_read = ser.in_waiting 
+        gnss_link.heartbeat(bytes_to_read) # 受信が途絶えたまま stall_timeout 秒経つと開き直す
+        if bytes_to_read > 0:
+            char_data = ser.read(bytes_to_read).decode('ascii', errors='replace')
+            buffer += char_data
+        else:
+            # データがない場合は、CPUを占有しないように少し長めにスリープ
+            eventlet.sleep(0.01) # 10ミリ秒スリープ
+            continue # 次のループへ
+
+        # バッファから完全なNMEAメッセージを抽出
+        # "$"から次の改行までを1つの候補とし、その後に厳格な正規表現で形式を確認する
+        while '\n' in buffer:
+            line_end_idx = buffer.find('\n')
+            potential_line = buffer[:line_end_idx].strip() # 改行までを1行として取り出す
+            buffer = buffer[line_end_idx + 1:] # 処理した部分をバッファから削除
+
+            if not potential_line: # 空行はスキップ
+                continue
+
+            # 正規表現でNMEAメッセージの形式を厳密にチェック
+            if not NMEA_SENTENCE_PATTERN.match(potential_line):
+                print(f"Warning: Skipping non-NMEA formatted line: {potential_line}")
+                eventlet.sleep(0.001) # 不正な行処理後にごく短いスリープ
+                continue
+
+            # 有効なNMEAメッセージであれば解析
+            print(f"Received NMEA (parsed): {potential_line}")
+            gnss_link.message()
+            handle_nmea_sentence(potential_line)
+        
+        # バッファが過度に大きくなった場合の切り詰め
+        if len(buffer) > 1000: # 例: 1000文字を超えたら古い部分を破棄
+            next_dollar = buffer.find('$')
+            if next_dollar != -1:
+                buffer = buffer[next_dollar:]
+            else:
+                buffer = "" # $が見つからなければ全て破棄
             
-            while True:
-                # 利用可能な全てのバイトを読み込む
-                bytes_to_read = ser.in_waiting 
-                if bytes_to_read > 0:
-                    char_data = ser.read(bytes_to_read).decode('ascii', errors=>
-                    buffer += char_data
-                else:
-                    # データがない場合は、CPUを占有しないように少し長めにスリー>
-                    eventlet.sleep(0.01) # 10ミリ秒スリープ
-                    continue # 次のループへ
-
-                # バッファから完全なNMEAメッセージを抽出
-                # "$"から次の改行までを1つの候補とし、その後に厳格な正規表現で[>
-                while '\n' in buffer:
-                    line_end_idx = buffer.find('\n')
-                    potential_line = buffer[:line_end_idx].strip() # 改行までを>
-                    buffer = buffer[line_end_idx + 1:] # 処理した部分をバッファ>
-
-                    if not potential_line: # 空行はスキップ
-                        continue
-
-                    # 正規表現でNMEAメッセージの形式を厳密にチェック
-                    if not nmea_sentence_pattern.match(potential_line):
-                        print(f"Warning: Skipping non-NMEA formatted line: {pot>
-                        eventlet.sleep(0.001) # 不正な行処理後にごく短いスリープ
-                        continue
-
-                    # 有効なNMEAメッセージであれば解析
-                    print(f"Received NMEA (parsed): {potential_line}")
-
-                    parts = potential_line.split(',')
-                    if len(parts) < 2:
-                        continue
-
-                    # トークIDとメッセージタイプを抽出
-                    sentence_type_raw = parts[0][1:]
-                    sentence_type = sentence_type_raw[2:]
-
-                    # HDTの処理 (startswithチェックは維持)
-                    if potential_line.startswith('$GNHDT') or potential_line.st>
-                        print(f"DEBUG: HDT block entered (startswith check) for>
-                        print(f"DEBUG: HDT parts: {parts!r}")
-
-                        if len(parts) > 1:
-                            gnss_data['heading'] = safe_float_convert(parts[1])
-                            print(f"DEBUG: HDT Heading updated to: {gnss_data['>
-                        else:
-                            print(f"WARNING: HDT line has insufficient parts: {>
-
-                    elif sentence_type == 'GGA':
-                        if len(parts) >= 10:
-                            gnss_data['timestamp_utc'] = parts[1]
-                            gnss_data['lat'] = convert_to_decimal(parts[2], par>
-                            gnss_data['lng'] = convert_to_decimal(parts[4], par>
-                            gnss_data['fix'] = parts[6] if len(parts[6]) == 1 a>
-                            gnss_data['num_satellites'] = safe_int_convert(part>
-                            gnss_data['hdop'] = safe_float_convert(parts[8])
-                            gnss_data['alt'] = safe_float_convert(parts[9])
-
-                            if gnss_data['date_utc']:
-                                gnss_data['datetime_iso'] = nmea_time_to_iso(gn>
-                            else:
-                                gnss_data['datetime_iso'] = nmea_time_to_iso(gn>
-
-                    elif sentence_type == 'RMC':
-                        if len(parts) >= 10:
-                            gnss_data['timestamp_utc'] = parts[1] if len(parts)>
-                            gnss_data['lat'] = convert_to_decimal(parts[3], par>
-                            gnss_data['lng'] = convert_to_decimal(parts[5], par>
-                            gnss_data['speed'] = safe_float_convert(parts[7])
-                            gnss_data['date_utc'] = parts[9] if len(parts) > 9 >
-                            gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_d>
-
-                    elif sentence_type == 'ZDA':
-                        if len(parts) > 4:
-                            gnss_data['timestamp_utc'] = parts[1]
-                            gnss_data['date_utc'] = f"{parts[2].zfill(2)}{parts>
-                            gnss_data['datetime_iso'] = nmea_time_to_iso(gnss_d>
-
-                    # GSAメッセージの解析
-                    elif sentence_type == 'GSA':
-                        if len(parts) >= 18:
-                            gnss_data['mode_ma'] = parts[1] if len(parts) > 1 e>
-                            gnss_data['mode_fix_type'] = parts[2] if len(parts)>
-
-                            if gnss_data['mode_fix_type'] == '1': gnss_data['fi>
-                            elif gnss_data['mode_fix_type'] == '2': gnss_data['>
-                            elif gnss_data['mode_fix_type'] == '3': gnss_data['>
-
-                            sat_ids_in_solution = []
-                            for i in range(3, 15): 
-                                if len(parts) > i and parts[i]:
-                                    sat_ids_in_solution.append(safe_int_convert>
-                            gnss_data['satellites_in_use'] = sat_ids_in_solution
-
-                            gnss_data['pdop'] = safe_float_convert(parts[15])
-                            gnss_data['hdop'] = safe_float_convert(parts[16])
-                            gnss_data['vdop'] = safe_float_convert(parts[17])
-                    
-                    # GPGSTメッセージの解析
-                    elif sentence_type == 'GST':
-                        if len(parts) >= 9:
-                            gnss_data['rms'] = safe_float_convert(parts[2])
-                            gnss_data['smjr_std'] = safe_float_convert(parts[3])
-                            gnss_data['smnr_std'] = safe_float_convert(parts[4])
-                            gnss_data['orient'] = safe_float_convert(parts[5])
-                            gnss_data['lat_std'] = safe_float_convert(parts[6])
-                            gnss_data['lon_std'] = safe_float_convert(parts[7])
-                            gnss_data['alt_std'] = safe_float_convert(parts[8])
-                    
-                    # GPVTGメッセージの解析を追加
-                    elif sentence_type == 'VTG':
-                        # $--VTG,course_true,T,course_mag,M,speed_knots,N,speed>
-                        # parts:    0       1          2 3         4 5         >
-                        if len(parts) >= 10: # Mode indicator (Field 10) まで存>
-                            gnss_data['vtg_course_true'] = safe_float_convert(p>
-                            gnss_data['vtg_course_mag'] = safe_float_convert(pa>
-                            gnss_data['vtg_speed_knots'] = safe_float_convert(p>
-                            gnss_data['vtg_speed_kmh'] = safe_float_convert(par>
-                            gnss_data['vtg_mode_ind'] = parts[9] if len(parts) >
-                            print(f"DEBUG: VTG data updated: True Course={gnss_>
-                    
-                    # NMEAパースが成功し、かつ緯度経度が更新されていれば履歴に[>
-                    if (gnss_data['lat'] != 0.0 or gnss_data['lng'] != 0.0) and>
-                        gnss_data_history.append(gnss_data.copy())
-                
-                # バッファが過度に大きくなった場合の切り詰め
-                if len(buffer) > 1000: # 例: 1000文字を超えたら古い部分を破棄
-                    next_dollar = buffer.find('$')
-                    if next_dollar != -1:
-                        buffer = buffer[next_dollar:]
-                    else:
-                        buffer = "" # $が見つからなければ全て破棄
-                    
-    except serial.SerialException as e:
-        print(f"[ERROR] Serial port {GNSS_PORT} error: {e}")
-        eventlet.sleep(5) 
-    except Exception as e:
-        print(f"[ERROR] GNSS read failed: {e}")
-        eventlet.sleep(1) 
 
 @app.route('/')
 def index():
@@ -297,19 +141,92 @@ def connect():
     print(f'Client connected from {request.sid}')
     socketio.emit('gnss_history', list(gnss_data_history), to=request.sid)
 
+@socketio.on('gnss_status')
+def handle_gnss_status():
+    # 受信の監視用の計数 (再接続の回数・受信バイト数・最後の読み込みからの秒数など)
+    return gnss_link.stats()
+
 @socketio.on('ping')
 def handle_ping(data):
     print(f"Received ping from client: {data} from {request.sid}")
     socketio.emit('pong', {'message': 'Hello from server!'}, to=request.sid)
 
+# サーボ機器はこの1つの実行器がポートを専有し、全クライアントの要求を順番に処理する
+servo_service = ServoService(SERVO_PORT, SERVO_BAUD_RATE) if SERVO_PORT else None
+
+@socketio.on('servo')
+def handle_servo(data):
+    # 例: {'command': 'tilt_to', 'angle': -3.5} / {'command': 'tilt', 'mode': 'stop'} / {'command': 'init'}
+    # 戻り値がackとしてクライアントへ返る (状態と往復時間を含む)
+    if servo_service is None:
+        return {'command': None, 'ok': False, 'error': 'サーボ制御は無効です。'}
+    return servo_service.handle(data)
+
+@socketio.on('servo_state')
+def handle_servo_state():
+    return servo_service.state() if servo_service else None
+
+def emit_servo_state(state):
+    # イベントループを止めないよう、送信は別のグリーンスレッドで行う
+    socketio.start_background_task(socketio.emit, 'servo_state', state.snapshot())
+
+def start_servo():
+    if servo_service is None:
+        return
+    servo_service.subscribe_state(emit_servo_state)
+    try:
+        servo_service.start()
+        print(f"Servo port {SERVO_PORT} opened at {SERVO_BAUD_RATE} baud.")
+    except serial.SerialException as e:
+        print(f"[ERROR] Servo port {SERVO_PORT} error: {e}")
+
+# センサーはこのハブが取得元ごとに1つのスレッドで読み、まとめて 'sensor' チャンネルへ送る
+sensor_hub = SensorHub([create_source(kind, **options) for kind, options in SENSOR_SOURCES], log=print)
+
+sensor_recorder = SensorRecorder(SENSOR_RECORD_DIR) if SENSOR_RECORD_DIR else None
+
+@socketio.on('sensor_latest')
+def handle_sensor_latest():
+    # 取得元ごとの最新のサンプル (接続直後の表示用)
+    return sensor_hub.latest()
+
+@socketio.on('sensor_history')
+def handle_sensor_history(data):
+    # 記録の問い合わせ。例: {'stream': 'mpu6050', 't0': UNIX時刻, 't1': UNIX時刻, 'tier': '1m'}
+    # tierは 'raw' / '1s' / '1m'。長い期間は集約 ('1m') を使うと生データを読まずに済む
+    if sensor_recorder is None:
+        return {'error': 'センサーの記録は無効です。'}
+    try:
+        columns = sensor_recorder.query(data['stream'], data.get('t0'), data.get('t1'), data.get('tier', '1m'))
+    except (KeyError, ValueError, OSError) as e:
+        return {'error': str(e)}
+    return {name: values.tolist() for name, values in columns.items()}
+
+def emit_sensor():
+    # 前回の送信からのサンプルを取得元ごとに列形式でまとめて送る
+    # 例: {'temperature': {'t': [UNIX時刻, ...], 'temperature': [-45, ...]}, 'mpu6050': {'t': [...], 'yaw': [...], ...}}
+    while True:
+        batches = sensor_hub.drain()
+        if batches:
+            socketio.emit('sensor', batches)
+        eventlet.sleep(1.0 / SENSOR_PUBLISH_RATE)
+
 def emit_gnss():
     while True:
-        socketio.emit('gnss', gnss_data)
+        # 受信が途絶えていれば stale が True になる (最後の位置を表示し続けていることをクライアントが判断できる)
+        socketio.emit('gnss', dict(gnss_data, **gnss_link.freshness()))
         eventlet.sleep(0.2) # 約5Hzでデータを送信
 
 if __name__ == '__main__':
     threading.Thread(target=read_gnss, daemon=True).start()
+    start_servo()
+    if sensor_recorder:
+        sensor_recorder.attach(sensor_hub)
+    sensor_hub.start()
+    socketio.start_background_task(emit_sensor)
     socketio.start_background_task(emit_gnss)
-    socketio.run(app, host='0.0.0.0', port=5000, debug=False)
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('SERVER_PORT', 5000)), debug=False)
+    if sensor_recorder:
+        sensor_recorder.close() # 集計中の区間と書き出していないチャンクを保存する
 
 
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import random
+import time
+
+from servo_client import ServoClient, ServoCommandError, format_link_stats
+from servo_profile import summarize_jitter
+from servo_protocol import MAX_TILT_ANGLE, angle_to_sign_mode
+
+
+def make_bench_commands(count, seed=None):
+    """ベンチマーク用のコマンド列 (init / tilt / tilt_to の混在) を作る."""
+    rng = random.Random(seed)
+    commands = [("init", ())]
+    for _ in range(count - 1):
+        kind = rng.choice(("tilt", "tilt_to", "tilt_to"))
+        if kind == "tilt":
+            commands.append(("tilt", (rng.choice(("stop", "up", "down")),)))
+        else:
+            sign_mode, magnitude = angle_to_sign_mode(round(rng.uniform(-MAX_TILT_ANGLE, MAX_TILT_ANGLE), 1))
+            commands.append(("tilt_to", (magnitude, sign_mode)))
+    return commands
+
+
+async def run_bench(client, commands):
+    """コマンドを1つずつ送信し、往復時間 (秒) のリストと失敗数を返す."""
+    round_trip_times = []
+    failed = 0
+    for name, args in commands:
+        started = time.perf_counter()
+        try:
+            await getattr(client, name)(*args)
+        except ServoCommandError:
+            failed += 1
+            continue
+        round_trip_times.append(time.perf_counter() - started)
+    return round_trip_times, failed
+
+
+async def _main_async(args, port):
+    client = ServoClient(port, response_timeout=args.response_timeout, max_retries=args.max_retries,
+                         retry_interval=args.retry_interval)
+    commands = make_bench_commands(args.count, args.seed)
+    async with client:
+        started = time.perf_counter()
+        round_trip_times, failed = await run_bench(client, commands)
+        elapsed = time.perf_counter() - started
+        stats = client.stats()
+
+    r = summarize_jitter(round_trip_times)
+    print(f"コマンド数 {len(commands)}, 成功 {len(round_trip_times)}, 失敗 {failed}, {elapsed:.3f} 秒 "
+          f"({len(commands) / elapsed:.1f} コマンド/秒)")
+    if r:
+        print(f"往復時間: 平均 {r['mean_ms']:.2f} ms, p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, "
+              f"最大 {r['max_ms']:.2f} ms")
+    print(format_link_stats(stats))
+    return 0 if failed == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="サーボ通信の処理性能 (コマンド/秒, 往復時間) を測定する.")
+    parser.add_argument("--port", help="実機のシリアルポート. 省略すると仮想サーボ機器 (Linux専用) を使う")
+    parser.add_argument("--count", type=int, default=500, help="送信するコマンド数")
+    parser.add_argument("--seed", type=int, default=0, help="コマンド列と仮想機器の乱数の種")
+    parser.add_argument("--response-timeout", type=float, default=0.1, help="応答時間を測定する前の応答待ち時間 (秒)")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--retry-interval", type=float, default=0.2, help="リトライ間隔の上限 (秒)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="仮想機器の応答遅延 (ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="仮想機器の遅延の揺らぎ (ミリ秒)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="仮想機器の応答1バイトごとの欠落確率")
+    parser.add_argument("--bcc-error-rate", type=float, default=0.0, help="仮想機器の応答ごとのBCC破損確率")
+    args = parser.parse_args(argv)
+
+    if args.port:
+        return asyncio.run(_main_async(args, args.port))
+
+    from servo_sim import VirtualServoDevice
+    device = VirtualServoDevice(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                drop_rate=args.drop_rate, bcc_error_rate=args.bcc_error_rate, seed=args.seed)
+    with device:
+        result = asyncio.run(_main_async(args, device.port))
+        print(f"仮想機器: {device.stats}")
+    return result
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
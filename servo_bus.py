@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import collections
+import time
+
+from servo_client import ServoClient, ServoCommandError
+from servo_profile import summarize_jitter
+from servo_protocol import tilt_status_text
+
+
+class _BusDevice:
+    """バス上の1台分のクライアントとコマンドキュー."""
+
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+        self.queue = collections.deque()  # (コルーチンを返す関数, Future)
+        self.busy = False
+
+
+class ServoBus:
+    """複数のサーボ機器 (ポートごとに1台) を1つのイベントループで操作する.
+
+    コマンドは機器ごとのキューに積まれ、1台につき同時に1つずつ実行される.
+    max_concurrentを指定すると全体の同時実行数を制限し、待ちのある機器を順番に (ラウンドロビンで) 実行する.
+    ServoClientRunnerに渡せば、GUIなどの同期コードからも使える.
+    """
+
+    def __init__(self, ports, max_concurrent=None, log=None, **client_options):
+        self.log = log or (lambda message: None)
+        self.devices = {}
+        for port in ports:
+            device_log = (lambda message, port=port: self.log(f"[{port}] {message}")) if log else None
+            self.devices[port] = _BusDevice(port, ServoClient(port, log=device_log, **client_options))
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self._next = 0  # ラウンドロビンで次に調べる機器の位置
+        self._wakeup = None
+        self._dispatcher = None
+
+    @property
+    def names(self):
+        return list(self.devices)
+
+    async def open(self):
+        opened = []
+        try:
+            for device in self.devices.values():
+                await device.client.open()
+                opened.append(device)
+        except BaseException:
+            for device in opened:
+                await device.client.close()
+            raise
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def close(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for device in self.devices.values():
+            for _, future in device.queue:
+                future.cancel()
+            device.queue.clear()
+            await device.client.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def submit(self, name, make_coro, urgent=False):
+        """機器nameのキューにコマンドを積み、結果を受け取るFutureを返す.
+
+        make_coroはServoClientを受け取ってコルーチンを返す関数. urgentなら待ち行列の先頭に積む.
+        """
+        device = self.devices[name]
+        future = asyncio.get_running_loop().create_future()
+        if urgent:
+            device.queue.appendleft((make_coro, future))
+        else:
+            device.queue.append((make_coro, future))
+        self._wakeup.set()
+        return future
+
+    async def call(self, name, make_coro, urgent=False):
+        return await self.submit(name, make_coro, urgent)
+
+    async def broadcast(self, make_coro, names=None, urgent=True):
+        """全機器 (またはnamesの機器) に同じコマンドを送り、GroupResultを返す."""
+        names = list(names) if names is not None else self.names
+        started = time.perf_counter()
+        futures = [self.submit(name, make_coro, urgent) for name in names]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        done_at = time.perf_counter()
+        sent_at = {name: self.devices[name].client.last_sent_at for name in names}
+        return GroupResult(dict(zip(names, results)), sent_at, started, done_at)
+
+    async def stop_all(self, names=None):
+        """全機器にチルト停止 (CMND 43h) を送る. 待ち行列の先頭に割り込む."""
+        return await self.broadcast(lambda client: client.tilt("stop"), names)
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._start_ready()
+
+    def _start_ready(self):
+        """空いている機器のコマンドを、前回の続きの機器から順に開始する."""
+        devices = list(self.devices.values())
+        start = self._next
+        for i in range(len(devices)):
+            if self.max_concurrent is not None and self.running >= self.max_concurrent:
+                return
+            index = (start + i) % len(devices)
+            device = devices[index]
+            while device.queue and device.queue[0][1].cancelled():
+                device.queue.popleft()
+            if device.busy or not device.queue:
+                continue
+            make_coro, future = device.queue.popleft()
+            self._next = index + 1
+            device.busy = True
+            self.running += 1
+            task = asyncio.create_task(make_coro(device.client))
+            task.add_done_callback(lambda t, device=device, future=future: self._on_done(device, future, t))
+
+    def _on_done(self, device, future, task):
+        device.busy = False
+        self.running -= 1
+        if not future.done():
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self._wakeup.set()
+
+
+class GroupResult:
+    """一斉送信の結果. 機器ごとの結果 (例外を含む) と送信時刻のずれ."""
+
+    def __init__(self, results, sent_at, started, done_at):
+        self.results = results
+        self.sent_at = sent_at
+        self.started = started
+        self.done_at = done_at
+
+    @property
+    def ok(self):
+        return all(not isinstance(r, BaseException) for r in self.results.values())
+
+    @property
+    def skew(self):
+        """機器間の送信時刻の最大のずれ (秒). 送信できなかった機器は除く."""
+        times = [t for name, t in self.sent_at.items()
+                 if t is not None and not isinstance(self.results[name], BaseException)]
+        return max(times) - min(times) if len(times) > 1 else 0.0
+
+    @property
+    def elapsed(self):
+        return self.done_at - self.started
+
+
+async def _main_async(args, ports):
+    log = (lambda message: print(message, end="")) if args.verbose else None
+    commands = {
+        "stop": lambda client: client.tilt("stop"),
+        "up": lambda client: client.tilt("up"),
+        "down": lambda client: client.tilt("down"),
+        "init": lambda client: client.init(),
+    }
+    skews = []
+    failed = 0
+    async with ServoBus(ports, max_concurrent=args.max_concurrent, log=log) as bus:
+        for i in range(args.repeat):
+            result = await bus.broadcast(commands[args.command])
+            for name, r in result.results.items():
+                if isinstance(r, ServoCommandError):
+                    failed += 1
+                if args.repeat == 1 or isinstance(r, BaseException):
+                    state = tilt_status_text(r) if isinstance(r, int) else r
+                    print(f"[{i + 1}] {name}: {state}")
+            if result.ok:
+                skews.append(result.skew)
+    r = summarize_jitter(skews)
+    if r:
+        print(f"一斉送信 {args.repeat} 回 ({len(ports)} 台), 失敗 {failed}: 送信時刻のずれ 平均 {r['mean_ms']:.3f} ms, "
+              f"p99 {r['p99_ms']:.3f} ms, 最大 {r['max_ms']:.3f} ms")
+    return 0 if failed == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数のサーボ機器へ同じコマンドを一斉に送信し、機器間のずれを測定する.")
+    parser.add_argument("ports", nargs="*", help="シリアルポート (例: COM3 COM4)")
+    parser.add_argument("--command", choices=("stop", "up", "down", "init"), default="stop")
+    parser.add_argument("--repeat", type=int, default=1, help="一斉送信の回数")
+    parser.add_argument("--max-concurrent", type=int, help="全体で同時に実行するコマンド数の上限")
+    parser.add_argument("--simulate", type=int, default=0, help="仮想サーボ機器をN台起動して使う (Linux専用)")
+    parser.add_argument("--verbose", action="store_true", help="送受信ログを表示する")
+    args = parser.parse_args(argv)
+
+    if not args.simulate:
+        if not args.ports:
+            parser.error("ポートを指定するか --simulate を使ってください。")
+        return asyncio.run(_main_async(args, args.ports))
+
+    from servo_sim import VirtualServoDevice
+    devices = [VirtualServoDevice(seed=i) for i in range(args.simulate)]
+    for device in devices:
+        device.start()
+    try:
+        return asyncio.run(_main_async(args, args.ports + [device.port for device in devices]))
+    finally:
+        for device in devices:
+            device.stop()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
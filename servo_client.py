@@ -0,0 +1,580 @@
+import argparse
+import asyncio
+import itertools
+import random
+import threading
+import time
+
+import serial
+
+from servo_metrics import ServoMetrics
+from servo_protocol import (
+    INIT_CMND, INIT_DATA, MAX_TILT_ANGLE, READ_TIMEOUT, TILT_ANGLE_CMND, TILT_CONTROL_CMND, TILT_MODE_DATA,
+    TILT_STOP_DATA,
+    SerialFrameReader, angle_to_sign_mode, build_frame, calculate_bcc, check_init_response,
+    check_tilt_angle_response, check_tilt_control_response, convert_angle_to_bytes, expected_response_cmnd,
+    format_hex, tilt_status_text, ServoResponseError,
+)
+
+
+class ServoCommandError(Exception):
+    """リトライしてもコマンドが成功しなかった."""
+
+
+# チルト制御 (43h) と角度指定チルト (44h) はどちらも最新の指令だけが意味を持つため、まとめて置き換える
+TILT_COALESCE_KEY = "tilt"
+
+
+class ServoCommandSuperseded(ServoCommandError):
+    """同じ種類の新しいコマンドに置き換えられたため送信しなかった."""
+
+
+class _SendQueue:
+    """送信の順番待ち. 同時送信数と応答CMNDの重複を制限し、優先 (停止) の要求から順に送信を許可する.
+
+    coalesce_keyが同じ要求が新たに並ぶと、まだ送信を許可していない古い要求をServoCommandSupersededで取り消す.
+    """
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.waiting = []  # [urgent, 到着順, 応答CMND, coalesce_key, Future]
+        self.in_flight = []  # 送信中の応答CMND
+        self.sequence = itertools.count()
+
+    async def acquire(self, expected_cmnd, urgent=False, coalesce_key=None):
+        if coalesce_key is not None:
+            for entry in [e for e in self.waiting if e[3] == coalesce_key]:
+                self.waiting.remove(entry)
+                if entry[4].done():
+                    continue  # 取り消し済みでタスクがまだ動いていない
+                entry[4].set_exception(ServoCommandSuperseded("新しいコマンドに置き換えられました。"))
+        granted = asyncio.get_running_loop().create_future()
+        entry = [not urgent, next(self.sequence), expected_cmnd, coalesce_key, granted]
+        self.waiting.append(entry)
+        self._grant()
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if entry in self.waiting:
+                self.waiting.remove(entry)
+            elif granted.done() and not granted.cancelled() and granted.exception() is None:
+                self.release(expected_cmnd)  # 許可と取り消しが行き違った
+            raise
+
+    def release(self, expected_cmnd):
+        self.in_flight.remove(expected_cmnd)
+        self._grant()
+
+    def _grant(self):
+        self.waiting.sort(key=lambda e: (e[0], e[1]))
+        for entry in list(self.waiting):
+            if entry[4].done():
+                self.waiting.remove(entry)  # 取り消された待ちは、タスクが動く前でも送信枠を渡さずに捨てる
+                continue
+            if len(self.in_flight) >= self.max_in_flight:
+                break
+            if entry[2] in self.in_flight:
+                continue  # 同じ応答CMNDの送信中は応答を区別できないため待たせる
+            self.waiting.remove(entry)
+            self.in_flight.append(entry[2])
+            entry[4].set_result(None)
+
+
+def _silent(message):
+    pass
+
+
+class _PendingResponse:
+    """イベントループのFutureで応答フレームを受け取る応答待ち."""
+
+    def __init__(self, expected_cmnd, loop):
+        self.expected_cmnd = expected_cmnd
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def set(self, frame, bcc_ok, first_byte_at, received_at):
+        # 受信スレッドから呼ばれるため、結果の設定はイベントループに任せる
+        self.loop.call_soon_threadsafe(self._resolve, (frame, bcc_ok, first_byte_at, received_at))
+
+    def _resolve(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class RttEstimator:
+    """応答時間の平滑化平均 (SRTT) と平均偏差 (RTTVAR) から応答待ち時間を求める (TCPのRFC 6298と同じ方式).
+
+    待ち時間は SRTT + max(min_timeout, K * RTTVAR). 偏差が小さくても少なくともmin_timeoutの余裕を持たせる.
+    タイムアウトのたびに待ち時間を倍に延ばし、次に応答時間を測れた時点で元に戻す.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    MAX_BACKOFF = 64
+
+    def __init__(self, initial_timeout=0.1, min_timeout=0.02, max_timeout=1.0):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.srtt = None
+        self.rttvar = None
+        self.base_timeout = initial_timeout
+        self.backoff = 1
+        self.samples = 0
+        self.timeouts = 0
+
+    @property
+    def timeout(self):
+        """次の応答待ちに使う時間 (秒)."""
+        return min(self.max_timeout, self.base_timeout * self.backoff)
+
+    def add_sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.base_timeout = min(self.max_timeout, self.srtt + max(self.min_timeout, self.K * self.rttvar))
+        self.backoff = 1
+        self.samples += 1
+
+    def on_timeout(self):
+        self.timeouts += 1
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+
+
+def is_replayable_tilt(cmnd_byte, data_bytes_list):
+    """送り直しても機器が動かないチルト指令か (停止と角度指定. 角度指定は同じ目標角度への再指示になる).
+
+    連続の上/下は送り直すと停止後の機器を再び動かすため含めない.
+    """
+    if cmnd_byte == TILT_ANGLE_CMND:
+        return True
+    return cmnd_byte == TILT_CONTROL_CMND and list(data_bytes_list) == TILT_STOP_DATA
+
+
+class ServoClient:
+    """サーボ機器を asyncio から操作するクライアント (GUIに依存しない).
+
+    受信はSerialFrameReaderのスレッドが行い、応答はCMNDバイトで各リクエストへ振り分けられる.
+    max_in_flightを2以上にすると、応答CMNDの異なるリクエストを応答を待たずに続けて送信する.
+    応答待ち時間は測定した応答時間から決め (response_timeoutは測定前の初期値)、
+    リトライの間隔はretry_backoff_baseから倍々に延ばしたうえで揺らぎを加える (上限retry_interval).
+    """
+
+    def __init__(self, port, baudrate=19200, response_timeout=0.1, max_retries=3, retry_interval=0.2,
+                 max_in_flight=1, log=None, on_unsolicited_frame=None, min_timeout=0.02, max_timeout=1.0,
+                 retry_backoff_base=0.005):
+        self.port = port
+        self.baudrate = baudrate
+        self.rtt = RttEstimator(response_timeout, min_timeout, max_timeout)
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.retry_backoff_base = retry_backoff_base
+        self.max_in_flight = max_in_flight
+        self.metrics = ServoMetrics()  # 操作で送ったコマンドの計測
+        self.poll_metrics = ServoMetrics()  # 状態の問い合わせ (poll) の計測. 操作の遅延や失敗に混ぜない
+        self.last_sent_at = None  # 最後にコマンドを書き込んだ時刻 (time.perf_counter)
+        # 状態の問い合わせに送り直してよい最後のチルト指令 (CMND, DATA). 停止か角度指定だけで、
+        # 連続の上/下を送ったとき・それ以外のコマンドを送ったとき・チルト指令が失敗したときはNone
+        self.last_tilt_command = None
+        self.status_listeners = []  # チルト状態バイトを受け取る関数 (イベントループのスレッドで呼ばれる)
+        self.log = log or (lambda message: None)
+        self.on_unsolicited_frame = on_unsolicited_frame
+        self.serial_port = None
+        self.reader = None
+        self._queue = None
+        self._generations = {}  # coalesce_keyごとの最新の要求番号
+
+    @property
+    def is_open(self):
+        return self.serial_port is not None and self.serial_port.is_open
+
+    @property
+    def is_idle(self):
+        """送信中・送信待ちのコマンドが無い."""
+        return self._queue is not None and not self._queue.waiting and not self._queue.in_flight
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.serial_port = await loop.run_in_executor(None, self._open_port)
+        self.reader = SerialFrameReader(self.serial_port, self.log, self.on_unsolicited_frame)
+        self.reader.start()
+        self._queue = _SendQueue(self.max_in_flight)
+        self._generations = {}
+
+    def _open_port(self):
+        return serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_EVEN,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=READ_TIMEOUT
+        )
+
+    async def close(self):
+        if self.reader:
+            await asyncio.get_running_loop().run_in_executor(None, self.reader.stop)
+            self.reader = None
+        if self.serial_port and self.serial_port.is_open:
+            self.serial_port.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def request(self, cmnd_byte, data_bytes_list, validate=None, any_response=False, max_retries=None,
+                      coalesce_key=None, urgent=False, quiet=False, poll=False):
+        """コマンドを送信し、レスポンスを返す.
+
+        validateはレスポンスフレームを検証する関数で、不一致ならServoResponseErrorを送出する.
+        validateを渡した場合はその戻り値を返す. 全ての試行が失敗するとServoCommandErrorを送出する.
+        any_responseがTrueなら応答CMNDを問わず、次に届いたフレームを応答とする (汎用コマンド用).
+        coalesce_keyが同じ新しい要求が来ると、未送信の古い要求やそのリトライはServoCommandSupersededで終わる.
+        urgentなら送信待ちの先頭に割り込む. quietなら送受信をログに出さない (定期的な問い合わせ用).
+        pollなら状態の問い合わせとしてmetricsではなくpoll_metricsに数える.
+        """
+        log = _silent if quiet else self.log
+        metrics = self.poll_metrics if poll else self.metrics
+        if not self.is_open:
+            raise ServoCommandError("シリアルポートが接続されていません。")
+        if coalesce_key != TILT_COALESCE_KEY:
+            # request_tilt以外 (初期化や汎用コマンドの43h/44hなど) で機器の状態が変わりうるので、問い合わせで送り直さない
+            self.last_tilt_command = None
+        if max_retries is None:
+            max_retries = self.max_retries
+        expected_cmnd = None if any_response else expected_response_cmnd(cmnd_byte)
+        command_frame = build_frame(cmnd_byte, data_bytes_list)
+
+        generation = None
+        if coalesce_key is not None:
+            generation = self._generations[coalesce_key] = self._generations.get(coalesce_key, 0) + 1
+
+        metrics.count(cmnd_byte, "requests")
+        for attempt in range(max_retries):
+            if attempt and generation != self._generations.get(coalesce_key, generation):
+                raise self._superseded(cmnd_byte, log, metrics)
+            log(f"コマンド送信試行: {attempt + 1}/{max_retries}\n")
+            if attempt:
+                metrics.count(cmnd_byte, "retries")
+            try:
+                # 再送時の応答は前回分への遅れた応答の可能性があるため、初回だけ応答時間を測る (Karnの方式)
+                response = await self._transact(command_frame, expected_cmnd, log, measure_rtt=attempt == 0,
+                                                urgent=urgent, coalesce_key=coalesce_key, metrics=metrics)
+            except ServoCommandSuperseded:
+                raise self._superseded(cmnd_byte, log, metrics) from None
+            except serial.SerialException as e:
+                log(f"エラー: コマンド送信失敗: {e}\n")
+                log("コマンド送信失敗。リトライします。\n")
+            else:
+                if response is None:
+                    log("レスポンス受信失敗、またはBCCエラー。リトライします。\n")
+                elif validate is None:
+                    log(f"コマンド成功！ レスポンス: {response.hex()}\n\n")
+                    metrics.count(cmnd_byte, "ok")
+                    return response
+                else:
+                    try:
+                        result = validate(response)
+                    except ServoResponseError as e:
+                        metrics.count(cmnd_byte, "mismatches")
+                        log(f"{e}\n")
+                        log("レスポンス内容が期待値と異なります。リトライします。\n")
+                    else:
+                        metrics.count(cmnd_byte, "ok")
+                        return result
+
+            if attempt < max_retries - 1:
+                await asyncio.sleep(self.retry_delay(attempt))
+
+        metrics.count(cmnd_byte, "failures")
+        log("コマンド送信に失敗しました (リトライ回数超過)。\n\n")
+        raise ServoCommandError(f"CMND {cmnd_byte:02X}h の送信に失敗しました (リトライ回数超過)。")
+
+    def _superseded(self, cmnd_byte, log, metrics):
+        metrics.count(cmnd_byte, "superseded")
+        log(f"CMND {cmnd_byte:02X}h: 新しいコマンドに置き換えられたため、送信を取りやめました。\n\n")
+        return ServoCommandSuperseded(f"CMND {cmnd_byte:02X}h は新しいコマンドに置き換えられました。")
+
+    def retry_delay(self, attempt):
+        """attempt回目 (0始まり) の失敗後に待つ時間. 倍々に延ばし、半分から全体の範囲で揺らがせる."""
+        delay = min(self.retry_interval, self.retry_backoff_base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def stats(self):
+        """通信統計 (応答時間の推定値はミリ秒) を返す. コマンドごとの内訳はmetricsにある."""
+        rtt = self.rtt
+        totals = self.metrics.totals()
+        return {
+            "srtt_ms": rtt.srtt * 1000 if rtt.srtt is not None else None,
+            "rttvar_ms": rtt.rttvar * 1000 if rtt.rttvar is not None else None,
+            "timeout_ms": rtt.timeout * 1000,
+            "samples": rtt.samples,
+            "timeouts": rtt.timeouts,
+            "requests": totals["requests"],
+            "retries": totals["retries"],
+            "failures": totals["failures"],
+            "superseded": totals["superseded"],
+            "polls": self.poll_metrics.totals()["requests"],
+            "unexpected_frames": self.reader.unsolicited_frames if self.reader else 0,
+            "discarded_bytes": self.reader.framer.discarded_bytes if self.reader else 0,
+        }
+
+    async def _transact(self, command_frame, expected_cmnd, log, measure_rtt=True, urgent=False, coalesce_key=None,
+                        metrics=None):
+        """1回分の送信と応答待ち. タイムアウトやBCCエラーの場合はNoneを返す."""
+        metrics = self.metrics if metrics is None else metrics
+        cmnd_byte = command_frame[1]
+        await self._queue.acquire(expected_cmnd, urgent, coalesce_key)
+        try:
+            pending = self.reader.expect(_PendingResponse(expected_cmnd, asyncio.get_running_loop()))
+            log(f"送信データ (HEX): {format_hex(command_frame)}\n")
+            timeout = self.rtt.timeout
+            try:
+                metrics.count(cmnd_byte, "attempts")
+                sent_at = self.last_sent_at = time.perf_counter()
+                self.serial_port.write(command_frame)
+                metrics.record_latency(cmnd_byte, "send", time.perf_counter() - sent_at)
+                # wait_forは応答と取り消しが重なると取り消しを捨てることがある (Python 3.11まで) のでwaitで待つ
+                done, _ = await asyncio.wait((pending.future,), timeout=timeout)
+                if not done:
+                    raise asyncio.TimeoutError
+                frame, bcc_ok, first_byte_at, received_at = pending.future.result()
+            except asyncio.TimeoutError:
+                self.rtt.on_timeout()
+                metrics.count(cmnd_byte, "timeouts")
+                log(f"レスポンスがありませんでした ({timeout * 1000:.0f} ms)。\n")
+                return None
+            finally:
+                self.reader.cancel(pending)
+        finally:
+            self._queue.release(expected_cmnd)
+
+        # 受信時刻は受信スレッドで記録したものを使い、イベントループの混み具合を含めない
+        rtt = received_at - sent_at
+        metrics.record_latency(cmnd_byte, "first_byte", max(0.0, first_byte_at - sent_at))
+        metrics.record_latency(cmnd_byte, "frame", rtt)
+        log(f"受信データ (HEX): {format_hex(frame)}\n")
+        if not bcc_ok:
+            metrics.count(cmnd_byte, "bcc_errors")
+            log(f"BCCチェック: エラー (受信: {frame[-1]:02X}, 計算: {calculate_bcc(frame[:-1]):02X})\n")
+            return None
+        metrics.count(cmnd_byte, "bcc_ok")
+        log("BCCチェック: OK\n")
+        if measure_rtt:
+            self.rtt.add_sample(rtt)
+        return frame
+
+    async def init(self, max_retries=None):
+        """初期化コマンド (CMND 4Eh) を送信し、レスポンスフレームを返す."""
+        return await self.request(INIT_CMND, INIT_DATA, check_init_response, max_retries=max_retries)
+
+    async def tilt(self, mode, max_retries=None):
+        """チルト制御 (CMND 43h) を送信し、チルト状態バイトを返す. modeは stop/up/down.
+
+        未送信の古いチルト指令 (43h/44h) は破棄され、停止は送信待ちの先頭に割り込む.
+        """
+        if mode not in TILT_MODE_DATA:
+            raise ValueError(f"不正なチルトモードです: {mode}")
+        return await self.request_tilt(TILT_CONTROL_CMND, TILT_MODE_DATA[mode], max_retries, urgent=mode == "stop")
+
+    async def tilt_to(self, angle, sign="none", max_retries=None):
+        """角度指定チルト (CMND 44h) を送信し、チルト状態バイトを返す. signは minus/none/plus.
+
+        未送信の古いチルト指令 (43h/44h) は破棄される.
+        """
+        if not (0.0 <= angle <= MAX_TILT_ANGLE):
+            raise ValueError(f"角度は0.00から{MAX_TILT_ANGLE}の範囲で指定してください: {angle}")
+        return await self.request_tilt(TILT_ANGLE_CMND, convert_angle_to_bytes(angle, sign), max_retries)
+
+    async def request_tilt(self, cmnd_byte, data_bytes_list, max_retries=None, urgent=False, quiet=False, poll=False):
+        """チルト指令 (43h/44h) を送信し、応答のチルト状態をstatus_listenersへ知らせてから返す."""
+        validate = check_tilt_angle_response if cmnd_byte == TILT_ANGLE_CMND else check_tilt_control_response
+        command = (cmnd_byte, list(data_bytes_list))
+        try:
+            status = await self.request(cmnd_byte, data_bytes_list, validate, max_retries=max_retries,
+                                        coalesce_key=TILT_COALESCE_KEY, urgent=urgent, quiet=quiet, poll=poll)
+        except ServoCommandSuperseded:
+            raise  # 置き換えた新しい指令がlast_tilt_commandを決める
+        except ServoCommandError:
+            # 別の指令 (停止など) が届いたか分からないので、前の指令を送り直さない. 同じ指令の問い合わせの失敗はそのまま
+            if self.last_tilt_command != command:
+                self.last_tilt_command = None
+            raise
+        self.last_tilt_command = command if is_replayable_tilt(cmnd_byte, data_bytes_list) else None
+        for listener in self.status_listeners:
+            listener(status)
+        return status
+
+
+def format_link_stats(stats):
+    """ServoClient.stats() の結果を1行の文字列にする."""
+    if stats["srtt_ms"] is None:
+        rtt_text = "応答時間: 未測定"
+    else:
+        rtt_text = f"応答時間: {stats['srtt_ms']:.1f} ms (偏差 {stats['rttvar_ms']:.1f} ms)"
+    return (f"{rtt_text}, 応答待ち {stats['timeout_ms']:.0f} ms, 送信 {stats['requests']}, "
+            f"再送 {stats['retries']}, タイムアウト {stats['timeouts']}, 失敗 {stats['failures']}, "
+            f"置換 {stats['superseded']}, 問い合わせ {stats['polls']}, 予期せぬフレーム {stats['unexpected_frames']}")
+
+
+class ServoClientRunner:
+    """ServoClientを専用スレッドのイベントループで動かし、GUIなどの同期コードから使えるようにする."""
+
+    def __init__(self, client):
+        self.client = client
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+
+    def start(self, timeout=5):
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        try:
+            self.call(self.client.open(), timeout)
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    def submit(self, coro):
+        """コルーチンをイベントループで実行し、concurrent.futures.Futureを返す."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+    def stop(self, timeout=1):
+        try:
+            self.call(self._shutdown(), timeout)
+        finally:
+            self._stop_loop(timeout)
+
+    async def _shutdown(self):
+        # 実行中・待機中のコマンドを取り消してからポートを閉じる
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.close()
+
+    def _stop_loop(self, timeout=1):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        if not self.loop.is_running():
+            self.loop.close()
+
+
+# --- コマンドバッチ実行 (CLI) ---
+
+def parse_batch_line(line):
+    """バッチファイルの1行を (コマンド名, 引数リスト) に分解する. 空行とコメントはNone."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    name, *args = line.split()
+    return name.lower(), args
+
+
+def load_batch(file_path):
+    commands = []
+    with open(file_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            parsed = parse_batch_line(line)
+            if parsed is None:
+                continue
+            if parsed[0] not in ("init", "tilt", "tilt_to", "raw", "sleep"):
+                raise ValueError(f"{line_no}行目: 不明なコマンドです: {parsed[0]}")
+            commands.append((line_no, *parsed))
+    return commands
+
+
+def make_batch_call(client, name, args):
+    """バッチのコマンドをクライアントのコルーチンに変換する."""
+    if name == "init":
+        return client.init()
+    if name == "tilt":
+        return client.tilt(args[0])
+    if name == "tilt_to":
+        angle = float(args[0])
+        if len(args) > 1:
+            return client.tilt_to(angle, args[1])
+        sign, magnitude = angle_to_sign_mode(angle)
+        return client.tilt_to(magnitude, sign)
+    if name == "raw":
+        data = bytes.fromhex(args[1]) if len(args) > 1 else b""
+        return client.request(int(args[0], 16), list(data), any_response=True)
+    raise ValueError(f"不明なコマンドです: {name}")
+
+
+def format_batch_result(name, result):
+    if name in ("tilt", "tilt_to"):
+        return f"状態: {tilt_status_text(result)}"
+    return f"レスポンス: {format_hex(result)}"
+
+
+async def run_batch(client, commands, pipeline=False):
+    """バッチを実行し、(成功数, 失敗数) を返す.
+
+    pipelineがTrueの場合、sleep行までのコマンドを応答を待たずにまとめて投入する.
+    """
+    ok = failed = 0
+
+    async def run_one(line_no, name, args):
+        nonlocal ok, failed
+        started = time.perf_counter()
+        try:
+            result = await make_batch_call(client, name, args)
+        except (ServoCommandError, ValueError, IndexError) as e:
+            failed += 1
+            print(f"[{line_no}] {name} {' '.join(args)}: 失敗 ({e})")
+            return
+        ok += 1
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"[{line_no}] {name} {' '.join(args)}: {format_batch_result(name, result)} ({elapsed_ms:.1f} ms)")
+
+    group = []
+    for line_no, name, args in commands:
+        if name == "sleep":
+            await asyncio.gather(*group)
+            group = []
+            await asyncio.sleep(float(args[0]))
+        elif pipeline:
+            group.append(run_one(line_no, name, args))
+        else:
+            await run_one(line_no, name, args)
+    await asyncio.gather(*group)
+    return ok, failed
+
+
+async def _main_async(args):
+    log = (lambda message: print(message, end="")) if args.verbose else None
+    commands = load_batch(args.batch_file)
+    client = ServoClient(args.port, args.baudrate, max_in_flight=args.max_in_flight, log=log)
+    async with client:
+        started = time.perf_counter()
+        ok, failed = await run_batch(client, commands, pipeline=args.pipeline)
+        elapsed = time.perf_counter() - started
+    rate = (ok + failed) / elapsed if elapsed > 0 else 0.0
+    print(f"完了: 成功 {ok}, 失敗 {failed}, {elapsed:.3f} 秒 ({rate:.1f} コマンド/秒)")
+    return 0 if failed == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="サーボ機器へコマンドのバッチを送信する.")
+    parser.add_argument("port", help="シリアルポート (例: COM3, /dev/ttyUSB0)")
+    parser.add_argument("batch_file", help="1行1コマンドのバッチファイル (init / tilt up / tilt_to -3.5 / raw 41 30 / sleep 0.5)")
+    parser.add_argument("--baudrate", type=int, default=19200)
+    parser.add_argument("--pipeline", action="store_true", help="sleep行までのコマンドを応答を待たずに投入する")
+    parser.add_argument("--max-in-flight", type=int, default=1, help="同時に応答待ちにできるコマンド数")
+    parser.add_argument("--verbose", action="store_true", help="送受信ログを表示する")
+    args = parser.parse_args(argv)
+    return asyncio.run(_main_async(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+import bisect
+import csv
+import threading
+
+# 遅延ヒストグラムの区間の上端 (ミリ秒). 最後の区間は上限なし
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200, 300, 500, 1000, 2000)
+
+# 計測する遅延の段階: 送信 (writeの所要時間), 最初のバイト, フレーム全体 (いずれも送信開始から)
+LATENCY_STAGES = ("send", "first_byte", "frame")
+
+COUNTER_NAMES = ("requests", "attempts", "ok", "retries", "timeouts", "bcc_ok", "bcc_errors", "mismatches",
+                 "failures", "superseded")
+
+
+class LatencyHistogram:
+    """固定区間の遅延ヒストグラム. 記録は区間の数によらず一定の手間で済む."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """p (0～1) 分位点を含む区間の上端 (ミリ秒) を返す. ただし最大値を超えない."""
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(self.buckets_ms[i], self.max_ms) if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else None
+
+
+class CommandMetrics:
+    """1種類のコマンド (送信CMND) の計数と段階ごとの遅延."""
+
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTER_NAMES, 0)
+        self.latency = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+
+
+class ServoMetrics:
+    """ServoClientの送受信をコマンドごとに計測する. 記録はイベントループ、読み出しはGUIのスレッドから行う."""
+
+    def __init__(self):
+        self.commands = {}
+        self.lock = threading.Lock()
+
+    def _command(self, cmnd_byte):
+        metrics = self.commands.get(cmnd_byte)
+        if metrics is None:
+            metrics = self.commands[cmnd_byte] = CommandMetrics()
+        return metrics
+
+    def count(self, cmnd_byte, name, n=1):
+        with self.lock:
+            self._command(cmnd_byte).counters[name] += n
+
+    def record_latency(self, cmnd_byte, stage, seconds):
+        with self.lock:
+            self._command(cmnd_byte).latency[stage].add(seconds)
+
+    def totals(self):
+        """全コマンドを合計した計数."""
+        with self.lock:
+            totals = dict.fromkeys(COUNTER_NAMES, 0)
+            for metrics in self.commands.values():
+                for name, value in metrics.counters.items():
+                    totals[name] += value
+        return totals
+
+    def rows(self):
+        """表示用に、コマンドごとの計数と遅延の代表値 (ミリ秒) を辞書のリストで返す."""
+        rows = []
+        with self.lock:
+            for cmnd_byte in sorted(self.commands):
+                metrics = self.commands[cmnd_byte]
+                row = {"cmnd": cmnd_byte}
+                row.update(metrics.counters)
+                for stage, histogram in metrics.latency.items():
+                    row[f"{stage}_p50_ms"] = histogram.percentile(0.5)
+                    row[f"{stage}_p99_ms"] = histogram.percentile(0.99)
+                    row[f"{stage}_max_ms"] = histogram.max_ms if histogram.count else None
+                rows.append(row)
+        return rows
+
+    def export_csv(self, file_path, extra=None):
+        """計数とヒストグラムを cmnd,metric,bucket_ms,value の縦持ちCSVで書き出す.
+
+        extraは {名前: 値} で、CMNDに属さない計数 (予期せぬフレーム数など) を書き加える.
+        """
+        with self.lock, open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["cmnd", "metric", "bucket_ms", "value"])
+            for name, value in (extra or {}).items():
+                writer.writerow(["", name, "", value])
+            for cmnd_byte in sorted(self.commands):
+                metrics = self.commands[cmnd_byte]
+                cmnd = f"{cmnd_byte:02X}"
+                for name, value in metrics.counters.items():
+                    writer.writerow([cmnd, name, "", value])
+                for stage, histogram in metrics.latency.items():
+                    edges = [str(b) for b in histogram.buckets_ms] + ["inf"]
+                    for edge, n in zip(edges, histogram.counts):
+                        writer.writerow([cmnd, f"{stage}_ms", edge, n])
+                    writer.writerow([cmnd, f"{stage}_mean_ms", "", histogram.mean_ms if histogram.count else ""])
+                    writer.writerow([cmnd, f"{stage}_max_ms", "", histogram.max_ms if histogram.count else ""])
@@ -0,0 +1,116 @@
+import asyncio
+import csv
+import statistics
+import time
+
+from servo_client import ServoCommandError
+from servo_protocol import MAX_TILT_ANGLE, angle_to_sign_mode
+
+
+def load_profile_csv(file_path):
+    """time,angle 形式のCSVからモーションプロファイルを読み込む.
+
+    timeは開始からの秒数、angleは符号付きの角度 (負: -, 正: +, 0: 符号なし).
+    ヘッダ行と '#' で始まる行は無視する.
+    """
+    points = []
+    with open(file_path, newline="", encoding="utf-8") as f:
+        for line_no, row in enumerate(csv.reader(f), start=1):
+            if not row or not row[0].strip() or row[0].strip().startswith("#"):
+                continue
+            try:
+                points.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                if not points and line_no == 1:
+                    continue  # ヘッダ行
+                raise ValueError(f"{line_no}行目を解釈できません: {','.join(row)}")
+    return normalize_profile(points)
+
+
+def normalize_profile(points):
+    """(時刻, 角度) のリストを検証し、時刻順に並べて返す."""
+    profile = sorted((float(t), float(angle)) for t, angle in points)
+    if not profile:
+        raise ValueError("プロファイルが空です。")
+    for t, angle in profile:
+        if t < 0:
+            raise ValueError(f"時刻は0以上で指定してください: {t}")
+        if abs(angle) > MAX_TILT_ANGLE:
+            raise ValueError(f"角度は±{MAX_TILT_ANGLE}の範囲で指定してください: {angle}")
+    return profile
+
+
+def summarize_jitter(lateness_list):
+    """送信時刻の遅れ (秒) のリストから統計値 (ミリ秒) を求める."""
+    if not lateness_list:
+        return {}
+    ordered = sorted(lateness_list)
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class MotionProfilePlayer:
+    """モーションプロファイルの各点を単調時計の期限どおりに CMND 44h で送信する.
+
+    予定時刻に遅れている場合は待たずに次の点を送るため、送信レートは機器の応答速度で決まる.
+    """
+
+    def __init__(self, client, profile, log):
+        self.client = client
+        self.profile = normalize_profile(profile)
+        self.log = log
+        self.lateness = []
+        self.round_trip_times = []
+        self.sent = 0
+        self.failed = 0
+
+    async def play(self):
+        """プロファイルを再生する. タスクを取り消すと再生を中断する."""
+        self.log(f"モーションプロファイル再生開始: {len(self.profile)} 点, {self.profile[-1][0]:.2f} 秒\n")
+        start = time.monotonic()
+        interrupted = False
+        try:
+            for t, angle in self.profile:
+                deadline = start + t
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+                sign_mode, magnitude = angle_to_sign_mode(angle)
+                send_time = time.monotonic()
+                self.lateness.append(send_time - deadline)
+                try:
+                    # 再生中はリトライせず、次の点で軌道に追従させる
+                    await self.client.tilt_to(magnitude, sign_mode, max_retries=1)
+                except ServoCommandError:
+                    self.failed += 1
+                self.round_trip_times.append(time.monotonic() - send_time)
+                self.sent += 1
+        except asyncio.CancelledError:
+            interrupted = True
+            raise
+        finally:
+            self._report(time.monotonic() - start, interrupted)
+
+    def report(self):
+        result = {"sent": self.sent, "failed": self.failed}
+        result.update({f"lateness_{k}": v for k, v in summarize_jitter(self.lateness).items()})
+        if self.round_trip_times:
+            result["rtt_mean_ms"] = statistics.fmean(self.round_trip_times) * 1000
+            result["rtt_max_ms"] = max(self.round_trip_times) * 1000
+        return result
+
+    def _report(self, elapsed, interrupted):
+        state = "中断" if interrupted else "完了"
+        r = self.report()
+        rate = self.sent / elapsed if elapsed > 0 else 0.0
+        self.log(f"モーションプロファイル再生{state}: 送信 {self.sent} 点, 失敗 {self.failed} 点, {rate:.1f} 点/秒\n")
+        if self.lateness:
+            self.log(f"  送信タイミングの遅れ: 平均 {r['lateness_mean_ms']:.2f} ms, p50 {r['lateness_p50_ms']:.2f} ms, "
+                     f"p99 {r['lateness_p99_ms']:.2f} ms, 最大 {r['lateness_max_ms']:.2f} ms\n")
+        if self.round_trip_times:
+            self.log(f"  往復時間: 平均 {r['rtt_mean_ms']:.2f} ms, 最大 {r['rtt_max_ms']:.2f} ms\n\n")
@@ -0,0 +1,272 @@
+import threading
+import time
+
+import serial
+
+# --- フレーム定数 ---
+STX = 0x02
+ETX = 0x03
+
+# レスポンスフレームの最大長 (これを超えてETXが見つからなければ同期を取り直す)
+MAX_FRAME_LENGTH = 64
+
+# シリアルポートを開く際の1回のreadの最大待ち時間 (秒)
+# readは1バイトでも届けば即座に返るため、応答待ちの遅れはこの値で抑えられる
+READ_TIMEOUT = 0.01
+
+# --- コマンド定数 ---
+# 初期化コマンド
+INIT_CMND = 0x4E
+INIT_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
+
+# チルト制御コマンド
+TILT_CONTROL_CMND = 0x43
+TILT_STOP_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
+TILT_UP_DATA = [0x31, 0x30, 0x30, 0x30, 0x30, 0x30]
+TILT_DOWN_DATA = [0x32, 0x30, 0x30, 0x30, 0x30, 0x30]
+TILT_MODE_DATA = {
+    "stop": TILT_STOP_DATA,
+    "up": TILT_UP_DATA,
+    "down": TILT_DOWN_DATA,
+}
+
+# 角度指定チルト制御コマンド
+TILT_ANGLE_CMND = 0x44
+TILT_ANGLE_SIGN_MINUS = 0x32
+TILT_ANGLE_SIGN_NONE = 0x33
+TILT_ANGLE_SIGN_PLUS = 0x34
+TILT_ANGLE_SIGN_MAP = {
+    "minus": TILT_ANGLE_SIGN_MINUS,
+    "none": TILT_ANGLE_SIGN_NONE,
+    "plus": TILT_ANGLE_SIGN_PLUS,
+}
+MAX_TILT_ANGLE = 15.0
+
+# レスポンスにおけるチルト状態 (CMND 43h のDATA 1バイト目)
+TILT_STATUS_STOP = 0x30
+TILT_STATUS_UP = 0x31
+TILT_STATUS_DOWN = 0x32
+TILT_STATUS_UPPER_LIMIT = 0x38
+TILT_STATUS_LOWER_LIMIT = 0x39
+TILT_STATUS_TEXT = {
+    TILT_STATUS_STOP: "停止",
+    TILT_STATUS_UP: "上",
+    TILT_STATUS_DOWN: "下",
+    TILT_STATUS_UPPER_LIMIT: "上限界",
+    TILT_STATUS_LOWER_LIMIT: "下限界",
+}
+
+# 初期化・チルト制御のレスポンス長: STX(1), CMND(1), DATA(6), ETX(1), BCC(1)
+RESPONSE_LENGTH = 10
+
+# 送信CMNDと応答CMNDが異なるコマンド (角度指定チルト 44h は 43h で応答する)
+RESPONSE_CMND_MAP = {
+    TILT_ANGLE_CMND: TILT_CONTROL_CMND,
+}
+
+
+class ServoResponseError(ValueError):
+    """レスポンスの内容が期待値と異なる."""
+
+
+def calculate_bcc(data_bytes):
+    """BCC (Block Check Character) を計算する (XOR方式)."""
+    bcc = 0
+    for b in data_bytes:
+        bcc ^= b
+    return bcc
+
+
+def build_frame(cmnd_byte, data_bytes_list):
+    """STX, CMND, DATA..., ETX, BCC のコマンドフレームを組み立てる."""
+    body = bytes([STX, cmnd_byte]) + bytes(data_bytes_list) + bytes([ETX])
+    return body + bytes([calculate_bcc(body)])
+
+
+def format_hex(data):
+    return ' '.join(f'{b:02X}' for b in data)
+
+
+def expected_response_cmnd(cmnd_byte):
+    return RESPONSE_CMND_MAP.get(cmnd_byte, cmnd_byte)
+
+
+def convert_angle_to_bytes(angle_float, sign_mode):
+    """角度 (0.00～15.0) と符号を角度指定チルトのDATA 6バイトに変換する."""
+    data_bytes = [TILT_ANGLE_SIGN_MAP.get(sign_mode, TILT_ANGLE_SIGN_NONE)]
+    angle_for_command = int(round(angle_float * 10))
+    angle_str_padded = f"{angle_for_command:03d}"
+    if len(angle_str_padded) > 3:
+        raise ValueError("計算された角度値が3桁を超えました。")
+    data_bytes.extend(ord(c) for c in angle_str_padded)
+    data_bytes.extend([0x30, 0x30])
+    return data_bytes
+
+
+def angle_to_sign_mode(angle):
+    """符号付き角度を角度指定チルトの符号モードと絶対値に分ける."""
+    if angle < 0:
+        return "minus", -angle
+    if angle > 0:
+        return "plus", angle
+    return "none", 0.0
+
+
+def check_init_response(response_bytes):
+    """初期化コマンドのレスポンスを検証する. 不一致ならServoResponseErrorを送出する."""
+    if len(response_bytes) != RESPONSE_LENGTH:
+        raise ServoResponseError(
+            f"初期化コマンド レスポンス: フォーマットが期待値と異なります。期待 {RESPONSE_LENGTH}バイト, 実際 {len(response_bytes)}バイト")
+    response_cmnd = response_bytes[1]
+    response_data = list(response_bytes[2:-2])
+    if response_cmnd != INIT_CMND or response_data != INIT_DATA:
+        raise ServoResponseError(
+            f"初期化コマンド レスポンス: 不一致！ 期待CMND: {INIT_CMND:02X}, 実際CMND: {response_cmnd:02X}, "
+            f"期待DATA: {format_hex(INIT_DATA)}, 実際DATA: {format_hex(response_data)}")
+    return response_bytes
+
+
+def check_tilt_control_response(response_bytes):
+    """チルト制御 (CMND 43h) のレスポンスを検証し、チルト状態バイトを返す."""
+    if len(response_bytes) != RESPONSE_LENGTH:
+        raise ServoResponseError(
+            f"チルト制御 レスポンス: フォーマットが期待値と異なります。期待 {RESPONSE_LENGTH}バイト, 実際 {len(response_bytes)}バイト")
+    response_cmnd = response_bytes[1]
+    if response_cmnd != TILT_CONTROL_CMND:
+        raise ServoResponseError(
+            f"チルト制御 レスポンス: CMNDが不一致！ 期待 {TILT_CONTROL_CMND:02X}, 実際 {response_cmnd:02X}")
+    return response_bytes[2]
+
+
+def check_tilt_angle_response(response_bytes):
+    """角度指定チルト (CMND 44h) のレスポンスを検証する. 応答はチルト制御と同じ形式 (CMND 43h)."""
+    return check_tilt_control_response(response_bytes)
+
+
+def tilt_status_text(status_byte):
+    return TILT_STATUS_TEXT.get(status_byte, f"不明な状態 ({status_byte:02X})")
+
+
+class ResponseFramer:
+    """受信バイト列から STX...ETX+BCC の完全なフレームを切り出す."""
+
+    def __init__(self, max_frame_length=MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self.buffer = bytearray()
+        self.discarded_bytes = 0
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, data):
+        """受信データを追加し、完成したフレームを (frame, bcc_ok) のリストで返す."""
+        buf = self.buffer
+        buf.extend(data)
+        frames = []
+        while buf:
+            start = buf.find(STX)
+            if start < 0:
+                self.discarded_bytes += len(buf)
+                buf.clear()
+                break
+            if start > 0:
+                self.discarded_bytes += start
+                del buf[:start]
+
+            end = buf.find(ETX, 1)
+            if end < 0:
+                if len(buf) > self.max_frame_length:
+                    # ETXが来ないまま長すぎる場合は先頭のSTXを捨てて再同期
+                    self.discarded_bytes += 1
+                    del buf[:1]
+                    continue
+                break
+            if end + 1 >= len(buf):
+                break  # BCC待ち
+
+            frame = bytes(buf[:end + 2])
+            del buf[:end + 2]
+            frames.append((frame, calculate_bcc(frame[:-1]) == frame[-1]))
+        return frames
+
+
+class SerialFrameReader:
+    """ポートの受信を一手に引き受け、フレームを応答待ちのコマンドへ振り分けるスレッド."""
+
+    def __init__(self, serial_port, log, on_unsolicited_frame=None):
+        self.serial_port = serial_port
+        self.log = log
+        self.on_unsolicited_frame = on_unsolicited_frame or self._log_unsolicited_frame
+        self.framer = ResponseFramer()
+        self.unsolicited_frames = 0
+        self.frame_started_at = None  # 組み立て中のフレームの最初のバイトを受信した時刻
+        self.pending = []
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def expect(self, pending):
+        """応答待ちを登録する. 応答の取りこぼしを防ぐため送信より前に呼ぶ.
+
+        pendingはexpected_cmnd属性 (Noneなら任意のフレーム) と set(frame, bcc_ok, first_byte_at, received_at) を持つ.
+        時刻はtime.perf_counterの値で、first_byte_atはフレームの先頭バイトを含む受信の時刻.
+        """
+        with self.lock:
+            self.pending.append(pending)
+        return pending
+
+    def cancel(self, pending):
+        with self.lock:
+            if pending in self.pending:
+                self.pending.remove(pending)
+
+    def _run(self):
+        while self.running:
+            try:
+                # readは1バイトでも届けば即座に返り、無受信時もREAD_TIMEOUTで戻る
+                chunk = self.serial_port.read(max(1, self.serial_port.in_waiting))
+            except serial.SerialException as e:
+                if self.running:
+                    self.log(f"エラー: シリアル受信失敗: {e}\n")
+                break
+            if not chunk:
+                continue
+
+            received_at = time.perf_counter()
+            started_at = self.frame_started_at if self.framer.buffer else received_at
+            discarded_before = self.framer.discarded_bytes
+            for frame, bcc_ok in self.framer.feed(chunk):
+                self._dispatch(frame, bcc_ok, started_at or received_at, received_at)
+                started_at = received_at
+            self.frame_started_at = started_at if self.framer.buffer else None
+            discarded = self.framer.discarded_bytes - discarded_before
+            if discarded:
+                self.log(f"警告: フレーム外のデータを {discarded} バイト破棄しました。\n")
+
+    def _dispatch(self, frame, bcc_ok, first_byte_at, received_at):
+        with self.lock:
+            # CMNDが一致する待ちを優先し、なければ任意フレーム待ちに渡す
+            target = next((p for p in self.pending if p.expected_cmnd == frame[1]), None)
+            if target is None:
+                target = next((p for p in self.pending if p.expected_cmnd is None), None)
+            if target is not None:
+                self.pending.remove(target)
+        if target is None:
+            self.unsolicited_frames += 1
+            self.on_unsolicited_frame(frame, bcc_ok)
+            return
+        target.set(frame, bcc_ok, first_byte_at, received_at)
+
+    def _log_unsolicited_frame(self, frame, bcc_ok):
+        verdict = "OK" if bcc_ok else "エラー"
+        self.log(f"警告: 予期せぬフレームを受信しました (BCC: {verdict}): {format_hex(frame)}\n")
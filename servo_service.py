@@ -0,0 +1,98 @@
+import concurrent.futures
+import time
+
+from servo_client import ServoClient, ServoClientRunner, ServoCommandError, ServoCommandSuperseded
+from servo_protocol import TILT_MODE_DATA, angle_to_sign_mode, format_hex, tilt_status_text
+from servo_status import ServoStatusPoller
+
+
+class ServoService:
+    """サーボ機器のポートを専有する1つの実行器で、複数の利用者 (Socket.IOのクライアントなど) の要求を処理する.
+
+    要求は {"command": "init" | "tilt" | "tilt_to", "mode": "stop/up/down", "angle": 符号付き角度} の辞書で受け取り、
+    結果 (状態と往復時間) を辞書で返す. eventletの下ではServoClientRunnerのスレッドもグリーンスレッドになるため、
+    handleはSocket.IOのハンドラから直接呼んでよい.
+    """
+
+    def __init__(self, port, baudrate=19200, poll_interval=0.5, log=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.poll_interval = poll_interval
+        self.log = log or (lambda message: None)
+        self.runner = None
+        self.poller = None
+        self._state_callbacks = []
+
+    @property
+    def is_running(self):
+        return self.runner is not None
+
+    def start(self):
+        client = ServoClient(self.port, self.baudrate, log=self.log)
+        runner = ServoClientRunner(client)
+        runner.start()
+        self.poller = ServoStatusPoller(client, self.poll_interval)
+        for callback in self._state_callbacks:
+            self.poller.subscribe(callback)
+        runner.submit(self.poller.run())
+        self.runner = runner
+
+    def stop(self):
+        if self.runner:
+            self.runner.stop()
+            self.runner = None
+
+    def subscribe_state(self, callback):
+        """チルト状態が変わるたびにcallback(ServoState)を呼ぶ. startより前に登録する."""
+        self._state_callbacks.append(callback)
+
+    def state(self):
+        """キャッシュしているチルト状態 (ポートにはアクセスしない)."""
+        if not self.poller:
+            return None
+        return self.poller.state.snapshot()
+
+    def handle(self, message, timeout=5.0):
+        """1つの要求を実行し、応答 (ack) の辞書を返す. 例外は送出せず、失敗はokとerrorで表す."""
+        command = message.get("command") if isinstance(message, dict) else None
+        ack = {"command": command, "ok": False}
+        if not self.runner:
+            ack["error"] = "サーボ機器が接続されていません。"
+            return ack
+        try:
+            make_coro = self._make_request(command, message)
+        except (TypeError, ValueError) as e:
+            ack["error"] = str(e)
+            return ack
+
+        started = time.perf_counter()
+        try:
+            result = self.runner.call(make_coro(self.runner.client), timeout)
+        except ServoCommandSuperseded as e:
+            ack.update(error=str(e), superseded=True)
+        except (ServoCommandError, ValueError) as e:
+            ack["error"] = str(e)
+        except concurrent.futures.TimeoutError:
+            ack["error"] = f"{timeout} 秒以内に応答がありませんでした。"
+        else:
+            ack["ok"] = True
+            if command == "init":
+                ack["response"] = format_hex(result)
+            else:
+                ack.update(status=result, status_text=tilt_status_text(result))
+        ack["rtt_ms"] = (time.perf_counter() - started) * 1000
+        return ack
+
+    @staticmethod
+    def _make_request(command, message):
+        if command == "init":
+            return lambda client: client.init()
+        if command == "tilt":
+            mode = message.get("mode")
+            if mode not in TILT_MODE_DATA:
+                raise ValueError(f"不正なチルトモードです: {mode}")
+            return lambda client: client.tilt(mode)
+        if command == "tilt_to":
+            sign_mode, magnitude = angle_to_sign_mode(float(message.get("angle")))
+            return lambda client: client.tilt_to(magnitude, sign_mode)
+        raise ValueError(f"不明なコマンドです: {command}")
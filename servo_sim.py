@@ -0,0 +1,243 @@
+import argparse
+import os
+import pty
+import random
+import select
+import termios
+import threading
+import time
+
+from servo_protocol import (
+    INIT_CMND, INIT_DATA, MAX_TILT_ANGLE, TILT_ANGLE_CMND, TILT_ANGLE_SIGN_MINUS, TILT_CONTROL_CMND,
+    TILT_STATUS_DOWN, TILT_STATUS_LOWER_LIMIT, TILT_STATUS_STOP, TILT_STATUS_UP, TILT_STATUS_UPPER_LIMIT,
+    ResponseFramer, build_frame, format_hex, tilt_status_text,
+)
+
+# 19200bps, 8ビット, 偶数パリティ, ストップ1ビットでの1バイトあたりのビット数
+BITS_PER_BYTE = 11
+
+
+class VirtualServoDevice:
+    """Linuxの擬似端末 (pty) 上で動くサーボ機器のシミュレータ.
+
+    portに表示されるパスをServoClientやGUIのシリアルポートとして開く.
+    CMND 4Eh/43h/44h に応答し、チルトの移動時間と上限界/下限界の状態を模擬する.
+    latency (秒), jitter (秒), drop_rate (応答1バイトごとの欠落確率), bcc_error_rate (応答ごとのBCC破損確率)
+    で遅延や通信エラーを注入できる.
+    """
+
+    def __init__(self, speed=5.0, upper_limit=MAX_TILT_ANGLE, lower_limit=-MAX_TILT_ANGLE, latency=0.0,
+                 jitter=0.0, drop_rate=0.0, bcc_error_rate=0.0, baudrate=19200, wire_delay=True, seed=None,
+                 log=None):
+        self.speed = speed  # チルト速度 (度/秒)
+        self.upper_limit = upper_limit
+        self.lower_limit = lower_limit
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.bcc_error_rate = bcc_error_rate
+        self.baudrate = baudrate
+        self.wire_delay = wire_delay
+        self.random = random.Random(seed)
+        self.log = log or (lambda message: None)
+
+        self.angle = 0.0
+        self.target = None  # 角度指定チルトの目標角度 (Noneなら連続移動または停止)
+        self.direction = 0  # +1: 上, -1: 下, 0: 停止
+        self.updated_at = time.monotonic()
+
+        self.stats = {"received": 0, "bad_bcc": 0, "unknown": 0, "replied": 0, "dropped_bytes": 0,
+                      "corrupted": 0}
+        self.master_fd = None
+        self.port = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self._pristine_attrs = None
+
+    def start(self):
+        self.master_fd, slave_fd = pty.openpty()
+        self.port = os.ttyname(slave_fd)
+        self._pristine_attrs = termios.tcgetattr(slave_fd)
+        # スレーブ側はクライアントが開くため閉じておく (切断をPOLLHUPで検知できるようにする)
+        os.close(slave_fd)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self, timeout=1):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self.master_fd, select.POLLIN)
+        framer = ResponseFramer()
+        connected = False
+        while self.running:
+            events = poller.poll(50)
+            if not events:
+                continue
+            if events[0][1] & select.POLLHUP:
+                # クライアントが閉じた
+                if connected:
+                    self._reset_line_settings()
+                    framer.reset()
+                    connected = False
+                time.sleep(0.05)
+                continue
+            connected = True
+            try:
+                data = os.read(self.master_fd, 256)
+            except OSError:
+                continue
+            for frame, bcc_ok in framer.feed(data):
+                self._handle_frame(frame, bcc_ok)
+
+    def _reset_line_settings(self):
+        """スレーブ側の端末設定を初期状態に戻す.
+
+        ptyはパリティ設定を保持しないため、前回と同じ設定 (偶数パリティ) で開き直すと
+        tcsetattrがパリティの変更だけを要求して失敗する. 切断のたびに初期状態へ戻して回避する.
+        """
+        try:
+            fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        except OSError:
+            return
+        try:
+            termios.tcsetattr(fd, termios.TCSANOW, self._pristine_attrs)
+        except termios.error:
+            pass
+        finally:
+            os.close(fd)
+
+    def _handle_frame(self, frame, bcc_ok):
+        self.stats["received"] += 1
+        if not bcc_ok:
+            self.stats["bad_bcc"] += 1
+            self.log(f"BCCエラーのコマンドを無視しました: {format_hex(frame)}\n")
+            return
+        cmnd, data = frame[1], list(frame[2:-2])
+        if cmnd == INIT_CMND:
+            reply = build_frame(INIT_CMND, INIT_DATA)
+        elif cmnd == TILT_CONTROL_CMND and data:
+            reply = build_frame(TILT_CONTROL_CMND, [self.command_tilt(data[0])] + [0x30] * 5)
+        elif cmnd == TILT_ANGLE_CMND and len(data) >= 4:
+            reply = build_frame(TILT_CONTROL_CMND, [self.command_tilt_to(data)] + [0x30] * 5)
+        else:
+            self.stats["unknown"] += 1
+            self.log(f"未対応のコマンドを無視しました: {format_hex(frame)}\n")
+            return
+        self._send_reply(reply)
+
+    def _send_reply(self, reply):
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if self.random.random() < self.bcc_error_rate:
+            reply = reply[:-1] + bytes([reply[-1] ^ 0xFF])
+            self.stats["corrupted"] += 1
+        if self.drop_rate:
+            kept = bytes(b for b in reply if self.random.random() >= self.drop_rate)
+            self.stats["dropped_bytes"] += len(reply) - len(kept)
+            reply = kept
+        if self.wire_delay:
+            delay += len(reply) * BITS_PER_BYTE / self.baudrate
+        if delay > 0:
+            time.sleep(delay)
+        os.write(self.master_fd, reply)
+        self.stats["replied"] += 1
+
+    def command_tilt(self, mode_byte):
+        """チルト制御 (43h) を適用し、応答するチルト状態を返す."""
+        with self.lock:
+            self._advance()
+            self.target = None
+            self.direction = {TILT_STATUS_UP: 1, TILT_STATUS_DOWN: -1}.get(mode_byte, 0)
+            return self._status()
+
+    def command_tilt_to(self, data):
+        """角度指定チルト (44h) を適用し、応答するチルト状態を返す."""
+        magnitude = int(bytes(data[1:4]).decode("ascii")) / 10
+        target = -magnitude if data[0] == TILT_ANGLE_SIGN_MINUS else magnitude
+        with self.lock:
+            self._advance()
+            self.target = min(self.upper_limit, max(self.lower_limit, target))
+            self.direction = (self.target > self.angle) - (self.target < self.angle)
+            if self.direction == 0:
+                self.target = None
+            return self._status()
+
+    def status(self):
+        """現在の (角度, チルト状態バイト) を返す."""
+        with self.lock:
+            self._advance()
+            return self.angle, self._status()
+
+    def _advance(self):
+        """前回の更新から経過した時間だけチルトを動かす."""
+        now = time.monotonic()
+        step = self.speed * (now - self.updated_at)
+        self.updated_at = now
+        if self.direction == 0:
+            return
+        angle = self.angle + self.direction * step
+        if self.target is not None and (angle - self.target) * self.direction >= 0:
+            angle = self.target
+            self.target = None
+            self.direction = 0
+        if angle >= self.upper_limit or angle <= self.lower_limit:
+            angle = min(self.upper_limit, max(self.lower_limit, angle))
+            self.target = None
+            self.direction = 0
+        self.angle = angle
+
+    def _status(self):
+        # 限界位置でも、そこから離れる向きに動き出した場合は移動方向を返す
+        if self.angle >= self.upper_limit and self.direction >= 0:
+            return TILT_STATUS_UPPER_LIMIT
+        if self.angle <= self.lower_limit and self.direction <= 0:
+            return TILT_STATUS_LOWER_LIMIT
+        return {1: TILT_STATUS_UP, -1: TILT_STATUS_DOWN}.get(self.direction, TILT_STATUS_STOP)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="擬似端末上で仮想サーボ機器を起動する (Linux専用).")
+    parser.add_argument("--speed", type=float, default=5.0, help="チルト速度 (度/秒)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="応答までの遅延 (ミリ秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="遅延に加える揺らぎの最大値 (ミリ秒)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="応答1バイトごとの欠落確率")
+    parser.add_argument("--bcc-error-rate", type=float, default=0.0, help="応答ごとのBCC破損確率")
+    parser.add_argument("--no-wire-delay", action="store_true", help="19200bpsの伝送時間を模擬しない")
+    parser.add_argument("--seed", type=int, help="乱数の種")
+    parser.add_argument("--verbose", action="store_true", help="無視したコマンドを表示する")
+    args = parser.parse_args(argv)
+
+    device = VirtualServoDevice(
+        speed=args.speed, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        drop_rate=args.drop_rate, bcc_error_rate=args.bcc_error_rate, wire_delay=not args.no_wire_delay,
+        seed=args.seed, log=(lambda message: print(message, end="")) if args.verbose else None)
+    with device:
+        print(f"仮想サーボ機器を起動しました: {device.port} (Ctrl+Cで終了)")
+        try:
+            while True:
+                time.sleep(1)
+                angle, status = device.status()
+                print(f"角度 {angle:+6.2f}, 状態 {tilt_status_text(status)}, 統計 {device.stats}", flush=True)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from servo_client import ServoCommandError, ServoCommandSuperseded
+from servo_protocol import tilt_status_text
+
+
+class ServoState:
+    """最後に分かったチルト状態. 読み出しはバスへアクセスしない."""
+
+    def __init__(self):
+        self.status = None  # チルト状態バイト (未取得ならNone)
+        self.updated_at = None  # 最後に状態を受信した時刻 (time.time)
+        self.changed_at = None  # 状態が最後に変わった時刻 (time.time)
+        self.updated_monotonic = None
+        self.stale = True  # 一定時間状態を受信できていない
+        self.error = None  # 最後のポーリングの失敗内容
+
+    @property
+    def text(self):
+        return tilt_status_text(self.status) if self.status is not None else "不明"
+
+    def age(self):
+        """最後に状態を受信してからの経過秒数."""
+        if self.updated_monotonic is None:
+            return None
+        return time.monotonic() - self.updated_monotonic
+
+    def snapshot(self):
+        return {
+            "status": self.status,
+            "text": self.text,
+            "updated_at": self.updated_at,
+            "changed_at": self.changed_at,
+            "stale": self.stale,
+            "error": self.error,
+        }
+
+
+class ServoStatusPoller:
+    """チルト状態を一定周期で問い合わせ、ServoStateに保持して変化を購読者へ知らせる.
+
+    プロトコルに状態を読むだけのコマンドが無いため、ServoClient.last_tilt_command (最後に成功した停止か角度指定) を
+    送り直して応答の状態を得る. 連続の上/下は送り直すと停止後に再び動かすので問い合わせず、
+    request_tilt以外で送ったコマンド (汎用コマンドの43hや初期化) の後も問い合わせない.
+    そのため連続の上/下で動いている間は状態が動作中のまま更新されず、上限界 (38h)・下限界 (39h) に着いても
+    次に停止か角度指定を送るまで分からない.
+    他のコマンドが送信中・送信待ちの周期は問い合わせを省き、それらの応答で状態を更新する.
+    問い合わせはServoClient.poll_metricsに数え、操作のコマンドの計測 (metrics) には混ぜない.
+    """
+
+    def __init__(self, client, interval=0.5, stale_after=None):
+        self.client = client
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else interval * 3
+        self.state = ServoState()
+        self.subscribers = []
+        self.polls = 0
+
+    def subscribe(self, callback):
+        """状態が変わるたびにcallback(state)を呼ぶ (イベントループのスレッドから). 解除する関数を返す."""
+        self.subscribers.append(callback)
+        return lambda: self.subscribers.remove(callback)
+
+    async def run(self):
+        """タスクを取り消すまでポーリングを続ける."""
+        self.client.status_listeners.append(self._on_status)
+        try:
+            next_poll = time.monotonic()
+            while True:
+                next_poll += self.interval
+                await self._poll_once()
+                self._check_stale()
+                now = time.monotonic()
+                if next_poll < now:
+                    next_poll = now  # 遅れた周期は詰めて送らない
+                await asyncio.sleep(next_poll - now)
+        finally:
+            self.client.status_listeners.remove(self._on_status)
+
+    async def _poll_once(self):
+        command = self.client.last_tilt_command
+        if command is None or not self.client.is_idle:
+            return
+        self.polls += 1
+        try:
+            await self.client.request_tilt(*command, max_retries=1, quiet=True, poll=True)
+        except ServoCommandSuperseded:
+            pass  # 問い合わせ中に新しいチルト指令が来た. 状態はその応答で更新される
+        except ServoCommandError as e:
+            if self.state.error != str(e):
+                self.state.error = str(e)
+                self._notify()
+
+    def _on_status(self, status):
+        state = self.state
+        now = time.time()
+        changed = status != state.status or state.stale or state.error is not None
+        if status != state.status:
+            state.changed_at = now
+        state.status = status
+        state.updated_at = now
+        state.updated_monotonic = time.monotonic()
+        state.stale = False
+        state.error = None
+        if changed:
+            self._notify()
+
+    def _check_stale(self):
+        age = self.state.age()
+        if not self.state.stale and age is not None and age > self.stale_after:
+            self.state.stale = True
+            self._notify()
+
+    def _notify(self):
+        for callback in list(self.subscribers):
+            callback(self.state)
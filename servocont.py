@@ -1,46 +1,44 @@
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, filedialog
+from tkinter import scrolledtext, messagebox, filedialog, ttk
 import serial
 import serial.tools.list_ports
 import threading
 import time
-import queue
+
+from log_view import LogBuffer
+from servo_client import ServoClient, ServoClientRunner, ServoCommandError, format_link_stats
+from servo_profile import MotionProfilePlayer, load_profile_csv
+from servo_protocol import convert_angle_to_bytes, tilt_status_text
+from servo_status import ServoStatusPoller
 
 class ServoControllerGUI:
     # --- 定数 ---
     MAX_LOG_LINES = 1000  # ログの最大行数
-
-    # 初期化コマンド
-    INIT_CMND = 0x4E
-    INIT_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
-
-    # チルト制御コマンド
-    TILT_CONTROL_CMND = 0x43
-    TILT_STOP_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
-    TILT_UP_DATA = [0x31, 0x30, 0x30, 0x30, 0x30, 0x30]
-    TILT_DOWN_DATA = [0x32, 0x30, 0x30, 0x30, 0x30, 0x30]
-
-    # 角度指定チルト制御コマンド
-    TILT_ANGLE_CMND = 0x44
-    TILT_ANGLE_SIGN_MINUS = 0x32
-    TILT_ANGLE_SIGN_NONE = 0x33
-    TILT_ANGLE_SIGN_PLUS = 0x34
-
-    # レスポンスにおけるチルト状態 (CMND 43h のDATA 1バイト目)
-    TILT_STATUS_STOP = 0x30
-    TILT_STATUS_UP = 0x31
-    TILT_STATUS_DOWN = 0x32
-    TILT_STATUS_UPPER_LIMIT = 0x38
-    TILT_STATUS_LOWER_LIMIT = 0x39
+    LOG_FLUSH_INTERVAL_MS = 50  # ログを画面へ反映する最短間隔
+    STATUS_POLL_INTERVAL = 0.5  # チルト状態の問い合わせ周期 (秒)
+    METRICS_REFRESH_INTERVAL = 0.5  # 通信統計パネルを更新する最短間隔 (秒)
+    METRICS_COLUMNS = (
+        ("cmnd", "CMND", 50), ("requests", "要求", 50), ("ok", "成功", 50), ("retries", "再送", 50),
+        ("timeouts", "タイムアウト", 80), ("bcc_errors", "BCCエラー", 70), ("mismatches", "不一致", 50),
+        ("failures", "失敗", 50), ("first_byte", "1バイト目 p50/p99", 120), ("frame", "応答 p50/p99/最大", 140),
+    )
 
     def __init__(self, master):
         self.master = master
         master.title("サーボ制御ソフトウェア")
 
-        self.serial_port = None
-        self.serial_thread = None
-        self.running = False
-        self.response_queue = queue.Queue()
+        self.servo = None  # ServoClientRunner (接続中のみ)
+        self.status_poller = None
+        self.metrics = None  # 最後に接続したクライアントの計測値 (切断後もエクスポートできるよう保持)
+        self.metrics_refreshed_at = 0.0
+        self.metrics_refresh_scheduled = False
+        self.profile = None
+        self.profile_task = None
+        # ログはリングバッファに溜め、通知を受けたときにまとめて画面へ反映する
+        self.ui_wakeup = threading.Event()
+        self.log_buffer = LogBuffer(self.MAX_LOG_LINES, on_pending=self.ui_wakeup.set)
+        self.log_line_count = 0
+        self.log_flush_scheduled = False
 
         # --- GUI要素の配置 ---
         # シリアルポート設定フレーム
@@ -70,6 +68,11 @@ class ServoControllerGUI:
         self.rescan_button = tk.Button(self.port_frame, text="ポート再スキャン", command=self.rescan_ports)
         self.rescan_button.grid(row=0, column=3, padx=5, pady=2)
 
+        # 通信統計 (応答時間の推定値と再送回数)
+        self.link_stats_var = tk.StringVar(value="")
+        tk.Label(self.port_frame, textvariable=self.link_stats_var, anchor="w").grid(
+            row=2, column=0, columnspan=4, padx=5, pady=2, sticky="w")
+
         # コマンド送信フレーム (汎用)
         self.command_frame = tk.LabelFrame(master, text="汎用コマンド送信", padx=10, pady=10)
         self.command_frame.pack(padx=10, pady=5, fill=tk.X)
@@ -106,6 +109,10 @@ class ServoControllerGUI:
         self.send_tilt_button = tk.Button(self.tilt_control_frame, text="チルトコマンド送信", command=self.send_tilt_control_command, state=tk.DISABLED)
         self.send_tilt_button.grid(row=0, column=3, padx=5, pady=2)
 
+        self.servo_state_var = tk.StringVar(master, value="現在の状態: 不明")
+        tk.Label(self.tilt_control_frame, textvariable=self.servo_state_var, state=tk.DISABLED).grid(
+            row=1, column=0, columnspan=4, padx=5, pady=2, sticky="w")
+
         # 角度指定チルト制御フレーム
         self.tilt_angle_frame = tk.LabelFrame(master, text="角度指定チルト制御 (CMND 44h)", padx=10, pady=10)
         self.tilt_angle_frame.pack(padx=10, pady=5, fill=tk.X)
@@ -125,6 +132,34 @@ class ServoControllerGUI:
         self.send_angle_tilt_button = tk.Button(self.tilt_angle_frame, text="角度指定チルト送信", command=self.send_angle_tilt_command, state=tk.DISABLED)
         self.send_angle_tilt_button.grid(row=1, column=4, padx=5, pady=2)
 
+        # モーションプロファイル再生フレーム
+        self.profile_frame = tk.LabelFrame(master, text="モーションプロファイル再生 (CMND 44h)", padx=10, pady=10)
+        self.profile_frame.pack(padx=10, pady=5, fill=tk.X)
+
+        self.profile_label_var = tk.StringVar(master, value="プロファイル未読込")
+        tk.Label(self.profile_frame, textvariable=self.profile_label_var).grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        self.load_profile_button = tk.Button(self.profile_frame, text="CSV読込", command=self.load_profile)
+        self.load_profile_button.grid(row=0, column=1, padx=5, pady=2)
+        self.play_profile_button = tk.Button(self.profile_frame, text="再生", command=self.play_profile, state=tk.DISABLED)
+        self.play_profile_button.grid(row=0, column=2, padx=5, pady=2)
+        self.stop_profile_button = tk.Button(self.profile_frame, text="停止", command=self.stop_profile, state=tk.DISABLED)
+        self.stop_profile_button.grid(row=0, column=3, padx=5, pady=2)
+
+        # 通信統計フレーム (コマンドごとの計数と遅延)
+        self.metrics_frame = tk.LabelFrame(master, text="通信統計", padx=10, pady=5)
+        self.metrics_frame.pack(padx=10, pady=5, fill=tk.X)
+
+        self.metrics_tree = ttk.Treeview(self.metrics_frame, columns=[c[0] for c in self.METRICS_COLUMNS],
+                                         show="headings", height=4)
+        for key, title, width in self.METRICS_COLUMNS:
+            self.metrics_tree.heading(key, text=title)
+            self.metrics_tree.column(key, width=width, anchor="e", stretch=False)
+        self.metrics_tree.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.metrics_summary_var = tk.StringVar(master, value="")
+        tk.Label(self.metrics_frame, textvariable=self.metrics_summary_var).grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        self.export_metrics_button = tk.Button(self.metrics_frame, text="CSVエクスポート", command=self.export_metrics)
+        self.export_metrics_button.grid(row=1, column=1, padx=5, pady=2, sticky="e")
+
         # レスポンス表示エリア
         self.response_frame = tk.LabelFrame(master, text="通信ログとレスポンス", padx=10, pady=10)
         self.response_frame.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
@@ -136,8 +171,9 @@ class ServoControllerGUI:
         self.save_log_button.pack(pady=5)
         
         master.protocol("WM_DELETE_WINDOW", self.on_closing)
-        
-        self.master.after(100, self.process_queue)
+
+        master.bind("<<UiWakeup>>", self._schedule_log_flush)
+        threading.Thread(target=self._ui_notifier_thread, daemon=True).start()
         self._update_tilt_button_states()
 
     def get_available_ports(self):
@@ -165,7 +201,7 @@ class ServoControllerGUI:
         
     def _update_tilt_button_states(self):
         """チルト関連ボタンの有効/無効状態を更新するヘルパー関数."""
-        state = tk.NORMAL if self.serial_port and self.serial_port.is_open else tk.DISABLED
+        state = tk.NORMAL if self.servo else tk.DISABLED
         
         for child in self.tilt_control_frame.winfo_children():
             child.config(state=state)
@@ -173,6 +209,15 @@ class ServoControllerGUI:
         for child in self.tilt_angle_frame.winfo_children():
             child.config(state=state)
 
+        self._update_profile_button_states()
+
+    def _update_profile_button_states(self):
+        """モーションプロファイルの再生/停止ボタンの状態を更新する."""
+        playing = self._is_profile_playing()
+        self.play_profile_button.config(state=tk.NORMAL if self.servo and self.profile and not playing else tk.DISABLED)
+        self.stop_profile_button.config(state=tk.NORMAL if playing else tk.DISABLED)
+        self.load_profile_button.config(state=tk.DISABLED if playing else tk.NORMAL)
+
     def connect_serial(self):
         port = self.port_var.get()
         try:
@@ -186,18 +231,16 @@ class ServoControllerGUI:
             return
 
         try:
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_EVEN,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=0.5
-            )
+            client = ServoClient(port, baudrate, log=self.log_buffer.append)
+            servo = ServoClientRunner(client)
+            servo.start()
+            self.servo = servo
+            # チルト状態は問い合わせ結果をキャッシュし、変化したときだけ画面を更新する
+            self.status_poller = ServoStatusPoller(client, self.STATUS_POLL_INTERVAL)
+            self.status_poller.subscribe(lambda state: self.ui_wakeup.set())
+            self.metrics = client.metrics
+            servo.submit(self.status_poller.run())
             self.log_message(f"{port} に接続しました。\n")
-            self.running = True
-            self.serial_thread = threading.Thread(target=self._serial_reader_thread, daemon=True)
-            self.serial_thread.start()
 
             self.connect_button.config(state=tk.DISABLED)
             self.disconnect_button.config(state=tk.NORMAL)
@@ -214,16 +257,16 @@ class ServoControllerGUI:
     def disconnect_serial(self):
         """シリアルポートを切断する."""
         try:
-            if self.serial_port and self.serial_port.is_open:
+            # 実行中のコマンドとプロファイル再生を取り消してからポートを閉じる
+            if self.servo:
                 self.log_message(f"シリアルポートを切断します...\n")
-                self.serial_port.close()
+                self.servo.stop()
         except Exception as e:
             self.log_message(f"切断中にエラーが発生しました: {e}\n")
         finally:
-            self.running = False
-            if self.serial_thread and self.serial_thread.is_alive():
-                self.serial_thread.join(timeout=1)
-
+            self.servo = None
+            self.status_poller = None
+            self.servo_state_var.set("現在の状態: 不明")
             self.log_message("シリアルポートを切断しました。\n")
             
             self.connect_button.config(state=tk.NORMAL)
@@ -234,97 +277,26 @@ class ServoControllerGUI:
             self.port_menu.config(state=tk.NORMAL)
             self.baudrate_entry.config(state=tk.NORMAL)
 
-    def calculate_bcc(self, data_bytes):
-        bcc = 0
-        for b in data_bytes:
-            bcc ^= b
-        return bcc
-
-    def send_command_internal(self, cmnd_byte, data_bytes_list):
-        if not self.serial_port or not self.serial_port.is_open:
-            self.response_queue.put("エラー: シリアルポートが接続されていません。\n")
-            return False
-
-        stx = 0x02
-        ext = 0x03
-        data_part = bytes(data_bytes_list)
-        bcc_calc_data = bytes([stx, cmnd_byte]) + data_part + bytes([ext])
-        bcc = self.calculate_bcc(bcc_calc_data)
-        command_frame = bytes([stx, cmnd_byte]) + data_part + bytes([ext, bcc])
-
-        self.response_queue.put(f"送信データ (HEX): {' '.join(f'{b:02X}' for b in command_frame)}\n")
-
-        try:
-            self.serial_port.write(command_frame)
-            return True
-        except serial.SerialException as e:
-            self.response_queue.put(f"エラー: コマンド送信失敗: {e}\n")
-            return False
-
-    def receive_response_internal(self):
-        start_time = time.time()
-        response_data = b''
-        while self.running and (time.time() - start_time) * 1000 < 100: 
-            if self.serial_port.in_waiting > 0:
-                response_data += self.serial_port.read(self.serial_port.in_waiting)
-            time.sleep(0.001)
-
-        if response_data:
-            self.response_queue.put(f"受信データ (HEX): {' '.join(f'{b:02X}' for b in response_data)}\n")
-            
-            if len(response_data) >= 4:
-                received_bcc = response_data[-1]
-                calculated_bcc_resp = self.calculate_bcc(response_data[:-1]) 
-                
-                if received_bcc == calculated_bcc_resp:
-                    self.response_queue.put("BCCチェック: OK\n")
-                    return response_data
-                else:
-                    self.response_queue.put(f"BCCチェック: エラー (受信: {received_bcc:02X}, 計算: {calculated_bcc_resp:02X})\n")
-                    return None
-            else:
-                self.response_queue.put("レスポンスデータが短すぎます。\n")
-                return None
-        else:
-            self.response_queue.put("レスポンスがありませんでした。\n")
+    def _run_command(self, make_coro, on_success=None):
+        """クライアントを受け取ってコルーチンを返す関数を、クライアントのイベントループで実行する."""
+        if not self.servo:
+            self.log_buffer.append("エラー: シリアルポートが接続されていません。\n")
             return None
+        future = self.servo.submit(make_coro(self.servo.client))
+        future.add_done_callback(lambda f: self._on_command_done(f, on_success))
+        return future
 
-    def _serial_reader_thread(self):
-        while self.running:
-            if self.serial_port and self.serial_port.is_open and self.serial_port.in_waiting > 0:
-                unexpected_data = self.serial_port.read(self.serial_port.in_waiting)
-                self.response_queue.put(f"警告: 予期せぬデータを受信しました: {' '.join(f'{b:02X}' for b in unexpected_data)}\n")
-            time.sleep(0.05)
-
-    def _command_sender_with_retry(self, cmnd_byte, data_bytes_list, callback_on_success=None):
-        max_retries = 3
-        command_successful = False
-        for attempt in range(max_retries):
-            self.response_queue.put(f"コマンド送信試行: {attempt + 1}/{max_retries}\n")
-            
-            if self.send_command_internal(cmnd_byte, data_bytes_list):
-                response = self.receive_response_internal()
-                if response:
-                    if callback_on_success:
-                        if callback_on_success(response):
-                            command_successful = True
-                            break
-                        else:
-                            self.response_queue.put("レスポンス内容が期待値と異なります。リトライします。\n")
-                    else:
-                        command_successful = True
-                        self.response_queue.put(f"コマンド成功！ レスポンス: {response.hex()}\n\n")
-                        break
-                else:
-                    self.response_queue.put("レスポンス受信失敗、またはBCCエラー。リトライします。\n")
-            else:
-                self.response_queue.put("コマンド送信失敗。リトライします。\n")
-            
-            if attempt < max_retries - 1:
-                time.sleep(0.2)
-
-        if not command_successful:
-            self.response_queue.put("コマンド送信に失敗しました (リトライ回数超過)。\n\n")
+    def _on_command_done(self, future, on_success):
+        # イベントループのスレッドから呼ばれるため、GUIへはキュー経由で伝える
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            if on_success:
+                on_success(future.result())
+        elif not isinstance(error, ServoCommandError):
+            # リトライ回数超過はクライアントがログ済み
+            self.log_buffer.append(f"エラー: コマンド処理中に例外が発生しました: {error}\n")
 
     def send_command_from_gui(self):
         cmnd_hex_str = self.cmnd_entry.get().strip()
@@ -344,91 +316,30 @@ class ServoControllerGUI:
         except ValueError:
             messagebox.showerror("入力エラー", "DATAは16進数(例:3031)で入力してください。")
             return
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes_list, None)
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
+        self._run_command(lambda client: client.request(cmnd_byte, data_bytes_list, any_response=True))
 
     def send_init_command(self):
         self.log_message("初期化コマンドを送信します...\n")
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(self.INIT_CMND, self.INIT_DATA, self.check_init_response)
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
+        self._run_command(lambda client: client.init(), self.log_init_response)
 
-    def check_init_response(self, response_bytes):
-        if response_bytes is None:
-            self.response_queue.put("初期化コマンド レスポンス: 不明 (BCCエラーまたはタイムアウト)\n")
-            return False
-        expected_full_length = 10 
-        if len(response_bytes) != expected_full_length:
-            self.response_queue.put(f"初期化コマンド レスポンス: フォーマットが期待値と異なります。期待 {expected_full_length}バイト, 実際 {len(response_bytes)}バイト\n")
-            return False
-        response_cmnd = response_bytes[1]
-        response_data = list(response_bytes[2:-2])
-        expected_cmnd = self.INIT_CMND
-        expected_data = self.INIT_DATA
-        is_cmnd_match = (response_cmnd == expected_cmnd)
-        is_data_match = (response_data == expected_data)
-        if is_cmnd_match and is_data_match:
-            self.response_queue.put("初期化コマンド レスポンス: OK (期待値と一致)\n")
-            return True
-        else:
-            self.response_queue.put(f"初期化コマンド レスポンス: 不一致！\n")
-            self.response_queue.put(f"  期待CMND: {expected_cmnd:02X}, 実際CMND: {response_cmnd:02X}\n")
-            self.response_queue.put(f"  期待DATA: {' '.join(f'{b:02X}' for b in expected_data)}, 実際DATA: {' '.join(f'{b:02X}' for b in response_data)}\n")
-            return False
+    def log_init_response(self, response_bytes):
+        self.log_buffer.append("初期化コマンド レスポンス: OK (期待値と一致)\n")
 
     def send_tilt_control_command(self):
         mode = self.tilt_mode_var.get()
-        cmnd_byte = self.TILT_CONTROL_CMND
-        data_bytes = []
         if mode == "stop":
-            data_bytes = self.TILT_STOP_DATA
             self.log_message("チルト停止コマンドを送信します...\n")
         elif mode == "up":
-            data_bytes = self.TILT_UP_DATA
             self.log_message("チルト上コマンドを送信します...\n")
         elif mode == "down":
-            data_bytes = self.TILT_DOWN_DATA
             self.log_message("チルト下コマンドを送信します...\n")
         else:
             messagebox.showerror("エラー", "不正なチルトモードが選択されました。")
             return
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes, self.check_tilt_control_response)
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
+        self._run_command(lambda client: client.tilt(mode), self.log_tilt_control_response)
 
-    def check_tilt_control_response(self, response_bytes):
-        if response_bytes is None:
-            self.response_queue.put("チルト制御 レスポンス: 不明 (BCCエラーまたはタイムアウト)\n")
-            return False
-        expected_full_length = 10
-        if len(response_bytes) != expected_full_length:
-            self.response_queue.put(f"チルト制御 レスポンス: フォーマットが期待値と異なります。期待 {expected_full_length}バイト, 実際 {len(response_bytes)}バイト\n")
-            return False
-        response_cmnd = response_bytes[1]
-        response_status_byte = response_bytes[2]
-        if response_cmnd != self.TILT_CONTROL_CMND:
-            self.response_queue.put(f"チルト制御 レスポンス: CMNDが不一致！ 期待 {self.TILT_CONTROL_CMND:02X}, 実際 {response_cmnd:02X}\n")
-            return False
-        status_map = {
-            self.TILT_STATUS_STOP: "停止",
-            self.TILT_STATUS_UP: "上",
-            self.TILT_STATUS_DOWN: "下",
-            self.TILT_STATUS_UPPER_LIMIT: "上限界",
-            self.TILT_STATUS_LOWER_LIMIT: "下限界"
-        }
-        status_text = status_map.get(response_status_byte, f"不明な状態 ({response_status_byte:02X})")
-        self.response_queue.put(f"チルト制御 レスポンス: OK. 状態: {status_text}\n")
-        return True
+    def log_tilt_control_response(self, status_byte):
+        self.log_buffer.append(f"チルト制御 レスポンス: OK. 状態: {tilt_status_text(status_byte)}\n")
 
     def validate_tilt_angle_input(self, P):
         if P == "":
@@ -444,21 +355,6 @@ class ServoControllerGUI:
         except ValueError:
             return False
 
-    def convert_angle_to_bytes(self, angle_float, sign_mode):
-        sign_map = {
-            "minus": self.TILT_ANGLE_SIGN_MINUS,
-            "none": self.TILT_ANGLE_SIGN_NONE,
-            "plus": self.TILT_ANGLE_SIGN_PLUS,
-        }
-        data_bytes = [sign_map.get(sign_mode, self.TILT_ANGLE_SIGN_NONE)]
-        angle_for_command = int(round(angle_float * 10))
-        angle_str_padded = f"{angle_for_command:03d}"
-        if len(angle_str_padded) > 3:
-            raise ValueError("計算された角度値が3桁を超えました。")
-        data_bytes.extend(ord(c) for c in angle_str_padded)
-        data_bytes.extend([0x30, 0x30])
-        return data_bytes
-
     def send_angle_tilt_command(self):
         angle_str = self.angle_entry.get().strip()
         sign_mode = self.angle_sign_var.get()
@@ -472,48 +368,178 @@ class ServoControllerGUI:
             return
         
         try:
-            data_bytes = self.convert_angle_to_bytes(angle_float, sign_mode)
+            convert_angle_to_bytes(angle_float, sign_mode)
         except ValueError as e:
             messagebox.showerror("エラー", f"データ変換に失敗しました: {e}")
             return
             
-        cmnd_byte = self.TILT_ANGLE_CMND
-        
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes, self.check_tilt_angle_response)
+        self._run_command(lambda client: client.tilt_to(angle_float, sign_mode), self.log_tilt_angle_response)
+
+    def log_tilt_angle_response(self, status_byte):
+        self.log_buffer.append(f"角度指定チルト レスポンス: OK. 状態: {tilt_status_text(status_byte)}\n")
+
+    def load_profile(self):
+        """time,angle 形式のCSVからモーションプロファイルを読み込む."""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            title="モーションプロファイルを開く"
         )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
+        if not file_path:
+            return
+        try:
+            self.profile = load_profile_csv(file_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("読込エラー", f"プロファイルの読み込みに失敗しました: {e}")
+            return
+        self.profile_label_var.set(f"{len(self.profile)} 点 / {self.profile[-1][0]:.2f} 秒")
+        self.log_message(f"モーションプロファイルを読み込みました: {file_path}\n")
+        self._update_profile_button_states()
+
+    def play_profile(self):
+        if not self.servo or not self.profile:
+            return
+        profile = self.profile
+        self.profile_task = self._run_command(
+            lambda client: MotionProfilePlayer(client, profile, self.log_buffer.append).play())
+        if self.profile_task:
+            # 再生終了時にボタンの状態を戻すため、メインループを起こす
+            self.profile_task.add_done_callback(lambda f: self.ui_wakeup.set())
+        self._update_profile_button_states()
+
+    def stop_profile(self):
+        if self.profile_task:
+            self.profile_task.cancel()
 
-    def check_tilt_angle_response(self, response_bytes):
-        self.response_queue.put("角度指定チルト レスポンスを確認中...\n")
-        return self.check_tilt_control_response(response_bytes)
+    def _is_profile_playing(self):
+        return self.profile_task is not None and not self.profile_task.done()
 
     def log_message(self, message):
-        """GUIのテキストエリアにメッセージを追加し、一定行数を超えたら古いログを削除する."""
+        """ログにメッセージを追加する. 画面への反映はflush_logでまとめて行う."""
+        self.log_buffer.append(message)
+
+    def _ui_notifier_thread(self):
+        """ログ追加などの通知を受けてTkのメインループを起こす.
+
+        他スレッドは通知フラグを立てるだけで、Tkの呼び出しで待たされることはない.
+        """
+        while True:
+            self.ui_wakeup.wait()
+            self.ui_wakeup.clear()
+            try:
+                self.master.event_generate("<<UiWakeup>>", when="tail")
+            except (tk.TclError, RuntimeError):
+                return  # ウィンドウが閉じられた
+
+    def _schedule_log_flush(self, event=None):
+        if not self.log_flush_scheduled:
+            self.log_flush_scheduled = True
+            self.master.after(self.LOG_FLUSH_INTERVAL_MS, self.flush_log)
+
+    def flush_log(self):
+        """溜まったログを1回の挿入でテキストエリアに反映し、一定行数を超えた古いログを削除する."""
+        self.log_flush_scheduled = False
+        if self.profile_task and self.profile_task.done():
+            self.profile_task = None
+            self._update_profile_button_states()
+        if self.status_poller:
+            self._show_servo_state(self.status_poller.state)
+
+        text = self.log_buffer.drain()
+        if not text:
+            return
+        if self.servo:
+            # コマンドの送受信は必ずログを伴うため、統計の表示もログの反映と合わせて更新する
+            self.link_stats_var.set(format_link_stats(self.servo.client.stats()))
+            self._schedule_metrics_refresh()
+        new_lines = text.count('\n')
+
         self.response_text.config(state=tk.NORMAL)
-        self.response_text.insert(tk.END, message)
+        if new_lines >= self.MAX_LOG_LINES:
+            # 1回分だけで上限を超える場合は、表示し切れない古い行を挿入しない
+            text = '\n'.join(text.split('\n')[-self.MAX_LOG_LINES - 1:])
+            self.response_text.delete('1.0', tk.END)
+            self.log_line_count = self.MAX_LOG_LINES
+        else:
+            self.log_line_count += new_lines
+        self.response_text.insert(tk.END, text)
 
-        line_count = int(self.response_text.index('end-1c').split('.')[0])
-        if line_count > self.MAX_LOG_LINES:
-            delete_until = f'{line_count - self.MAX_LOG_LINES}.0'
+        if self.log_line_count > self.MAX_LOG_LINES:
+            delete_until = f'{self.log_line_count - self.MAX_LOG_LINES + 1}.0'
             self.response_text.delete('1.0', delete_until)
+            self.log_line_count = self.MAX_LOG_LINES
 
         self.response_text.see(tk.END)
         self.response_text.config(state=tk.DISABLED)
 
-    def process_queue(self):
+    def _show_servo_state(self, state):
+        text = f"現在の状態: {state.text}"
+        if state.error:
+            text += " (問い合わせ失敗)"
+        elif state.stale and state.status is not None:
+            text += " (未更新)"
+        if state.changed_at is not None:
+            text += f"  変化: {time.strftime('%H:%M:%S', time.localtime(state.changed_at))}"
+        self.servo_state_var.set(text)
+
+    def _schedule_metrics_refresh(self):
+        # 表の作り直しは重いため、ログの反映より粗い間隔にまとめる
+        if self.metrics_refresh_scheduled:
+            return
+        self.metrics_refresh_scheduled = True
+        wait = self.METRICS_REFRESH_INTERVAL - (time.monotonic() - self.metrics_refreshed_at)
+        self.master.after(max(0, int(wait * 1000)), self._refresh_metrics_panel)
+
+    def _refresh_metrics_panel(self):
+        self.metrics_refresh_scheduled = False
+        if not self.servo:
+            return
+        self.metrics_refreshed_at = time.monotonic()
+
+        def ms(*values):
+            return "/".join("-" if v is None else f"{v:.1f}" for v in values)
+
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        for row in self.metrics.rows():
+            values = [f"{row['cmnd']:02X}h"]
+            values += [row[key] for key, _, _ in self.METRICS_COLUMNS[1:-2]]
+            values.append(ms(row["first_byte_p50_ms"], row["first_byte_p99_ms"]))
+            values.append(ms(row["frame_p50_ms"], row["frame_p99_ms"], row["frame_max_ms"]))
+            self.metrics_tree.insert("", tk.END, values=values)
+        stats = self.servo.client.stats()
+        self.metrics_summary_var.set(f"状態の問い合わせ {stats['polls']}, 予期せぬフレーム {stats['unexpected_frames']}, "
+                                     f"破棄バイト {stats['discarded_bytes']}")
+
+    def export_metrics(self):
+        """通信統計 (計数と遅延ヒストグラム) をCSVに書き出す."""
+        if not self.metrics:
+            messagebox.showinfo("通信統計", "まだ計測値がありません。")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            title="通信統計をエクスポート"
+        )
+        if not file_path:
+            return
+        extra = None
+        if self.servo:
+            stats = self.servo.client.stats()
+            extra = {key: stats[key] for key in ("polls", "unexpected_frames", "discarded_bytes", "srtt_ms", "rttvar_ms")}
         try:
-            while True:
-                message = self.response_queue.get_nowait()
-                self.log_message(message)
-        except queue.Empty:
-            pass
-        finally:
-            self.master.after(100, self.process_queue)
+            self.metrics.export_csv(file_path, extra)
+            self.log_message(f"通信統計を {file_path} に書き出しました。\n")
+        except OSError as e:
+            messagebox.showerror("保存エラー", f"通信統計の書き出しに失敗しました: {e}")
 
     def save_log(self):
+        """ログをファイルに保存する. 保存中は以降のログもローテーションしながら追記し続ける."""
+        if self.log_buffer.file_handler:
+            self.flush_log()
+            self.log_buffer.stop_file_stream()
+            self.save_log_button.config(text="ログを保存")
+            self.log_message("ログファイルへの保存を停止しました。\n")
+            return
+
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
@@ -521,9 +547,9 @@ class ServoControllerGUI:
         )
         if file_path:
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(self.response_text.get("1.0", tk.END))
-                messagebox.showinfo("保存完了", f"ログを {file_path} に保存しました。")
+                self.log_buffer.start_file_stream(file_path)
+                self.save_log_button.config(text="ログ保存を停止")
+                messagebox.showinfo("保存開始", f"ログを {file_path} に保存しています。\n以降のログも追記されます (1MBごとにローテーション)。")
             except Exception as e:
                 messagebox.showerror("保存エラー", f"ログの保存に失敗しました: {e}")
 
@@ -532,6 +558,8 @@ class ServoControllerGUI:
         try:
             self.disconnect_serial()
         finally:
+            self.log_buffer.drain()  # ファイル保存中なら残りを書き出す
+            self.log_buffer.stop_file_stream()
             self.master.destroy()
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gyro_bias import GyroBiasModel, StationaryDetector  # noqa: E402
+
+RATE_HZ = 200
+LEVEL = {'x': 0.0, 'y': 0.0, 'z': 1.0}
+
+
+def run(model, detector, rates, temp=25.0):
+    """角速度の列を静止判定とバイアス推定に通し、静止とみなしたサンプル数を返す."""
+    still = 0
+    for rate in rates:
+        if detector.update(rate, LEVEL, model.expected_bias(temp)):
+            model.update(temp, rate)
+            still += 1
+    return still
+
+
+def test_rls_converges_to_temperature_slope():
+    rng = np.random.default_rng(0)
+    model = GyroBiasModel()
+    for temp in np.linspace(20.0, 40.0, 5000):
+        model.update(temp, 0.5 + 0.02 * (temp - 25.0) + rng.normal(0.0, 0.05))
+    assert model.theta == pytest.approx([0.5, 0.02], abs=0.005)
+    assert model.bias(35.0) == pytest.approx(0.7, abs=0.01)
+
+
+def test_model_round_trip(tmp_path):
+    model = GyroBiasModel()
+    for temp in (24.0, 26.0, 28.0):
+        model.update(temp, 0.3)
+    path = str(tmp_path / "bias.json")
+    model.save(path)
+    loaded = GyroBiasModel.load(path)
+    np.testing.assert_allclose(loaded.theta, model.theta)
+    np.testing.assert_allclose(loaded.covariance, model.covariance)
+    assert loaded.samples == model.samples
+
+
+def test_slow_turn_is_not_learned_as_bias():
+    """静止60秒 (バイアス0.5度/秒) の後に2度/秒で10分回っても、旋回をバイアスとして学習しない."""
+    rng = np.random.default_rng(1)
+    bias = 0.5
+    model = GyroBiasModel()
+    detector = StationaryDetector(window=RATE_HZ // 2)
+
+    run(model, detector, bias + rng.normal(0.0, 0.05, 60 * RATE_HZ))
+    assert model.bias(25.0) == pytest.approx(bias, abs=0.02)
+
+    turn = bias + 2.0 + rng.normal(0.0, 0.05, 10 * 60 * RATE_HZ)
+    still = run(model, detector, turn)
+    assert still / len(turn) < 0.001
+    assert model.bias(25.0) == pytest.approx(bias, abs=0.02)
+
+
+def test_moving_is_not_stationary():
+    detector = StationaryDetector(window=10)
+    for _ in range(10):
+        detector.update(0.1, LEVEL)
+    assert detector.stationary
+    assert not detector.update(0.1, {'x': 0.5, 'y': 0.0, 'z': 1.0})
+    assert not detector.update(5.0, LEVEL)
@@ -0,0 +1,123 @@
+import ctypes
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mpu6050 import (  # noqa: E402
+    ACCEL_SCALE, ACCEL_XOUT_H, FIFO_COUNTH, FIFO_R_W, FIFO_SIZE, GYRO_SCALE, MPU6050, TEMP_OFFSET, TEMP_SCALE,
+    USER_CTRL, USER_CTRL_FIFO_RESET,
+)
+
+
+class CountingBus:
+    """レジスタとFIFOを模擬し、I2Cの転送の回数を数えるSMBusの代わり."""
+
+    def __init__(self):
+        self.registers = bytearray(128)
+        self.fifo = bytearray()
+        self.transactions = []  # (種類, レジスタ)
+
+    def write_byte_data(self, address, register, value):
+        self.transactions.append(("write", register))
+        self.registers[register] = value
+        if register == USER_CTRL and value & USER_CTRL_FIFO_RESET:
+            self.fifo.clear()
+
+    def read_byte_data(self, address, register):
+        self.transactions.append(("read", register))
+        return self.registers[register]
+
+    def read_i2c_block_data(self, address, register, length):
+        self.transactions.append(("block", register))
+        if register == FIFO_COUNTH:
+            return [len(self.fifo) >> 8, len(self.fifo) & 0xFF]
+        return list(self.registers[register:register + length])
+
+    def i2c_rdwr(self, write, read):
+        register = bytes(write)[0]
+        self.transactions.append(("rdwr", register))
+        assert register == FIFO_R_W
+        data = bytes(self.fifo[:read.len])
+        del self.fifo[:read.len]
+        ctypes.memmove(read.buf, data, len(data))
+
+    def close(self):
+        pass
+
+    def set_sample(self, *raw):
+        """ACCEL_XOUT_H から始まる14バイトに、生の値7つ (加速度3, 温度, 角速度3) を書く."""
+        self.registers[ACCEL_XOUT_H:ACCEL_XOUT_H + 14] = struct.pack(">7h", *raw)
+
+    def push_fifo(self, *raw):
+        self.fifo += struct.pack(f">{len(raw)}h", *raw)
+
+
+@pytest.fixture
+def bus():
+    return CountingBus()
+
+
+def test_read_all_is_one_block_transaction(bus):
+    sensor = MPU6050(bus=bus)
+    bus.set_sample(16384, -8192, 0, 340, 131, -262, 0)
+    bus.transactions.clear()
+
+    sample = sensor.read_all()
+
+    assert bus.transactions == [("block", ACCEL_XOUT_H)]
+    assert sample["accel"] == {"x": 1.0, "y": -0.5, "z": 0.0}
+    assert sample["gyro"] == {"x": 1.0, "y": -2.0, "z": 0.0}
+    assert sample["temp"] == pytest.approx(1.0 + TEMP_OFFSET)
+
+
+def test_fifo_drain_is_count_then_burst(bus):
+    sensor = MPU6050(bus=bus)
+    sensor.enable_fifo(accel=False, temp=True, gyro=True)
+    frames = [(i * 340, 131 * i, 0, -131) for i in range(20)]
+    for frame in frames:
+        bus.push_fifo(*frame)
+    bus.transactions.clear()
+
+    samples = sensor.read_fifo()
+
+    assert bus.transactions == [("block", FIFO_COUNTH), ("rdwr", FIFO_R_W)]
+    assert samples.shape == (20, 4)
+    expected = np.array(frames) / [TEMP_SCALE, GYRO_SCALE, GYRO_SCALE, GYRO_SCALE] + [TEMP_OFFSET, 0, 0, 0]
+    np.testing.assert_allclose(samples, expected)
+    assert not bus.fifo
+
+
+def test_fifo_partial_frame_stays_for_next_read(bus):
+    sensor = MPU6050(bus=bus)
+    sensor.enable_fifo()  # 14バイトのフレーム
+    bus.push_fifo(16384, 0, 0, 0, 0, 0, 131)
+    bus.push_fifo(0, 16384, 0)  # 次のフレームの前半だけ届いている
+
+    first = sensor.read_fifo()
+    assert first.shape == (1, 7)
+    assert len(bus.fifo) == 6
+
+    bus.push_fifo(0, 0, 0, 262)  # 後半が届く
+    second = sensor.read_fifo()
+    assert second.shape == (1, 7)
+    assert second[0, 1] == 16384 / ACCEL_SCALE
+    assert second[0, 6] == 262 / GYRO_SCALE
+
+
+def test_fifo_overflow_resets_without_burst(bus):
+    sensor = MPU6050(bus=bus)
+    sensor.enable_fifo()
+    bus.fifo += bytes(FIFO_SIZE)
+    bus.transactions.clear()
+
+    samples = sensor.read_fifo()
+
+    assert samples.shape == (0, 7)
+    assert sensor.fifo_overflows == 1
+    assert not bus.fifo
+    assert ("rdwr", FIFO_R_W) not in bus.transactions
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nmea import (  # noqa: E402
+    NMEA_SENTENCE_PATTERN, convert_to_decimal, nmea_time_to_iso, update_gnss_data,
+)
+
+
+def parse(lines):
+    gnss_data = {}
+    for line in lines:
+        assert NMEA_SENTENCE_PATTERN.match(line)
+        update_gnss_data(gnss_data, line)
+    return gnss_data
+
+
+def test_convert_to_decimal():
+    assert convert_to_decimal("3540.8741713", "N") == pytest.approx(35.681236188)
+    assert convert_to_decimal("13946.0275051", "W") == pytest.approx(-139.767125085)
+    assert convert_to_decimal("", "N") == 0.0
+    assert convert_to_decimal("3540", "N") == 0.0
+
+
+def test_nmea_time_to_iso():
+    assert nmea_time_to_iso("031507.25", "190926") == "2026-09-19T03:15:07.250Z"
+    assert nmea_time_to_iso("bad", "190926") == ""
+
+
+def test_epoch_updates_all_fields():
+    gnss_data = parse([
+        "$GNZDA,031507.00,19,09,2026,,*7F",
+        "$GNGGA,031507.00,3540.8741713,N,13946.0275051,E,4,28,0.6,40.134,M,36.712,M,1.0,0000*67",
+        "$GNRMC,031507.00,A,3540.8741713,N,13946.0275051,E,0.012,90.06,190926,,,D,V*36",
+        "$GNGSA,A,3,03,25,24,09,05,15,30,02,21,18,17,08,1.1,0.6,0.9,1*31",
+        "$GPGST,031507.00,0.85,0.012,0.009,45.2,0.010,0.011,0.021*51",
+        "$GNVTG,90.06,T,,M,0.012,N,0.022,K,D*1A",
+        "$GNHDT,90.0642,T*22",
+    ])
+    assert gnss_data["lat"] == pytest.approx(35.681236188)
+    assert gnss_data["lng"] == pytest.approx(139.767125085)
+    assert gnss_data["fix"] == "4"  # GSAのモード3でGGAのRTK Fixを上書きしない
+    assert gnss_data["num_satellites"] == 28
+    assert gnss_data["alt"] == 40.134
+    assert gnss_data["speed"] == 0.012
+    assert gnss_data["date_utc"] == "190926"
+    assert gnss_data["datetime_iso"] == "2026-09-19T03:15:07.000Z"
+    assert gnss_data["satellites_in_use"][:3] == [3, 25, 24]
+    assert (gnss_data["pdop"], gnss_data["hdop"], gnss_data["vdop"]) == (1.1, 0.6, 0.9)
+    assert gnss_data["alt_std"] == 0.021  # 最後の項目にチェックサムが付いていても読める
+    assert gnss_data["vtg_speed_kmh"] == 0.022
+    assert gnss_data["vtg_mode_ind"] == "D"
+    assert gnss_data["heading"] == 90.0642
+
+
+def test_gsa_without_fix():
+    gnss_data = parse(["$GNGSA,A,1,,,,,,,,,,,,,99.9,99.9,99.9,1*0A"])
+    assert gnss_data["fix"] == "0"
+    assert gnss_data["satellites_in_use"] == []
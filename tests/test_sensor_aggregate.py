@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_aggregate import BinnedStats2D  # noqa: E402
+
+
+def yaw_by_temperature():
+    """ヨー角0～360度 × 温度-90～-20度の1度区間."""
+    return BinnedStats2D(0.0, 360, -90.0, 70, wrap_x=True)
+
+
+def test_welford_matches_numpy():
+    rng = np.random.default_rng(0)
+    aggregate = yaw_by_temperature()
+    values = rng.normal(1e4, 3.0, 500)  # 平均が大きくても分散の桁落ちが無い
+    for value in values:
+        assert aggregate.add(12.5, -45.2, value)
+
+    ix, iy = 12, 44
+    assert aggregate.grid("count")[ix, iy] == 500
+    assert aggregate.grid("mean")[ix, iy] == pytest.approx(values.mean())
+    assert aggregate.grid("std")[ix, iy] == pytest.approx(values.std(ddof=1))
+    assert aggregate.grid("min")[ix, iy] == values.min()
+    assert aggregate.grid("max")[ix, iy] == values.max()
+    assert np.isnan(aggregate.grid("mean")[0, 0])
+    assert aggregate.grid("count").sum() == aggregate.total == 500
+
+
+def test_x_wraps_at_360():
+    aggregate = yaw_by_temperature()
+    assert aggregate.add(361.5, -50.0, 1.0)
+    assert aggregate.add(-0.5, -50.0, 2.0)
+    assert not aggregate.add(10.0, -10.0, 3.0)  # yは折り返さない
+
+    count = aggregate.grid("count")
+    assert count[1, 40] == 1
+    assert count[359, 40] == 1
+    assert aggregate.outside == 1
+
+
+def test_save_load_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    aggregate = yaw_by_temperature()
+    for x, y, value in zip(rng.uniform(0, 360, 2000), rng.uniform(-90, -20, 2000), rng.normal(size=2000)):
+        aggregate.add(x, y, value)
+    aggregate.add(0.0, 0.0, 0.0)
+    path = str(tmp_path / "aggregate.npz")
+    aggregate.save(path)
+
+    loaded = BinnedStats2D.load(path)
+    assert loaded.compatible(aggregate)
+    assert loaded.wrap_x
+    assert (loaded.total, loaded.outside) == (aggregate.total, aggregate.outside)
+    for stat in ("count", "mean", "std", "min", "max"):
+        np.testing.assert_array_equal(loaded.grid(stat), aggregate.grid(stat))
+    assert not loaded.compatible(BinnedStats2D(0.0, 360, -80.0, 70, wrap_x=True))
+    assert not loaded.compatible(BinnedStats2D(0.0, 180, -90.0, 70, bin_width=2.0, wrap_x=True))
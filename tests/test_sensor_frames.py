@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_frames import FixedFrameDecoder  # noqa: E402
+
+
+def frames(values):
+    return b"".join(f"T:-{value:02d}\n".encode() for value in values)
+
+
+def test_clean_stream_in_small_chunks():
+    data = frames(range(20, 60))
+    decoder = FixedFrameDecoder()
+    values = []
+    for i in range(0, len(data), 4):
+        values.extend(decoder.feed(data[i:i + 4]).tolist())
+    assert values == list(range(20, 60))
+    assert decoder.dropped_bytes == 0
+
+
+def test_garbled_frame_does_not_block_lock():
+    decoder = FixedFrameDecoder()
+    values = decoder.feed(frames(range(10, 20)) + b"T:+X5\n" + frames(range(30, 40)))
+    assert values.tolist() == list(range(10, 20)) + list(range(30, 40))
+    assert decoder.dropped_bytes == 6
+    assert decoder.resyncs == 1
+
+
+def test_leading_junk_is_skipped_in_the_same_read():
+    decoder = FixedFrameDecoder()
+    values = decoder.feed(b"5\nT:-4" + frames(range(40, 50)))
+    assert values.tolist() == list(range(40, 50))
+    assert decoder.dropped_bytes == 6
+    assert decoder.synced
+
+
+def test_lost_byte_realigns():
+    decoder = FixedFrameDecoder()
+    values = decoder.feed(frames(range(10, 20)) + b"T:-1\n" + frames(range(30, 40)))
+    assert values.tolist() == list(range(10, 20)) + list(range(30, 40))
+    assert decoder.dropped_bytes == 5
+
+
+def test_waits_for_lock_frames_before_syncing():
+    decoder = FixedFrameDecoder()
+    assert decoder.feed(frames([45, 46])).tolist() == []
+    assert not decoder.synced
+    assert decoder.feed(frames([47])).tolist() == [45, 46, 47]
+    assert decoder.dropped_bytes == 0
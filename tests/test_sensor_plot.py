@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_plot import minmax_decimate  # noqa: E402
+
+
+@pytest.mark.parametrize("n, max_points", [(10007, 500), (10000, 500), (1001, 7), (3600, 1000)])
+def test_minmax_decimate_keeps_bin_extremes(n, max_points):
+    rng = np.random.default_rng(n)
+    x = np.arange(n) * 0.1
+    y = rng.normal(size=n).cumsum()
+
+    dx, dy = minmax_decimate(x, y, max_points)
+
+    assert len(dx) <= max_points
+    assert (np.diff(dx) >= 0).all()  # 元の順序のまま
+    assert dy.min() == y.min() and dy.max() == y.max()
+    # 各区間の最小と最大が残っている
+    per_bin = -(-n // (max_points // 2))
+    for start in range(0, n, per_bin):
+        part = y[start:start + per_bin]
+        kept = dy[(dx >= x[start]) & (dx <= x[min(start + per_bin, n) - 1])]
+        assert part.min() in kept and part.max() in kept
+
+
+def test_minmax_decimate_short_input_unchanged():
+    x = np.arange(10.0)
+    y = x ** 2
+    dx, dy = minmax_decimate(x, y, 10)
+    assert dx is x and dy is y
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_recorder import SensorRecorder  # noqa: E402
+
+T0 = 1_700_000_040.0  # 1分の区間の途中から始まらないよう60の倍数にする
+
+
+def record_seconds(recorder, seconds, rate_hz=4):
+    t = T0 + np.arange(seconds * rate_hz) / rate_hz
+    temperature = -40.0 + np.sin(t / 37.0) * 5
+    for ti, value in zip(t, temperature):
+        recorder.record("temperature", ti, {"temperature": value, "raw": round(value)})
+    return t, temperature
+
+
+def test_raw_round_trip_after_reopen(tmp_path):
+    recorder = SensorRecorder(str(tmp_path), chunk_size=256)
+    t, temperature = record_seconds(recorder, 300)
+    live = recorder.query("temperature", T0 + 10, T0 + 20)
+    recorder.close()
+
+    reopened = SensorRecorder(str(tmp_path))
+    columns = reopened.query("temperature")
+    np.testing.assert_array_equal(columns["t"], t)
+    np.testing.assert_array_equal(columns["temperature"], temperature)
+    np.testing.assert_array_equal(columns["raw"], np.round(temperature))
+    np.testing.assert_array_equal(live["t"], t[(t >= T0 + 10) & (t <= T0 + 20)])
+
+
+def test_rollup_stats(tmp_path):
+    recorder = SensorRecorder(str(tmp_path), chunk_size=256)
+    t, temperature = record_seconds(recorder, 600)
+    recorder.close()
+
+    minutes = recorder.query("temperature", tier="1m")
+    assert len(minutes["t"]) == 10
+    for i, start in enumerate(minutes["t"]):
+        values = temperature[(t >= start) & (t < start + 60)]
+        assert minutes["count"][i] == len(values)
+        assert minutes["temperature_min"][i] == values.min()
+        assert minutes["temperature_max"][i] == values.max()
+        assert minutes["temperature_mean"][i] == pytest.approx(values.mean())
+
+    seconds = recorder.query("temperature", T0 + 100, T0 + 109, tier="1s")
+    np.testing.assert_array_equal(seconds["t"], T0 + np.arange(100, 110))
+    assert (seconds["count"] == 4).all()
+    with pytest.raises(ValueError):
+        recorder.query("temperature", tier="1h")
+
+
+def test_periodic_flush_keeps_rollup_chunks_full(tmp_path):
+    # 生データは毎回書き出させても、集約は一杯になるまでためて固定サイズのチャンクにする
+    recorder = SensorRecorder(str(tmp_path), chunk_size=1024, flush_interval=0.0)
+    record_seconds(recorder, 2 * 3600, rate_hz=1)
+    stores = {name: store for name, _, store in recorder.streams["temperature"].tiers}
+
+    assert len(stores["1s"].index) == 2 * 3600 // 64
+    assert all(entry["rows"] == 64 for entry in stores["1s"].index)
+    assert [entry["rows"] for entry in stores["1m"].index] == [64]
+    assert stores["1m"].pending_rows == 2 * 60 - 1 - 64
+
+    # 書き出していない集約の行も問い合わせに含まれる
+    assert len(recorder.query("temperature", tier="1m")["t"]) == 2 * 60 - 1
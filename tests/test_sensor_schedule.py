@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_schedule import FixedRateScheduler  # noqa: E402
+
+
+class FakeClock:
+    """sleepで進む時計. sleepは指定よりoversleep秒長く寝る."""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 1000.0
+        self.oversleep = oversleep
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.oversleep
+
+
+def run(scheduler, clock, work):
+    """work(index)秒の処理をしながら、len(work)周期を回してTickのリストを返す."""
+    ticks = []
+    for tick in scheduler.ticks():
+        ticks.append(tick)
+        clock.now += work[len(ticks) - 1]
+        if len(ticks) == len(work):
+            scheduler.stop()
+    return ticks
+
+
+def test_deadlines_do_not_drift():
+    clock = FakeClock(oversleep=0.0005)
+    scheduler = FixedRateScheduler(100, clock=clock, sleep=clock.sleep)
+    ticks = run(scheduler, clock, [0.003] * 1000)
+
+    start = ticks[0].deadline
+    for tick in ticks[1:]:
+        assert tick.deadline == pytest.approx(start + tick.index * 0.01)
+        assert tick.late == pytest.approx(0.0005)
+    assert ticks[-1].index == 999
+    assert scheduler.overruns == 0
+    assert scheduler.stats()["ticks"] == 1000
+
+
+def test_overruns_skip_missed_deadlines():
+    clock = FakeClock()
+    scheduler = FixedRateScheduler(100, clock=clock, sleep=clock.sleep)
+    work = [0.001] * 10
+    work[4] = 0.035  # 5周期目の処理が3周期半かかり、6・7周期目の期限を過ぎて8周期目の期限にも遅れる
+    ticks = run(scheduler, clock, work)
+
+    assert scheduler.overruns == 2
+    assert [tick.index for tick in ticks] == [0, 1, 2, 3, 4, 7, 8, 9, 10, 11]
+    assert ticks[5].missed == 2
+    assert ticks[5].late == pytest.approx(0.005)
+    assert ticks[5].dt == pytest.approx(0.035)
+    assert ticks[6].late == pytest.approx(0.0)
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        FixedRateScheduler(0)
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servo_client import ServoCommandSuperseded, _SendQueue  # noqa: E402
+
+
+async def _cancel_waiter_then(action):
+    """0x30を送信中にして0x31の待ちを取り消し、そのタスクが動く前にactionを呼ぶ."""
+    queue = _SendQueue(max_in_flight=1)
+    await queue.acquire(0x30)
+    waiter = asyncio.create_task(queue.acquire(0x31, coalesce_key="tilt"))
+    await asyncio.sleep(0)
+    assert len(queue.waiting) == 1
+
+    waiter.cancel()
+    await action(queue)
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    return queue
+
+
+def test_release_skips_cancelled_waiter():
+    async def release(queue):
+        queue.release(0x30)
+
+    async def run():
+        queue = await _cancel_waiter_then(release)
+        assert queue.in_flight == []
+        assert queue.waiting == []
+        # 送信枠が残っていないので次の要求がすぐ通る
+        await asyncio.wait_for(queue.acquire(0x32), timeout=1.0)
+        assert queue.in_flight == [0x32]
+
+    asyncio.run(run())
+
+
+def test_coalesce_skips_cancelled_waiter():
+    async def run():
+        queue = _SendQueue(max_in_flight=1)
+        await queue.acquire(0x30)
+        waiter = asyncio.create_task(queue.acquire(0x31, coalesce_key="tilt"))
+        await asyncio.sleep(0)
+        # 新しい要求のタスクは、取り消した待ちのタスクより先に動く
+        newer = asyncio.create_task(queue.acquire(0x31, coalesce_key="tilt"))
+        waiter.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queue.release(0x30)
+        await asyncio.wait_for(newer, timeout=1.0)
+        assert queue.in_flight == [0x31]
+        assert queue.waiting == []
+
+    asyncio.run(run())
+
+
+def test_coalesce_supersedes_pending_waiter():
+    async def run():
+        queue = _SendQueue(max_in_flight=1)
+        await queue.acquire(0x30)
+        older = asyncio.create_task(queue.acquire(0x31, coalesce_key="tilt"))
+        await asyncio.sleep(0)
+        newer = asyncio.create_task(queue.acquire(0x31, coalesce_key="tilt"))
+        await asyncio.sleep(0)
+        with pytest.raises(ServoCommandSuperseded):
+            await older
+        queue.release(0x30)
+        await asyncio.wait_for(newer, timeout=1.0)
+        assert queue.in_flight == [0x31]
+
+    asyncio.run(run())
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servo_client import ServoClient  # noqa: E402
+from servo_protocol import TILT_CONTROL_CMND, TILT_STATUS_STOP, TILT_STOP_DATA, TILT_UP_DATA  # noqa: E402
+from servo_sim import VirtualServoDevice  # noqa: E402
+from servo_status import ServoStatusPoller  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="擬似端末 (pty) が必要")
+
+POLL_INTERVAL = 0.05
+
+
+async def _with_poller(device, scenario):
+    client = ServoClient(device.port)
+    await client.open()
+    poller = ServoStatusPoller(client, interval=POLL_INTERVAL)
+    task = asyncio.create_task(poller.run())
+    try:
+        return await scenario(client, poller)
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await client.close()
+
+
+def run_scenario(scenario):
+    with VirtualServoDevice(speed=20.0, wire_delay=False) as device:
+        return device, asyncio.run(_with_poller(device, scenario(device)))
+
+
+def test_raw_stop_is_not_undone_by_poll():
+    """汎用コマンドで停止した後、問い合わせが前の「上」を送り直して動かさない."""
+    def scenario(device):
+        async def run(client, poller):
+            await client.tilt("up")
+            await asyncio.sleep(POLL_INTERVAL * 2)
+            await client.request(TILT_CONTROL_CMND, TILT_STOP_DATA, any_response=True)
+            stopped_angle = device.status()[0]
+            await asyncio.sleep(POLL_INTERVAL * 6)
+            return stopped_angle
+        return run
+
+    device, stopped_angle = run_scenario(scenario)
+    angle, status = device.status()
+    assert status == TILT_STATUS_STOP
+    assert angle == stopped_angle
+
+
+def test_stopped_stays_stopped_while_polling():
+    """停止後の問い合わせは停止の再送で、角度が変わらない."""
+    def scenario(device):
+        async def run(client, poller):
+            await client.tilt("up")
+            await asyncio.sleep(POLL_INTERVAL * 2)
+            await client.tilt("stop")
+            stopped_angle = device.status()[0]
+            polls = poller.polls
+            await asyncio.sleep(POLL_INTERVAL * 6)
+            return stopped_angle, poller.polls - polls
+        return run
+
+    device, (stopped_angle, polls) = run_scenario(scenario)
+    angle, status = device.status()
+    assert polls > 0
+    assert status == TILT_STATUS_STOP
+    assert angle == stopped_angle
+
+
+def test_continuous_tilt_is_not_replayed():
+    """連続の上/下は問い合わせで送り直さない."""
+    def scenario(device):
+        async def run(client, poller):
+            await client.tilt("up")
+            polls = poller.polls
+            await asyncio.sleep(POLL_INTERVAL * 4)
+            return client.last_tilt_command, poller.polls - polls
+        return run
+
+    device, (command, polls) = run_scenario(scenario)
+    assert command is None
+    assert polls == 0
+
+
+def test_init_and_raw_tilt_clear_replay():
+    """初期化や汎用コマンドの43hの後は、前のチルト指令を送り直さない."""
+    def scenario(device):
+        async def run(client, poller):
+            await client.tilt("stop")
+            assert client.last_tilt_command == (TILT_CONTROL_CMND, TILT_STOP_DATA)
+            await client.init()
+            after_init = client.last_tilt_command
+            await client.tilt_to(5.0)
+            await client.request(TILT_CONTROL_CMND, TILT_UP_DATA, any_response=True)
+            return after_init, client.last_tilt_command
+        return run
+
+    device, (after_init, after_raw) = run_scenario(scenario)
+    assert after_init is None
+    assert after_raw is None
+
+
+def test_polls_are_not_counted_as_operator_requests():
+    """問い合わせはpoll_metricsに数え、操作のコマンドの計数と遅延に混ぜない."""
+    def scenario(device):
+        async def run(client, poller):
+            await client.tilt("stop")
+            await asyncio.sleep(POLL_INTERVAL * 6)
+            frames = client.metrics.commands[TILT_CONTROL_CMND].latency["frame"].count
+            return client.metrics.totals(), client.poll_metrics.totals(), client.stats(), frames, poller.polls
+        return run
+
+    device, (totals, poll_totals, stats, frames, polls) = run_scenario(scenario)
+    assert polls > 0
+    assert totals["requests"] == 1
+    assert poll_totals["requests"] == polls
+    assert stats["requests"] == 1
+    assert stats["polls"] == polls
+    assert frames == 1
@@ -1,57 +1,42 @@
 import time
+started_at = time.perf_counter() # 起動時間の測定用 (他のモジュールを読み込む前に取る)
+
+import argparse
 import math
+import os
 import threading
-import collections
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from smbus2 import SMBus # For MPU6050 communication
-import serial # For USB serial communication for temperature sensor
-
-# --- MPU6050 Class (as provided) ---
-class MPU6050:
-    def __init__(self, bus_id=1, address=0x68):
-        self.bus_id = bus_id
-        self.address = address
-        self.bus = SMBus(self.bus_id)
-        self.PWR_MGMT_1 = 0x6B
-        self.ACCEL_XOUT_H = 0x3B
-        self.GYRO_XOUT_H = 0x43
-        self.TEMP_OUT_H = 0x41
-        self.bus.write_byte_data(self.address, self.PWR_MGMT_1, 0)
-
-    def read_i2c_word(self, reg):
-        high = self.bus.read_byte_data(self.address, reg)
-        low = self.bus.read_byte_data(self.address, reg + 1)
-        value = (high << 8) | low
-        if value >= 0x8000:
-            value = -((65535 - value) + 1)
-        return value
-
-    def get_accel(self):
-        return {
-            'x': self.read_i2c_word(self.ACCEL_XOUT_H) / 16384.0,
-            'y': self.read_i2c_word(self.ACCEL_XOUT_H + 2) / 16384.0,
-            'z': self.read_i2c_word(self.ACCEL_XOUT_H + 4) / 16384.0
-        }
-
-    def get_gyro(self):
-        return {
-            'x': self.read_i2c_word(self.GYRO_XOUT_H) / 131.0,
-            'y': self.read_i2c_word(self.GYRO_XOUT_H + 2) / 131.0,
-            'z': self.read_i2c_word(self.GYRO_XOUT_H + 4) / 131.0
-        }
-
-    def get_temp(self):
-        raw_temp = self.read_i2c_word(self.TEMP_OUT_H)
-        return raw_temp / 340.0 + 36.53
-
-    def close(self):
-        self.bus.close()
-
-# --- データ共有のためのキュー ---
+import numpy as np
+
+from gyro_bias import GyroBiasModel, StationaryDetector
+from mpu6050 import MPU6050
+from sensor_aggregate import BinnedStats2D
+from sensor_buffer import SampleRing
+from sensor_headless import StartupTimer, add_headless_arguments, check_headless_arguments, run_headless
+from sensor_hub import MPU6050Source, SensorHub, TemperatureFrameSource
+from sensor_schedule import FixedRateScheduler, format_schedule_stats
+from sensor_plot import AxisLimits, BlitPlotter, TimeWindow, connect_zoom_keys, minmax_decimate
+
+# --- データ共有のためのリングバッファ ---
 # グラフは散布図になるため、X, Yデータをペアで保持
-# (X, Y) は (角度, 温度) のペアになる
-data_queue_plot_points = collections.deque(maxlen=100) # 最大100個のデータペアを表示
+# (X, Y) は (角度, 温度) のペアで、取得時刻 (time.monotonic) 付き
+# 約200ms間隔で8時間分を保持する
+plot_points = SampleRing(capacity=5 * 60 * 60 * 8, columns=2)
+
+# 表示する時間の幅の初期値 (秒). 「-」「+」キーで変え、「0」キーで記録全体を表示する
+WINDOW_SECONDS = 60
+
+# --- ヨー角1度 × 温度1度ごとの角速度 z の集計 ---
+# 記録の長さによらずメモリは一定. 定期的にファイルへ保存し、次回の起動時に続きから集計する
+AGGREGATE_FILE = 'yaw_temp_aggregate.npz'
+AGGREGATE_SAVE_INTERVAL = 60 # 保存の間隔 (秒). バイアスのモデルも同時に保存する
+TEMPERATURE_MIN = -90
+TEMPERATURE_BINS = 71 # -90度から-20度まで
+yaw_temp_aggregate = BinnedStats2D(0, 360, TEMPERATURE_MIN, TEMPERATURE_BINS, wrap_x=True)
+
+# --- 角速度 z のバイアス補正 ---
+# 静止中の角速度から、バイアスをMPU6050の内部温度の関数として逐次推定し、積分の前に差し引く
+GYRO_BIAS_FILE = 'gyro_bias_model.json'
+gyro_bias_model = GyroBiasModel()
 
 # スレッド間でデータを渡すための最新値保持変数 (シンプルな同期)
 latest_yaw_angle = 0.0
@@ -61,19 +46,32 @@ latest_temperature = -999.0 # 初期値は無効な値とする
 data_lock = threading.Lock()
 
 # --- MPU6050 データ取得・処理スレッド ---
+# 角速度の取得・積分の頻度 (Hz) と、グラフ用に (角度, 温度) を記録する頻度 (Hz)
+GYRO_RATE_HZ = 200
+PLOT_RATE_HZ = 5
+
+mpu_scheduler = FixedRateScheduler(GYRO_RATE_HZ)
+
+# 0.5秒分のサンプルのばらつきで静止を判定する
+stationary_detector = StationaryDetector(window=GYRO_RATE_HZ // 2)
+
 def read_mpu6050_data_thread(mpu):
     global latest_yaw_angle, data_lock
     yaw = 0.0
-    last_time = time.time()
+    plot_every = max(1, round(GYRO_RATE_HZ / PLOT_RATE_HZ))
     try:
-        while True:
-            current_time = time.time()
-            dt = current_time - last_time
-            last_time = current_time
-
-            gyro_data = mpu.get_gyro()
-            
-            delta_yaw = gyro_data['z'] * dt
+        # 単調時計の期限で一定周期に取得し、実際の経過時間で積分する
+        for tick in mpu_scheduler.ticks():
+            # 角速度・加速度・内部温度を1回の転送で読む
+            sample = mpu.read_all()
+            raw_rate = sample['gyro']['z']
+
+            # 静止中はバイアスのモデルを更新し、温度に応じた推定バイアスを差し引いて積分する
+            if stationary_detector.update(raw_rate, sample['accel'], gyro_bias_model.expected_bias(sample['temp'])):
+                gyro_bias_model.update(sample['temp'], raw_rate)
+            rate = gyro_bias_model.correct(raw_rate, sample['temp'])
+
+            delta_yaw = rate * tick.dt
             yaw += delta_yaw
 
             # ヨー角を 0度から360度 の範囲に正規化
@@ -86,9 +84,13 @@ def read_mpu6050_data_thread(mpu):
 
             with data_lock:
                 latest_yaw_angle = rounded_yaw_angle
+                current_temp = latest_temperature
 
-            # 約200ms間隔でデータを取得
-            time.sleep(max(0, 0.2 - dt))
+            # 有効な温度データが受信された場合のみプロット対象・集計に追加
+            if current_temp != -999.0: # 初期値でないことを確認
+                yaw_temp_aggregate.add(yaw, current_temp, raw_rate)
+                if tick.index % plot_every == 0:
+                    plot_points.append(tick.time, (rounded_yaw_angle, current_temp))
 
     except KeyboardInterrupt:
         print("MPU6050 データ取得スレッドを停止します。")
@@ -96,94 +98,100 @@ def read_mpu6050_data_thread(mpu):
         print(f"MPU6050 データ取得中にエラーが発生しました: {e}")
     finally:
         mpu.close()
+        print(f"MPU6050 の取得周期: {format_schedule_stats(mpu_scheduler.stats())}")
         print("MPU6050 バスを閉じました。")
 
-# --- USB シリアル 温度データ取得・処理スレッド ---
-def read_temperature_data_thread(serial_port, baud_rate):
-    global latest_temperature, data_lock
-    try:
-        ser = serial.Serial(serial_port, baud_rate, timeout=0.1)
-        print(f"シリアルポート {serial_port} を開きました。")
-    except serial.SerialException as e:
-        print(f"シリアルポート '{serial_port}' を開けませんでした: {e}")
-        print("温度センサーのシリアルポート名を確認してください。")
-        return
-
-    try:
-        while True:
-            expected_data_length = 6 
-
-            if ser.in_waiting >= expected_data_length:
-                raw_data = ser.read(expected_data_length)
-
-                try:
-                    tens_char_byte = raw_data[3:4]
-                    ones_char_byte = raw_data[4:5]
-
-                    tens_digit = int(tens_char_byte.decode('ascii'))
-                    ones_digit = int(ones_char_byte.decode('ascii'))
-
-                    positive_value = tens_digit * 10 + ones_digit
-                    actual_temperature = -positive_value
-
-                    if not (-90 <= actual_temperature <= -20):
-                        print(f"警告: 範囲外の温度値を受信しました: {actual_temperature} (元データ: {raw_data.hex()})")
-
-                    with data_lock:
-                        latest_temperature = actual_temperature
-
-                except (IndexError, ValueError) as e:
-                    print(f"温度データパースエラー: {e} - 受信データ: {raw_data.hex()}")
-                    print("ASCII文字が数値に変換できない、またはデータ長が不足している可能性があります。")
-                    continue
-            else:
-                time.sleep(0.01)
-
-    except KeyboardInterrupt:
-        print("温度データ取得スレッドを停止します。")
-    finally:
-        ser.close()
-        print(f"シリアルポート {serial_port} を閉じました。")
-
-# --- Matplotlib グラフ描画 ---
-
-def animate_graph(i):
-    global latest_yaw_angle, latest_temperature, data_lock
-
+# --- USB シリアル 温度データの受け取り ---
+# 受信・復号はsensor_hubのTemperatureFrameSourceが行い、サンプルごとに取得元のスレッドから呼ばれる
+def on_temperature(stream, t, values):
+    global latest_temperature
     with data_lock:
-        current_yaw = latest_yaw_angle
-        current_temp = latest_temperature
-
-    # 有効な温度データが受信された場合のみプロット対象に追加
-    if current_temp != -999.0: # 初期値でないことを確認
-        # 最新のデータペアを追加
-        # (X, Y) の順で、今回は (角度, 温度) にする
-        if len(data_queue_plot_points) == data_queue_plot_points.maxlen:
-            data_queue_plot_points.popleft() # キューが満杯なら一番古いデータを削除
-        data_queue_plot_points.append((current_yaw, current_temp)) # ここで順番を入れ替える
-
-    # グラフデータを更新
-    # キューからX軸データとY軸データを分離
-    # X軸は角度、Y軸は温度
-    plot_yaws = [p[0] for p in data_queue_plot_points]
-    plot_temps = [p[1] for p in data_queue_plot_points]
-
-    line_plot.set_data(plot_yaws, plot_temps) # ここで順番を入れ替える
-
-    # Y軸（温度）の範囲を固定
-    ax.set_ylim(-90, -20) 
+        latest_temperature = int(values['temperature'])
+
+# --- 集計の読み込み・保存 ---
+def load_aggregate(file_path):
+    if os.path.exists(file_path):
+        try:
+            saved = BinnedStats2D.load(file_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"集計ファイル '{file_path}' を読み込めませんでした: {e}")
+        else:
+            if saved.compatible(yaw_temp_aggregate):
+                print(f"集計ファイル '{file_path}' の続きから集計します ({saved.total} サンプル)。")
+                return saved
+            print(f"集計ファイル '{file_path}' は区間の設定が異なるため使いません。")
+    return yaw_temp_aggregate
+
+def load_gyro_bias(file_path):
+    if os.path.exists(file_path):
+        try:
+            model = GyroBiasModel.load(file_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"バイアスのモデル '{file_path}' を読み込めませんでした: {e}")
+        else:
+            print(f"バイアスのモデル '{file_path}' を読み込みました ({model.samples} サンプル)。")
+            return model
+    return gyro_bias_model
+
+def save_state():
+    yaw_temp_aggregate.save(AGGREGATE_FILE)
+    gyro_bias_model.save(GYRO_BIAS_FILE)
+
+def save_state_thread(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            save_state()
+        except OSError as e:
+            print(f"集計・バイアスのモデルを保存できませんでした: {e}")
 
-    # X軸（角度）の範囲を固定
-    ax.set_xlim(0, 360) 
+# --- Matplotlib グラフ描画 ---
 
-    return line_plot,
+def update_graph():
+    # 軸の範囲は固定なので、線のデータだけを更新する
+    _, points = plot_points.window(time_window.span_seconds)
+    # 長時間を表示するときは、温度の最小・最大を残して点をグラフの幅 (画素) の2倍までに間引く
+    yaws, temps = minmax_decimate(points[:, 0], points[:, 1], 2 * int(ax.bbox.width))
+    line_plot.set_data(yaws, temps) # X軸は角度、Y軸は温度
+
+    # ヨー角・温度ごとの角速度 z の平均. 色の範囲が変わったときだけ全体を描き直す (カラーバーも更新)
+    grid = yaw_temp_aggregate.grid("mean").T
+    heatmap.set_data(grid)
+    if yaw_temp_aggregate.total and color_limits.update(np.nanmin(grid), np.nanmax(grid)):
+        heatmap.set_clim(*color_limits.limits)
+        return True
+    return False
 
 # --- メインプログラム実行 ---
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ヨー軸角度 (MPU6050) と温度の関係をグラフに表示する.")
+    # !!! ここをあなたの環境に合わせて変更してください !!!
+    parser.add_argument("--port", default='/dev/ttyUSB0', help="温度センサーのシリアルポート (例: /dev/ttyUSB0, /dev/ttyUSB1)")
+    parser.add_argument("--baud", type=int, default=9600, help="温度センサー側のボーレート")
+    parser.add_argument("--i2c-bus", type=int, default=1, help="MPU6050を接続したI2Cバスの番号")
+    add_headless_arguments(parser)
+    args = parser.parse_args()
+    check_headless_arguments(parser, args)
+    timer = StartupTimer(started_at)
+
+    if args.headless:
+        # グラフを表示せず、取得と記録だけを行う (matplotlibは読み込まない)
+        sources = [
+            TemperatureFrameSource(args.port, args.baud),
+            MPU6050Source(args.i2c_bus, rate_hz=GYRO_RATE_HZ,
+                          bias_file=GYRO_BIAS_FILE if os.path.exists(GYRO_BIAS_FILE) else None),
+        ]
+        raise SystemExit(run_headless(sources, args, timer, 'ヨー軸角度と温度'))
+
+    import matplotlib.pyplot as plt
+
+    yaw_temp_aggregate = load_aggregate(AGGREGATE_FILE)
+    gyro_bias_model = load_gyro_bias(GYRO_BIAS_FILE)
+
     # --- MPU6050 の初期化とスレッド開始 ---
     try:
-        mpu = MPU6050()
+        mpu = MPU6050(args.i2c_bus)
         print("MPU6050 の初期化に成功しました。")
     except Exception as e:
         print(f"MPU6050 の初期化に失敗しました: {e}")
@@ -192,16 +200,16 @@ if __name__ == "__main__":
     mpu_thread = threading.Thread(target=read_mpu6050_data_thread, args=(mpu,), daemon=True)
     mpu_thread.start()
 
-    # --- 温度センサーのシリアルポート設定とスレッド開始 ---
-    # !!! ここをあなたの環境に合わせて変更してください !!!
-    temperature_serial_port = '/dev/ttyUSB0' # <-- 例: /dev/ttyUSB0, /dev/ttyUSB1 など
-    temperature_baud_rate = 9600 # <-- 温度センサー側のボーレートに合わせる
+    # --- 温度センサーの取得開始 (ヘッドレスモードと同じ取得元. ポートが開けなければ再接続を試し続ける) ---
+    temperature_hub = SensorHub([TemperatureFrameSource(args.port, args.baud)], log=print)
+    temperature_hub.subscribe(on_temperature)
+    temperature_hub.start()
 
-    temp_thread = threading.Thread(target=read_temperature_data_thread, args=(temperature_serial_port, temperature_baud_rate), daemon=True)
-    temp_thread.start()
+    save_thread = threading.Thread(target=save_state_thread, args=(AGGREGATE_SAVE_INTERVAL,), daemon=True)
+    save_thread.start()
 
     # --- Matplotlib グラフ描画の初期化 ---
-    fig, ax = plt.subplots(1, 1, figsize=(10, 6))
+    fig, (ax, ax_heatmap) = plt.subplots(1, 2, figsize=(16, 6))
     line_plot, = ax.plot([], [], 'o-') # プロットスタイルを点と線に (scatterでも可)
 
     ax.set_title('ヨー軸角度と温度の関係') # タイトルも変更
@@ -209,8 +217,32 @@ if __name__ == "__main__":
     ax.set_ylabel('温度 (度)') # Y軸ラベルも変更
     ax.grid(True)
 
+    # Y軸（温度）とX軸（角度）の範囲を固定
+    ax.set_ylim(-90, -20)
+    ax.set_xlim(0, 360)
+
+    # ヨー角と温度の軸は固定なので、表示する時間の幅だけをキーで変える
+    time_window = TimeWindow(WINDOW_SECONDS)
+    connect_zoom_keys(fig, time_window)
+
+    # ヨー角・温度ごとの角速度 z の平均のヒートマップ (ドリフトの温度依存を見る)
+    heatmap = ax_heatmap.imshow(yaw_temp_aggregate.grid("mean").T, origin='lower', aspect='auto',
+                                extent=yaw_temp_aggregate.extent, cmap='coolwarm')
+    color_limits = AxisLimits(-0.5, 0.5)
+    heatmap.set_clim(*color_limits.limits)
+    fig.colorbar(heatmap, ax=ax_heatmap, label='角速度 z の平均 (度/秒)')
+    ax_heatmap.set_title('ヨー軸角度・温度ごとの角速度 z')
+    ax_heatmap.set_xlabel('ヨー軸角度 (度)')
+    ax_heatmap.set_ylabel('温度 (度)')
+
     # アニメーションを開始 (グラフ更新間隔は200msで維持)
-    ani = animation.FuncAnimation(fig, animate_graph, interval=200, blit=True)
+    plotter = BlitPlotter(fig, [line_plot, heatmap], update_graph, interval_ms=200)
+    plotter.start()
 
     plt.tight_layout()
+    timer.report("グラフの準備完了")
     plt.show()
+    temperature_hub.stop()
+
+    save_state()
+    print(f"集計を '{AGGREGATE_FILE}' に、バイアスのモデルを '{GYRO_BIAS_FILE}' に保存しました。")
@@ -3,41 +3,26 @@ from tkinter import scrolledtext, messagebox, filedialog
 import serial
 import serial.tools.list_ports
 import threading
-import time
-import queue # スレッド間の通信用
+
+from log_view import LogBuffer
+from servo_client import ServoClient, ServoClientRunner, ServoCommandError
+from servo_protocol import convert_angle_to_bytes, tilt_status_text
 
 class ServoControllerGUI:
-    # 初期化コマンドの定義
-    INIT_CMND = 0x4E
-    INIT_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
-
-    # チルト制御コマンドの定義
-    TILT_CONTROL_CMND = 0x43
-    TILT_STOP_DATA = [0x30, 0x30, 0x30, 0x30, 0x30, 0x30]
-    TILT_UP_DATA = [0x31, 0x30, 0x30, 0x30, 0x30, 0x30]
-    TILT_DOWN_DATA = [0x32, 0x30, 0x30, 0x30, 0x30, 0x30]
-
-    # 角度指定チルト制御コマンドの定義
-    TILT_ANGLE_CMND = 0x44
-    TILT_ANGLE_SIGN_MINUS = 0x32 # '-' (ASCII '2')
-    TILT_ANGLE_SIGN_NONE = 0x33 # 符号なし (正) (ASCII '3')
-    TILT_ANGLE_SIGN_PLUS = 0x34 # '+' (ASCII '4')
-
-    # レスポンスにおけるチルト状態 (CMND 43h のDATA 1バイト目)
-    TILT_STATUS_STOP = 0x30
-    TILT_STATUS_UP = 0x31
-    TILT_STATUS_DOWN = 0x32
-    TILT_STATUS_UPPER_LIMIT = 0x38 # 上限界
-    TILT_STATUS_LOWER_LIMIT = 0x39 # 下限界
+    # コマンド・レスポンスの定義とBCC計算は servo_protocol.py、送受信は servo_client.py が担当する
+    MAX_LOG_LINES = 1000  # ログの最大行数
+    LOG_FLUSH_INTERVAL_MS = 50  # ログを画面へ反映する最短間隔
 
     def __init__(self, master):
         self.master = master
         master.title("サーボ制御ソフトウェア")
 
-        self.serial_port = None
-        self.serial_thread = None
-        self.running = False
-        self.response_queue = queue.Queue() # シリアルスレッドからのレスポンスを受け取るキュー
+        self.servo = None # サーボクライアントとそのイベントループ (接続中のみ)
+        # ログはリングバッファに溜め、通知を受けたときにまとめて画面へ反映する
+        self.ui_wakeup = threading.Event()
+        self.log_buffer = LogBuffer(self.MAX_LOG_LINES, on_pending=self.ui_wakeup.set)
+        self.log_line_count = 0
+        self.log_flush_scheduled = False
 
         # --- GUI要素の配置 ---
         # シリアルポート設定フレーム
@@ -138,8 +123,9 @@ class ServoControllerGUI:
         # ウィンドウを閉じるときの処理
         master.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-        # 定期的にキューをチェックしてGUIを更新
-        self.master.after(100, self.process_queue)
+        # ログが追加されたときだけメインループを起こして反映する
+        master.bind("<<UiWakeup>>", self._schedule_log_flush)
+        threading.Thread(target=self._ui_notifier_thread, daemon=True).start()
 
         # 初期状態でチルト関連ボタンの状態を設定
         self._update_tilt_button_states() 
@@ -151,7 +137,7 @@ class ServoControllerGUI:
 
     def _update_tilt_button_states(self):
         """チルト関連ボタンの有効/無効状態を更新するヘルパー関数."""
-        state = tk.NORMAL if self.serial_port and self.serial_port.is_open else tk.DISABLED
+        state = tk.NORMAL if self.servo else tk.DISABLED
         
         # チルト制御フレームのラジオボタンと送信ボタン
         for radio in self.tilt_control_frame.winfo_children():
@@ -181,18 +167,12 @@ class ServoControllerGUI:
             return
 
         try:
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_EVEN,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=0.5 # 受信タイムアウト
-            )
+            # ポート設定 (8bit, 偶数パリティ, 1ストップビット) はクライアントが行う
+            client = ServoClient(port, baudrate, log=self.log_buffer.append)
+            servo = ServoClientRunner(client)
+            servo.start()
+            self.servo = servo
             self.log_message(f"{port} に接続しました。\n")
-            self.running = True
-            self.serial_thread = threading.Thread(target=self._serial_reader_thread, daemon=True)
-            self.serial_thread.start()
 
             # ボタンの状態を更新
             self.connect_button.config(state=tk.DISABLED)
@@ -209,12 +189,10 @@ class ServoControllerGUI:
 
     def disconnect_serial(self):
         """シリアルポートを切断する."""
-        if self.serial_port and self.serial_port.is_open:
-            self.running = False
-            if self.serial_thread and self.serial_thread.is_alive():
-                # スレッドが安全に終了するのを待つ (最大1秒)
-                self.serial_thread.join(timeout=1)
-            self.serial_port.close()
+        if self.servo:
+            # 実行中のコマンドを取り消してからポートを閉じる
+            self.servo.stop()
+            self.servo = None
             self.log_message(f"シリアルポートを切断しました。\n")
             
             # ボタンの状態を更新
@@ -226,115 +204,26 @@ class ServoControllerGUI:
             self.port_menu.config(state=tk.NORMAL)
             self.baudrate_entry.config(state=tk.NORMAL)
 
-    def calculate_bcc(self, data_bytes):
-        """BCC (Block Check Character) を計算する (XOR方式)."""
-        # BCCの計算方法がXORでない場合は修正が必要です
-        bcc = 0
-        for b in data_bytes:
-            bcc ^= b
-        return bcc
-
-    def send_command_internal(self, cmnd_byte, data_bytes_list):
-        """シリアルポートへコマンドを送信する内部関数."""
-        if not self.serial_port or not self.serial_port.is_open:
-            self.response_queue.put("エラー: シリアルポートが接続されていません。\n")
-            return False
-
-        # コマンドフレームの構築
-        stx = 0x02
-        ext = 0x03
-        data_part = bytes(data_bytes_list) # DATAはバイト列として扱う
-
-        # BCC計算用のバイト列（STXからEXTまで）
-        bcc_calc_data = bytes([stx, cmnd_byte]) + data_part + bytes([ext])
-        bcc = self.calculate_bcc(bcc_calc_data)
-
-        # 送信する最終的なバイト列
-        command_frame = bytes([stx, cmnd_byte]) + data_part + bytes([ext, bcc])
-
-        self.response_queue.put(f"送信データ (HEX): {' '.join(f'{b:02X}' for b in command_frame)}\n")
-
-        try:
-            self.serial_port.write(command_frame)
-            return True
-        except serial.SerialException as e:
-            self.response_queue.put(f"エラー: コマンド送信失敗: {e}\n")
-            return False
-
-    def receive_response_internal(self):
-        """シリアルポートからのレスポンスを受信する内部関数."""
-        start_time = time.time()
-        response_data = b''
-        # 100ms以内、またはスレッドが停止するまで受信を試みる
-        while self.running and (time.time() - start_time) * 1000 < 100: 
-            if self.serial_port.in_waiting > 0:
-                response_data += self.serial_port.read(self.serial_port.in_waiting)
-            time.sleep(0.001) # 短いポーリング間隔
-
-        if response_data:
-            self.response_queue.put(f"受信データ (HEX): {' '.join(f'{b:02X}' for b in response_data)}\n")
-            
-            # 受信データの解析とBCCチェック
-            # レスポンスフォーマットが STX, CMND/STATUS, DATA..., EXT, BCC と仮定
-            if len(response_data) >= 4: # 最低限の長さ (STX, CMND, EXT, BCC)
-                received_bcc = response_data[-1]
-                # レスポンスのBCC計算範囲を調整してください (STXからEXTまで)
-                calculated_bcc_resp = self.calculate_bcc(response_data[:-1]) 
-                
-                if received_bcc == calculated_bcc_resp:
-                    self.response_queue.put("BCCチェック: OK\n")
-                    return response_data
-                else:
-                    self.response_queue.put(f"BCCチェック: エラー (受信: {received_bcc:02X}, 計算: {calculated_bcc_resp:02X})\n")
-                    return None
-            else:
-                self.response_queue.put("レスポンスデータが短すぎます。\n")
-                return None
-        else:
-            self.response_queue.put("レスポンスがありませんでした。\n")
+    def _run_command(self, make_coro, on_success=None):
+        """コマンドをクライアントのイベントループで実行する (送信・受信・リトライはクライアントが行う)."""
+        if not self.servo:
+            self.log_buffer.append("エラー: シリアルポートが接続されていません。\n")
             return None
-
-    def _serial_reader_thread(self):
-        """バックグラウンドでシリアルポートからの予期せぬ受信を監視するスレッド."""
-        while self.running:
-            if self.serial_port and self.serial_port.is_open and self.serial_port.in_waiting > 0:
-                unexpected_data = self.serial_port.read(self.serial_port.in_waiting)
-                self.response_queue.put(f"警告: 予期せぬデータを受信しました: {' '.join(f'{b:02X}' for b in unexpected_data)}\n")
-            time.sleep(0.05) # 短い間隔でポーリング
-
-    def _command_sender_with_retry(self, cmnd_byte, data_bytes_list, callback_on_success=None):
-        """コマンド送信とリトライ処理を行うスレッド関数."""
-        max_retries = 3
-        command_successful = False
-        for attempt in range(max_retries):
-            self.response_queue.put(f"コマンド送信試行: {attempt + 1}/{max_retries}\n")
-            
-            if self.send_command_internal(cmnd_byte, data_bytes_list):
-                response = self.receive_response_internal()
-                if response:
-                    # BCCチェックOKの場合、ここで追加のレスポンスチェックを行う
-                    if callback_on_success:
-                        if callback_on_success(response):
-                            command_successful = True
-                            # callback_on_success内で詳細メッセージがすでにキューに投入されていると想定
-                            break # 成功したらリトライを終了
-                        else:
-                            self.response_queue.put("レスポンス内容が期待値と異なります。リトライします。\n")
-                    else:
-                        # カスタムチェックがない場合のデフォルト成功メッセージ
-                        command_successful = True
-                        self.response_queue.put(f"コマンド成功！ レスポンス: {response.hex()}\n\n")
-                        break
-                else:
-                    self.response_queue.put("レスポンス受信失敗、またはBCCエラー。リトライします。\n")
-            else:
-                self.response_queue.put("コマンド送信失敗。リトライします。\n")
-            
-            if attempt < max_retries - 1: # 最終試行の場合は待機しない
-                time.sleep(0.2) # 次のリトライまでの待機
-
-        if not command_successful:
-            self.response_queue.put("コマンド送信に失敗しました (リトライ回数超過)。\n\n")
+        # make_coro はクライアントを受け取ってコルーチンを返す関数
+        future = self.servo.submit(make_coro(self.servo.client))
+        future.add_done_callback(lambda f: self._on_command_done(f, on_success))
+        return future
+
+    def _on_command_done(self, future, on_success):
+        """コマンド完了時の処理 (イベントループのスレッドから呼ばれるため、GUIへはログのリングバッファ経由で伝える)."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            if on_success:
+                on_success(future.result())
+        elif not isinstance(error, ServoCommandError): # リトライ回数超過はクライアントがログ済み
+            self.log_buffer.append(f"エラー: コマンド処理中に例外が発生しました: {error}\n")
 
     def send_command_from_gui(self):
         """GUIからの通常コマンド送信をトリガーする."""
@@ -359,54 +248,17 @@ class ServoControllerGUI:
             messagebox.showerror("入力エラー", "DATAは16進数(例:3031)で入力してください。")
             return
 
-        # コマンド送信とリトライ処理を別スレッドで実行
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes_list, None) # 通常コマンドはカスタムチェックなし
-        )
-        command_sender_thread.daemon = True # メインスレッド終了時に一緒に終了
-        command_sender_thread.start()
+        # 通常コマンドはレスポンスのCMNDが分からないため、次に届いたフレームをレスポンスとする
+        self._run_command(lambda client: client.request(cmnd_byte, data_bytes_list, any_response=True))
 
     def send_init_command(self):
         """初期化コマンドを送信する."""
         self.log_message("初期化コマンドを送信します...\n")
-        # _command_sender_with_retry スレッドを起動
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(self.INIT_CMND, self.INIT_DATA, self.check_init_response) # 初期化レスポンスチェック関数を渡す
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
-
-    def check_init_response(self, response_bytes):
-        """初期化コマンドに対するレスポンスをチェックする."""
-        if response_bytes is None:
-            self.response_queue.put("初期化コマンド レスポンス: 不明 (BCCエラーまたはタイムアウト)\n")
-            return False
-
-        # レスポンスフォーマット: STX, CMND/STATUS, DATA(6), EXT, BCC (計10バイト)
-        expected_full_length = 10 
-        if len(response_bytes) != expected_full_length:
-            self.response_queue.put(f"初期化コマンド レスポンス: フォーマットが期待値と異なります。期待 {expected_full_length}バイト, 実際 {len(response_bytes)}バイト\n")
-            return False
+        self._run_command(lambda client: client.init(), self.log_init_response)
 
-        response_cmnd = response_bytes[1] # STXの次がCMND/STATUS
-        response_data = list(response_bytes[2:-2]) # CMNDの次からEXTの手前までがDATA
-
-        expected_cmnd = self.INIT_CMND
-        expected_data = self.INIT_DATA
-
-        is_cmnd_match = (response_cmnd == expected_cmnd)
-        is_data_match = (response_data == expected_data)
-
-        if is_cmnd_match and is_data_match:
-            self.response_queue.put("初期化コマンド レスポンス: OK (期待値と一致)\n")
-            return True
-        else:
-            self.response_queue.put(f"初期化コマンド レスポンス: 不一致！\n")
-            self.response_queue.put(f"  期待CMND: {expected_cmnd:02X}, 実際CMND: {response_cmnd:02X}\n")
-            self.response_queue.put(f"  期待DATA: {' '.join(f'{b:02X}' for b in expected_data)}, 実際DATA: {' '.join(f'{b:02X}' for b in response_data)}\n")
-            return False
+    def log_init_response(self, response_bytes):
+        """初期化コマンドのレスポンスをログに出す (内容の検証はクライアントが行う)."""
+        self.log_buffer.append("初期化コマンド レスポンス: OK (期待値と一致)\n")
 
     def on_tilt_mode_change(self):
         """チルト制御ラジオボタンが変更されたときにログを更新する (デバッグ用)."""
@@ -415,60 +267,22 @@ class ServoControllerGUI:
     def send_tilt_control_command(self):
         """チルト制御コマンド (CMND 43h) を送信する."""
         mode = self.tilt_mode_var.get()
-        cmnd_byte = self.TILT_CONTROL_CMND
-        data_bytes = []
 
         if mode == "stop":
-            data_bytes = self.TILT_STOP_DATA
             self.log_message("チルト停止コマンドを送信します...\n")
         elif mode == "up":
-            data_bytes = self.TILT_UP_DATA
             self.log_message("チルト上コマンドを送信します...\n")
         elif mode == "down":
-            data_bytes = self.TILT_DOWN_DATA
             self.log_message("チルト下コマンドを送信します...\n")
         else:
             messagebox.showerror("エラー", "不正なチルトモードが選択されました。")
             return
 
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes, self.check_tilt_control_response)
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
-
-    def check_tilt_control_response(self, response_bytes):
-        """チルト制御コマンド (CMND 43h) のレスポンスをチェックする."""
-        if response_bytes is None:
-            self.response_queue.put("チルト制御 レスポンス: 不明 (BCCエラーまたはタイムアウト)\n")
-            return False
-
-        # レスポンスフォーマット: STX(1), CMND(1), DATA(6), EXT(1), BCC(1) = 10バイト
-        expected_full_length = 10
-        if len(response_bytes) != expected_full_length:
-            self.response_queue.put(f"チルト制御 レスポンス: フォーマットが期待値と異なります。期待 {expected_full_length}バイト, 実際 {len(response_bytes)}バイト\n")
-            return False
-
-        response_cmnd = response_bytes[1]
-        response_status_byte = response_bytes[2] # DATA 1バイト目
-
-        if response_cmnd != self.TILT_CONTROL_CMND:
-            self.response_queue.put(f"チルト制御 レスポンス: CMNDが不一致！ 期待 {self.TILT_CONTROL_CMND:02X}, 実際 {response_cmnd:02X}\n")
-            return False
-
-        status_map = {
-            self.TILT_STATUS_STOP: "停止",
-            self.TILT_STATUS_UP: "上",
-            self.TILT_STATUS_DOWN: "下",
-            self.TILT_STATUS_UPPER_LIMIT: "上限界",
-            self.TILT_STATUS_LOWER_LIMIT: "下限界"
-        }
-        status_text = status_map.get(response_status_byte, f"不明な状態 ({response_status_byte:02X})")
-        
-        self.response_queue.put(f"チルト制御 レスポンス: OK. 状態: {status_text}\n")
-        return True
+        self._run_command(lambda client: client.tilt(mode), self.log_tilt_control_response)
 
+    def log_tilt_control_response(self, status_byte):
+        """チルト制御コマンド (CMND 43h) のレスポンスの状態をログに出す."""
+        self.log_buffer.append(f"チルト制御 レスポンス: OK. 状態: {tilt_status_text(status_byte)}\n")
 
     def validate_tilt_angle_input(self, P):
         """角度入力フィールドのバリデーション (0.00～15.0の数値のみ許可)."""
@@ -509,104 +323,87 @@ class ServoControllerGUI:
             messagebox.showerror("入力エラー", "角度は数値で入力してください。")
             return
 
-        cmnd_byte = self.TILT_ANGLE_CMND
-        data_bytes = []
-
-        # 1バイト目: 符号
         if sign_mode == "minus":
-            data_bytes.append(self.TILT_ANGLE_SIGN_MINUS)
             self.log_message(f"角度指定チルトコマンド（- {angle_float:.2f}）を送信します...\n")
         elif sign_mode == "none":
-            data_bytes.append(self.TILT_ANGLE_SIGN_NONE)
             self.log_message(f"角度指定チルトコマンド（符号なし {angle_float:.2f}）を送信します...\n")
         elif sign_mode == "plus":
-            data_bytes.append(self.TILT_ANGLE_SIGN_PLUS)
             self.log_message(f"角度指定チルトコマンド（+ {angle_float:.2f}）を送信します...\n")
         else:
             messagebox.showerror("エラー", "不正な符号が選択されました。")
             return
 
-        # 2-4バイト目: 角度3桁 (30h, 30h, 30h 〜 31h, 35h, 30h)
-        # floatを100倍して整数にし、3桁になるようにゼロ埋めしたASCII文字に変換
-        angle_int_times_100 = int(round(angle_float * 100)) # 例: 12.34 -> 1234
-        
-        # 15.0 (1500) が最大なので、常に4桁になる可能性を考慮し、
-        # 3桁のデータにするために `15.0` の場合を `150` と解釈するか、仕様を再確認してください。
-        # 現在の仕様「0.00〜15.0」で「角度３桁」は、15.00 -> "150" と解釈し、小数点以下2桁目を無視するのか、
-        # あるいは「15.0」が150で、その下位2桁が小数点以下であるかを別途伝えるのか、確認が必要です。
-        # ここでは「15.0」を「150」と捉えて3桁のASCIIとするようにします。
-        # 例: 1.23 -> "123", 12.3 -> "123", 0.05 -> "005"
-        # 15.00は1500ですが、3桁にするため、`150`として処理します。
-        
-        # 0.00〜15.0 を 0〜150 の整数値として扱う
-        # 仕様「角度3桁」と「0.00〜15.0」の組み合わせから、
-        # 15.0 -> 150 (3桁)
-        # 1.23 -> 123 (3桁)
-        # 0.05 -> 005 (3桁)
-        # のように変換すると想定。
-        
-        # 15.00 を 150 とするには 10 を掛ける。
-        # 小数点以下2桁がコマンドで表現できない場合があるため、サーボの仕様を確認してください。
-        # ここでは「0.00〜15.0」は「0〜150」の整数として扱われるものと仮定し、
-        # 入力値を10倍して文字列化するようにします。
-        angle_for_command = int(round(angle_float * 10)) # 例: 1.23 -> 12.3 -> 12, 15.0 -> 150
-        
-        # 最大15.0なので150まで。これを3桁にゼロ埋め
-        angle_str_padded = f"{angle_for_command:03d}" 
-        
-        if len(angle_str_padded) > 3:
-             messagebox.showerror("内部エラー", "計算された角度値が3桁を超えました。入力値と変換ロジックを確認してください。")
-             return
+        # DATAは符号1バイト + 角度3桁 (0.00〜15.0 を10倍した 000〜150 のASCII) + 予備2バイト
+        try:
+            convert_angle_to_bytes(angle_float, sign_mode)
+        except ValueError as e:
+            messagebox.showerror("内部エラー", f"{e} 入力値と変換ロジックを確認してください。")
+            return
 
-        for char_digit in angle_str_padded:
-            data_bytes.append(ord(char_digit)) # ASCII '0' -> 0x30
+        self._run_command(lambda client: client.tilt_to(angle_float, sign_mode), self.log_tilt_angle_response)
 
-        # 5-6バイト目: 予備 (30h, 30h)
-        data_bytes.extend([0x30, 0x30])
+    def log_tilt_angle_response(self, status_byte):
+        """角度指定チルト制御コマンド (CMND 44h) のレスポンスの状態をログに出す."""
+        # 角度指定チルト制御のレスポンスはCMND 43hと同じ形式で、クライアントが検証済み
+        self.log_buffer.append(f"角度指定チルト レスポンス: OK. 状態: {tilt_status_text(status_byte)}\n")
 
-        # データバイトが6バイトになることを確認
-        if len(data_bytes) != 6:
-            messagebox.showerror("内部エラー", f"角度指定チルトのデータバイト数が不正です: {len(data_bytes)} (期待値: 6)")
-            return
+    def log_message(self, message):
+        """ログにメッセージを追加する. 画面への反映はflush_logでまとめて行う."""
+        self.log_buffer.append(message)
 
-        command_sender_thread = threading.Thread(
-            target=self._command_sender_with_retry,
-            args=(cmnd_byte, data_bytes, self.check_tilt_angle_response)
-        )
-        command_sender_thread.daemon = True
-        command_sender_thread.start()
-
-    def check_tilt_angle_response(self, response_bytes):
-        """角度指定チルト制御コマンド (CMND 44h) のレスポンスをチェックする."""
-        # 仕様によると、角度指定チルト制御のレスポンスはCMND 43hと同じ
-        # そのため、check_tilt_control_response を再利用します。
-        self.response_queue.put("角度指定チルト レスポンスを確認中...\n")
-        # ただし、返ってくるCMNDは43hですが、これは送信したCMND 44hとは異なります。
-        # サーボの仕様として、角度指定コマンドのレスポンスがチルト制御と同じ「状態」を返す
-        # ということなので、ここでは `TILT_CONTROL_CMND` (0x43) を期待します。
-        # `check_tilt_control_response` は `TILT_CONTROL_CMND` をチェックするので問題ありません。
-        return self.check_tilt_control_response(response_bytes)
+    def _ui_notifier_thread(self):
+        """ログ追加の通知を受けてTkのメインループを起こす.
+
+        他スレッドは通知フラグを立てるだけで、Tkの呼び出しで待たされることはない.
+        """
+        while True:
+            self.ui_wakeup.wait()
+            self.ui_wakeup.clear()
+            try:
+                self.master.event_generate("<<UiWakeup>>", when="tail")
+            except (tk.TclError, RuntimeError):
+                return  # ウィンドウが閉じられた
+
+    def _schedule_log_flush(self, event=None):
+        if not self.log_flush_scheduled:
+            self.log_flush_scheduled = True
+            self.master.after(self.LOG_FLUSH_INTERVAL_MS, self.flush_log)
+
+    def flush_log(self):
+        """溜まったログを1回の挿入でテキストエリアに反映し、一定行数を超えた古いログを削除する."""
+        self.log_flush_scheduled = False
+        text = self.log_buffer.drain()
+        if not text:
+            return
+        new_lines = text.count('\n')
 
-    def log_message(self, message):
-        """GUIのテキストエリアにメッセージを追加する."""
         self.response_text.config(state=tk.NORMAL)
-        self.response_text.insert(tk.END, message)
+        if new_lines >= self.MAX_LOG_LINES:
+            # 1回分だけで上限を超える場合は、表示し切れない古い行を挿入しない
+            text = '\n'.join(text.split('\n')[-self.MAX_LOG_LINES - 1:])
+            self.response_text.delete('1.0', tk.END)
+            self.log_line_count = self.MAX_LOG_LINES
+        else:
+            self.log_line_count += new_lines
+        self.response_text.insert(tk.END, text)
+
+        if self.log_line_count > self.MAX_LOG_LINES:
+            delete_until = f'{self.log_line_count - self.MAX_LOG_LINES + 1}.0'
+            self.response_text.delete('1.0', delete_until)
+            self.log_line_count = self.MAX_LOG_LINES
+
         self.response_text.see(tk.END) # 最新のメッセージまでスクロール
         self.response_text.config(state=tk.DISABLED)
 
-    def process_queue(self):
-        """キューにデータがあれば取り出してGUIに表示する (メインスレッドで実行)."""
-        try:
-            while True:
-                message = self.response_queue.get_nowait()
-                self.log_message(message)
-        except queue.Empty:
-            pass
-        finally:
-            self.master.after(100, self.process_queue) # 100msごとにキューをチェック
-
     def save_log(self):
-        """表示されているログをファイルに保存する."""
+        """ログをファイルに保存する. 保存中は以降のログもローテーションしながら追記し続ける."""
+        if self.log_buffer.file_handler:
+            self.flush_log()
+            self.log_buffer.stop_file_stream()
+            self.save_log_button.config(text="ログを保存")
+            self.log_message("ログファイルへの保存を停止しました。\n")
+            return
+
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
@@ -614,16 +411,20 @@ class ServoControllerGUI:
         )
         if file_path:
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(self.response_text.get("1.0", tk.END))
-                messagebox.showinfo("保存完了", f"ログを {file_path} に保存しました。")
+                self.log_buffer.start_file_stream(file_path)
+                self.save_log_button.config(text="ログ保存を停止")
+                messagebox.showinfo("保存開始", f"ログを {file_path} に保存しています。\n以降のログも追記されます (1MBごとにローテーション)。")
             except Exception as e:
                 messagebox.showerror("保存エラー", f"ログの保存に失敗しました: {e}")
 
     def on_closing(self):
         """ウィンドウを閉じる際の処理."""
-        self.disconnect_serial() # アプリケーション終了時にシリアルポートを閉じる
-        self.master.destroy()
+        try:
+            self.disconnect_serial() # アプリケーション終了時にシリアルポートを閉じる
+        finally:
+            self.log_buffer.drain()  # ファイル保存中なら残りを書き出す
+            self.log_buffer.stop_file_stream()
+            self.master.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()